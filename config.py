@@ -107,6 +107,280 @@ except ValueError:
     print("ERROR_CHECK_INTERVAL_MIN no es un entero válido; usando 240 min por defecto.")
     ERROR_CHECK_INTERVAL_MIN = 240
 
+# --- Detección de cambios en la hoja de casos ---
+# Segundos entre consultas a Drive por la versión del spreadsheet de casos
+try:
+    CASES_CHANGE_POLL_SEC = int(os.getenv('CASES_CHANGE_POLL_SEC', '30'))
+except ValueError:
+    print("CASES_CHANGE_POLL_SEC no es un entero válido; usando 30 s por defecto.")
+    CASES_CHANGE_POLL_SEC = 30
+# Segundos sin cambios antes de barrer, y demora máxima desde el primer cambio
+try:
+    ERROR_SWEEP_DEBOUNCE_SEC = int(os.getenv('ERROR_SWEEP_DEBOUNCE_SEC', '20'))
+except ValueError:
+    print("ERROR_SWEEP_DEBOUNCE_SEC no es un entero válido; usando 20 s por defecto.")
+    ERROR_SWEEP_DEBOUNCE_SEC = 20
+try:
+    ERROR_SWEEP_MAX_DELAY_SEC = int(os.getenv('ERROR_SWEEP_MAX_DELAY_SEC', '300'))
+except ValueError:
+    print("ERROR_SWEEP_MAX_DELAY_SEC no es un entero válido; usando 300 s por defecto.")
+    ERROR_SWEEP_MAX_DELAY_SEC = 300
+
+# --- Google Sheets (gateway asíncrono) ---
+# Hilos del pool que ejecuta las llamadas a gspread fuera del event loop
+try:
+    SHEETS_MAX_WORKERS = int(os.getenv('SHEETS_MAX_WORKERS', '8'))
+except ValueError:
+    print("SHEETS_MAX_WORKERS no es un entero válido; usando 8 por defecto.")
+    SHEETS_MAX_WORKERS = 8
+# Llamadas simultáneas permitidas contra un mismo spreadsheet
+try:
+    SHEETS_MAX_CONCURRENCY_PER_SPREADSHEET = int(os.getenv('SHEETS_MAX_CONCURRENCY_PER_SPREADSHEET', '4'))
+except ValueError:
+    print("SHEETS_MAX_CONCURRENCY_PER_SPREADSHEET no es un entero válido; usando 4 por defecto.")
+    SHEETS_MAX_CONCURRENCY_PER_SPREADSHEET = 4
+# Tiempo máximo (segundos) de una llamada a Sheets
+try:
+    SHEETS_CALL_TIMEOUT_SEC = float(os.getenv('SHEETS_CALL_TIMEOUT_SEC', '30'))
+except ValueError:
+    print("SHEETS_CALL_TIMEOUT_SEC no es un número válido; usando 30 s por defecto.")
+    SHEETS_CALL_TIMEOUT_SEC = 30.0
+
+# Minutos que se reutilizan los objetos Spreadsheet/Worksheet abiertos
+try:
+    SHEETS_HANDLE_TTL_MIN = float(os.getenv('SHEETS_HANDLE_TTL_MIN', '30'))
+except ValueError:
+    print("SHEETS_HANDLE_TTL_MIN no es un número válido; usando 30 min por defecto.")
+    SHEETS_HANDLE_TTL_MIN = 30.0
+
+# Minutos que se reutiliza el encabezado (fila 1) leído de cada hoja
+try:
+    SHEET_SCHEMA_TTL_MIN = float(os.getenv('SHEET_SCHEMA_TTL_MIN', '60'))
+except ValueError:
+    print("SHEET_SCHEMA_TTL_MIN no es un número válido; usando 60 min por defecto.")
+    SHEET_SCHEMA_TTL_MIN = 60.0
+
+# Minutos entre recargas completas de la tabla de tareas (toma las ediciones manuales de 'Tareas Activas')
+try:
+    TASK_TABLE_RESYNC_MIN = float(os.getenv('TASK_TABLE_RESYNC_MIN', '10'))
+except ValueError:
+    print("TASK_TABLE_RESYNC_MIN no es un número válido; usando 10 min por defecto.")
+    TASK_TABLE_RESYNC_MIN = 10.0
+
+# --- Cola de escritura diferida de Google Sheets ---
+# Segundos de espera para juntar escrituras antes de enviarlas
+try:
+    SHEETS_WRITE_FLUSH_SEC = float(os.getenv('SHEETS_WRITE_FLUSH_SEC', '2'))
+except ValueError:
+    print("SHEETS_WRITE_FLUSH_SEC no es un número válido; usando 2 s por defecto.")
+    SHEETS_WRITE_FLUSH_SEC = 2.0
+# Cantidad de escrituras pendientes que dispara el envío inmediato
+try:
+    SHEETS_WRITE_BATCH_SIZE = int(os.getenv('SHEETS_WRITE_BATCH_SIZE', '50'))
+except ValueError:
+    print("SHEETS_WRITE_BATCH_SIZE no es un entero válido; usando 50 por defecto.")
+    SHEETS_WRITE_BATCH_SIZE = 50
+
+# --- Cache de filas para verificación de duplicados ---
+# Segundos mínimos entre lecturas incrementales de una misma hoja
+try:
+    SHEET_CACHE_DELTA_MIN_SEC = float(os.getenv('SHEET_CACHE_DELTA_MIN_SEC', '10'))
+except ValueError:
+    print("SHEET_CACHE_DELTA_MIN_SEC no es un número válido; usando 10 s por defecto.")
+    SHEET_CACHE_DELTA_MIN_SEC = 10.0
+# Minutos entre relecturas completas (captura ediciones y borrados hechos a mano)
+try:
+    SHEET_CACHE_FULL_RESYNC_MIN = float(os.getenv('SHEET_CACHE_FULL_RESYNC_MIN', '30'))
+except ValueError:
+    print("SHEET_CACHE_FULL_RESYNC_MIN no es un número válido; usando 30 min por defecto.")
+    SHEET_CACHE_FULL_RESYNC_MIN = 30.0
+
+# --- Índice de pedidos para /buscar-caso ---
+# Minutos entre reconstrucciones del índice (default: 5)
+try:
+    CASE_INDEX_REFRESH_MIN = float(os.getenv('CASE_INDEX_REFRESH_MIN', '5'))
+except ValueError:
+    print("CASE_INDEX_REFRESH_MIN no es un número válido; usando 5 min por defecto.")
+    CASE_INDEX_REFRESH_MIN = 5.0
+
+# --- Subida de adjuntos a Google Drive ---
+# Cantidad de archivos que se suben a la vez
+try:
+    DRIVE_UPLOAD_CONCURRENCY = int(os.getenv('DRIVE_UPLOAD_CONCURRENCY', '4'))
+except ValueError:
+    print("DRIVE_UPLOAD_CONCURRENCY no es un número válido; usando 4 por defecto.")
+    DRIVE_UPLOAD_CONCURRENCY = 4
+# Tamaño (MB) de cada fragmento de la subida reanudable
+try:
+    DRIVE_UPLOAD_CHUNK_MB = float(os.getenv('DRIVE_UPLOAD_CHUNK_MB', '5'))
+except ValueError:
+    print("DRIVE_UPLOAD_CHUNK_MB no es un número válido; usando 5 MB por defecto.")
+    DRIVE_UPLOAD_CHUNK_MB = 5.0
+# Segundos máximos de espera por respuesta al descargar de Discord o subir un fragmento
+try:
+    DRIVE_UPLOAD_TIMEOUT_SEC = float(os.getenv('DRIVE_UPLOAD_TIMEOUT_SEC', '120'))
+except ValueError:
+    print("DRIVE_UPLOAD_TIMEOUT_SEC no es un número válido; usando 120 s por defecto.")
+    DRIVE_UPLOAD_TIMEOUT_SEC = 120.0
+
+# --- Cliente HTTP de Andreani ---
+# Segundos máximos para conectar y para esperar datos de la API
+try:
+    ANDREANI_CONNECT_TIMEOUT_SEC = float(os.getenv('ANDREANI_CONNECT_TIMEOUT_SEC', '5'))
+except ValueError:
+    print("ANDREANI_CONNECT_TIMEOUT_SEC no es un número válido; usando 5 s por defecto.")
+    ANDREANI_CONNECT_TIMEOUT_SEC = 5.0
+try:
+    ANDREANI_READ_TIMEOUT_SEC = float(os.getenv('ANDREANI_READ_TIMEOUT_SEC', '15'))
+except ValueError:
+    print("ANDREANI_READ_TIMEOUT_SEC no es un número válido; usando 15 s por defecto.")
+    ANDREANI_READ_TIMEOUT_SEC = 15.0
+# Conexiones simultáneas máximas del pool
+try:
+    ANDREANI_MAX_CONNECTIONS = int(os.getenv('ANDREANI_MAX_CONNECTIONS', '10'))
+except ValueError:
+    print("ANDREANI_MAX_CONNECTIONS no es un número válido; usando 10 por defecto.")
+    ANDREANI_MAX_CONNECTIONS = 10
+# Reintentos ante errores 5xx, timeouts o errores de red (con espera exponencial aleatoria desde ANDREANI_RETRY_BASE_SEC)
+try:
+    ANDREANI_MAX_RETRIES = int(os.getenv('ANDREANI_MAX_RETRIES', '2'))
+except ValueError:
+    print("ANDREANI_MAX_RETRIES no es un número válido; usando 2 por defecto.")
+    ANDREANI_MAX_RETRIES = 2
+try:
+    ANDREANI_RETRY_BASE_SEC = float(os.getenv('ANDREANI_RETRY_BASE_SEC', '0.5'))
+except ValueError:
+    print("ANDREANI_RETRY_BASE_SEC no es un número válido; usando 0.5 s por defecto.")
+    ANDREANI_RETRY_BASE_SEC = 0.5
+# Fallos seguidos que abren el circuito y segundos que permanece abierto
+try:
+    ANDREANI_CB_FAILURES = int(os.getenv('ANDREANI_CB_FAILURES', '5'))
+except ValueError:
+    print("ANDREANI_CB_FAILURES no es un número válido; usando 5 por defecto.")
+    ANDREANI_CB_FAILURES = 5
+try:
+    ANDREANI_CB_RESET_SEC = float(os.getenv('ANDREANI_CB_RESET_SEC', '30'))
+except ValueError:
+    print("ANDREANI_CB_RESET_SEC no es un número válido; usando 30 s por defecto.")
+    ANDREANI_CB_RESET_SEC = 30.0
+
+# --- Cache de tracking de Andreani ---
+# Minutos que se reutiliza una consulta de un envío en tránsito y de uno ya entregado
+try:
+    TRACKING_CACHE_TTL_TRANSITO_MIN = float(os.getenv('TRACKING_CACHE_TTL_TRANSITO_MIN', '5'))
+except ValueError:
+    print("TRACKING_CACHE_TTL_TRANSITO_MIN no es un número válido; usando 5 min por defecto.")
+    TRACKING_CACHE_TTL_TRANSITO_MIN = 5.0
+try:
+    TRACKING_CACHE_TTL_ENTREGADO_MIN = float(os.getenv('TRACKING_CACHE_TTL_ENTREGADO_MIN', '720'))
+except ValueError:
+    print("TRACKING_CACHE_TTL_ENTREGADO_MIN no es un número válido; usando 720 min por defecto.")
+    TRACKING_CACHE_TTL_ENTREGADO_MIN = 720.0
+# Cantidad máxima de números guardados (se descartan los menos usados)
+try:
+    TRACKING_CACHE_MAX_ITEMS = int(os.getenv('TRACKING_CACHE_MAX_ITEMS', '500'))
+except ValueError:
+    print("TRACKING_CACHE_MAX_ITEMS no es un número válido; usando 500 por defecto.")
+    TRACKING_CACHE_MAX_ITEMS = 500
+
+# --- Tracking masivo ---
+# Consultas simultáneas, consultas nuevas por segundo y cantidad máxima de números por comando
+try:
+    TRACKING_BULK_CONCURRENCY = int(os.getenv('TRACKING_BULK_CONCURRENCY', '5'))
+except ValueError:
+    print("TRACKING_BULK_CONCURRENCY no es un número válido; usando 5 por defecto.")
+    TRACKING_BULK_CONCURRENCY = 5
+try:
+    TRACKING_BULK_RATE_PER_SEC = float(os.getenv('TRACKING_BULK_RATE_PER_SEC', '5'))
+except ValueError:
+    print("TRACKING_BULK_RATE_PER_SEC no es un número válido; usando 5 por defecto.")
+    TRACKING_BULK_RATE_PER_SEC = 5.0
+try:
+    TRACKING_BULK_MAX = int(os.getenv('TRACKING_BULK_MAX', '100'))
+except ValueError:
+    print("TRACKING_BULK_MAX no es un número válido; usando 100 por defecto.")
+    TRACKING_BULK_MAX = 100
+
+# --- Índice del manual para preguntas a Gemini ---
+# Tamaño máximo (caracteres) de cada fragmento y cantidad de fragmentos enviados por pregunta
+try:
+    MANUAL_CHUNK_CHARS = int(os.getenv('MANUAL_CHUNK_CHARS', '1500'))
+except ValueError:
+    print("MANUAL_CHUNK_CHARS no es un número válido; usando 1500 por defecto.")
+    MANUAL_CHUNK_CHARS = 1500
+try:
+    MANUAL_TOP_K = int(os.getenv('MANUAL_TOP_K', '6'))
+except ValueError:
+    print("MANUAL_TOP_K no es un número válido; usando 6 por defecto.")
+    MANUAL_TOP_K = 6
+
+# --- Sincronización del manual ---
+# Minutos entre consultas a Drive para ver si el manual cambió (solo se descarga si cambió)
+try:
+    MANUAL_SYNC_INTERVAL_MIN = int(os.getenv('MANUAL_SYNC_INTERVAL_MIN', '30'))
+except ValueError:
+    print("MANUAL_SYNC_INTERVAL_MIN no es un número válido; usando 30 por defecto.")
+    MANUAL_SYNC_INTERVAL_MIN = 30
+
+# --- Respuestas de Gemini ---
+# Segundos máximos de espera por una respuesta
+try:
+    GEMINI_TIMEOUT_SEC = float(os.getenv('GEMINI_TIMEOUT_SEC', '60'))
+except ValueError:
+    print("GEMINI_TIMEOUT_SEC no es un número válido; usando 60 s por defecto.")
+    GEMINI_TIMEOUT_SEC = 60.0
+# Cantidad máxima de respuestas en cache y si se guardan en disco (temp/qaCache.json)
+try:
+    GEMINI_ANSWER_CACHE_MAX = int(os.getenv('GEMINI_ANSWER_CACHE_MAX', '200'))
+except ValueError:
+    print("GEMINI_ANSWER_CACHE_MAX no es un número válido; usando 200 por defecto.")
+    GEMINI_ANSWER_CACHE_MAX = 200
+GEMINI_ANSWER_CACHE_DISK = os.getenv('GEMINI_ANSWER_CACHE_DISK', 'true').strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+
+# --- Notificaciones de errores en hojas de casos ---
+# Mensajes por segundo (y ráfaga máxima) al enviar los avisos agrupados de un barrido
+try:
+    ERROR_NOTIFY_RATE_PER_SEC = float(os.getenv('ERROR_NOTIFY_RATE_PER_SEC', '1'))
+except ValueError:
+    print("ERROR_NOTIFY_RATE_PER_SEC no es un número válido; usando 1 por defecto.")
+    ERROR_NOTIFY_RATE_PER_SEC = 1.0
+try:
+    ERROR_NOTIFY_BURST = int(os.getenv('ERROR_NOTIFY_BURST', '5'))
+except ValueError:
+    print("ERROR_NOTIFY_BURST no es un número válido; usando 5 por defecto.")
+    ERROR_NOTIFY_BURST = 5
+
+# --- Vencimiento de estados pendientes de usuario ---
+# Minutos de vida de cada estado según su flujo, contados desde su última actualización (0 = no vence)
+try:
+    STATE_TTL_FACTURA_A_MIN = float(os.getenv('STATE_TTL_FACTURA_A_MIN', '10'))
+except ValueError:
+    print("STATE_TTL_FACTURA_A_MIN no es un número válido; usando 10 min por defecto.")
+    STATE_TTL_FACTURA_A_MIN = 10.0
+try:
+    STATE_TTL_CAMBIOS_DEVOLUCIONES_MIN = float(os.getenv('STATE_TTL_CAMBIOS_DEVOLUCIONES_MIN', '30'))
+except ValueError:
+    print("STATE_TTL_CAMBIOS_DEVOLUCIONES_MIN no es un número válido; usando 30 min por defecto.")
+    STATE_TTL_CAMBIOS_DEVOLUCIONES_MIN = 30.0
+# El estado de una tarea activa se borra al finalizarla; 0 = no vence mientras la tarea siga activa
+try:
+    STATE_TTL_TAREA_MIN = float(os.getenv('STATE_TTL_TAREA_MIN', '0'))
+except ValueError:
+    print("STATE_TTL_TAREA_MIN no es un número válido; usando 0 (sin vencimiento) por defecto.")
+    STATE_TTL_TAREA_MIN = 0.0
+# Resto de los flujos (solicitudes de envíos, reembolsos, cancelaciones, etc.)
+try:
+    STATE_TTL_DEFAULT_MIN = float(os.getenv('STATE_TTL_DEFAULT_MIN', '30'))
+except ValueError:
+    print("STATE_TTL_DEFAULT_MIN no es un número válido; usando 30 min por defecto.")
+    STATE_TTL_DEFAULT_MIN = 30.0
+# Segundos entre barridos de estados vencidos
+try:
+    STATE_SWEEP_INTERVAL_SEC = float(os.getenv('STATE_SWEEP_INTERVAL_SEC', '60'))
+except ValueError:
+    print("STATE_SWEEP_INTERVAL_SEC no es un número válido; usando 60 s por defecto.")
+    STATE_SWEEP_INTERVAL_SEC = 60.0
+
 # Validaciones básicas
 if not TOKEN:
     print("⚠️ Advertencia: La variable de entorno DISCORD_TOKEN no está configurada.")
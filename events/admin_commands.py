@@ -61,8 +61,8 @@ class AdminCommands(commands.Cog):
             # 1. Limpiar cache de estados
             try:
                 from utils.state_manager import cleanup_expired_states
-                cleanup_expired_states()
-                print('[ADMIN] Cache de estados limpiado')
+                eliminados = cleanup_expired_states()
+                print(f'[ADMIN] Cache de estados limpiado ({eliminados} estados vencidos eliminados)')
             except Exception as e:
                 print(f'[ADMIN] Error limpiando cache: {e}')
 
@@ -75,18 +75,28 @@ class AdminCommands(commands.Cog):
                     drive_instance = get_drive_client()
                     self.bot.sheets_instance = sheets_instance
                     self.bot.drive_instance = drive_instance
+                    from utils.sheet_cache import invalidar_sheet_cache
+                    from utils.sheet_schema import invalidar_sheet_schema
+                    from utils.task_table import invalidar_task_table
+                    from utils.error_sweep import invalidar_puntos_control
+                    invalidar_sheet_cache()
+                    invalidar_sheet_schema()
+                    invalidar_task_table()
+                    invalidar_puntos_control()
                     print('[ADMIN] Google Sheets y Drive reinicializados')
                 else:
                     print('[ADMIN] No se pudo reinicializar Google - credenciales no configuradas')
             except Exception as e:
                 print(f'[ADMIN] Error reinicializando Google: {e}')
 
-            # 4. Recargar manual si está configurado
+            # 4. Sincronizar manual si está configurado (solo se descarga si cambió en Drive)
             try:
                 if config.MANUAL_DRIVE_FILE_ID and hasattr(self.bot, 'drive_instance') and self.bot.drive_instance:
-                    from utils.manual_processor import load_and_cache_manual
-                    await load_and_cache_manual(self.bot.drive_instance, config.MANUAL_DRIVE_FILE_ID)
-                    print('[ADMIN] Manual recargado')
+                    from utils.manual_processor import sincronizar_manual
+                    if await sincronizar_manual(self.bot.drive_instance, config.MANUAL_DRIVE_FILE_ID):
+                        print('[ADMIN] Manual recargado')
+                    else:
+                        print('[ADMIN] Manual sin cambios, no se recargó')
                 else:
                     print('[ADMIN] No se pudo recargar el manual - configuración faltante')
             except Exception as e:
@@ -809,6 +819,16 @@ class AdminCommands(commands.Cog):
                 inline=True
             )
 
+            # Cache de tracking de Andreani
+            from utils.andreani import estadisticas_cache_tracking
+            stats_tracking = estadisticas_cache_tracking()
+            embed.add_field(
+                name='📦 Cache de tracking',
+                value=f"{stats_tracking['hits']} hits / {stats_tracking['misses']} misses "
+                      f"({stats_tracking['compartidas']} compartidas, {stats_tracking['entradas']} en cache)",
+                inline=False
+            )
+
             embed.set_footer(text=f'Solicitado por {interaction.user.display_name}')
             
             await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -1,8 +1,12 @@
 import discord
+import asyncio
 from discord.ext import commands
-from utils.state_manager import get_user_state, delete_user_state, cleanup_expired_states
-from utils.google_drive import find_or_create_drive_folder, upload_file_to_drive
+from utils.state_manager import get_user_state, delete_user_state, usuario_tiene_estado
+from utils.google_drive import find_or_create_drive_folder, upload_file_to_drive, upload_files_to_drive
+from utils.drive_folder_cache import invalidar_carpeta
 from utils.google_client_manager import get_drive_client, get_sheets_client
+from utils.sheets_gateway import run_sheets_call, open_worksheet
+from utils.sheet_schema import SheetSchema
 import config
 from datetime import datetime
 import pytz
@@ -58,38 +62,18 @@ class SolicitudCargadaButton(discord.ui.Button):
                 return
             
             # Actualizar Google Sheets
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
-            
-            # Determinar la hoja
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_FAC_A, sheet_range)
             
             # Buscar la fila del pedido
-            rows = sheet.get(sheet_range_puro)
+            rows = await run_sheets_call(sheet.get, sheet_range_puro)
             if not rows or len(rows) <= 1:
                 await interaction.response.send_message('❌ No se encontró la solicitud en Google Sheets.', ephemeral=True)
                 return
             
-            header_row = rows[0]
-            from utils.google_sheets import get_col_index
-            pedido_col = get_col_index(header_row, 'Número de Pedido')
-            check_bo_col = get_col_index(header_row, 'Check BO Carga')
+            schema = SheetSchema(rows[0])
+            pedido_col = schema.col('Número de Pedido')
+            check_bo_col = schema.col('Check BO Carga')
             
             if pedido_col is None:
                 await interaction.response.send_message('❌ No se encontró la columna "Número de Pedido" en la hoja.', ephemeral=True)
@@ -107,7 +91,7 @@ class SolicitudCargadaButton(discord.ui.Button):
                     tz = pytz.timezone('America/Argentina/Buenos_Aires')
                     now = datetime.now(tz)
                     fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-                    sheet.update_cell(i, check_bo_col + 1, fecha_hora)
+                    await run_sheets_call(sheet.update_cell, i, check_bo_col + 1, fecha_hora)
                     pedido_found = True
                     break
             
@@ -156,202 +140,186 @@ class AttachmentHandler(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        # Ignorar mensajes de bots
-        if message.author.bot:
+        # Filtro rápido: ignorar mensajes de bots, sin adjuntos, fuera del canal de Factura A
+        # o de usuarios que no están esperando adjuntos (sin consultar el estado completo)
+        if message.author.bot or not message.attachments:
+            return
+        if str(message.channel.id) != str(config.TARGET_CHANNEL_ID_FAC_A):
             return
-        
         user_id = str(message.author.id)
-        cleanup_expired_states()
+        if not usuario_tiene_estado(user_id, "facturaA"):
+            return
+        
         pending_data = get_user_state(user_id, "facturaA")
         
-        # Solo manejar si el usuario está esperando adjuntos para Factura A Y está en el canal correcto
-        if (pending_data and pending_data.get('type') == 'facturaA' and message.attachments and 
-            str(message.channel.id) == str(config.TARGET_CHANNEL_ID_FAC_A)):
-            # Eliminar el estado SOLO si vamos a procesar el mensaje
-            delete_user_state(user_id, "facturaA")
-            
-            pedido = pending_data.get('pedido')
-            solicitud_id = pending_data.get('solicitud_id')
-            if not pedido:
-                await message.reply('❌ Error: No se encontró el número de pedido')
-                return
-                
+        # El filtro de arriba ya descartó bots, mensajes sin adjuntos y otros canales
+        if not pending_data or pending_data.get('type') != 'facturaA':
+            return
+        
+        # Eliminar el estado SOLO si vamos a procesar el mensaje
+        delete_user_state(user_id, "facturaA")
+        
+        pedido = pending_data.get('pedido')
+        solicitud_id = pending_data.get('solicitud_id')
+        if not pedido:
+            await message.reply('❌ Error: No se encontró el número de pedido')
+            return
+            
+        try:
+            # Obtener servicio de Google Drive
+            drive_service = await self.get_drive_service()
+            
+            # Buscar o crear carpeta del pedido
+            parent_folder_id = getattr(config, 'PARENT_DRIVE_FOLDER_ID', None)
+            print(f"🔍 DEBUG - PARENT_DRIVE_FOLDER_ID desde config: '{parent_folder_id}'")
+            
+            if not parent_folder_id:
+                print("❌ Advertencia: PARENT_DRIVE_FOLDER_ID no está configurado, creando carpeta en raíz")
+            else:
+                print(f"✅ PARENT_DRIVE_FOLDER_ID configurado: '{parent_folder_id}'")
+            
+            # Opción 1: Crear carpeta específica para el pedido
+            folder_name = f'FacturaA_{pedido}'
+            print(f"🔍 DEBUG - Nombre de carpeta a crear: '{folder_name}'")
+            print(f"🔍 DEBUG - Llamando find_or_create_drive_folder con parent_id: '{parent_folder_id}'")
+            
+            folder_id = await asyncio.to_thread(find_or_create_drive_folder, drive_service, parent_folder_id or "", folder_name)
+            print(f"🔍 DEBUG - ID de carpeta retornado: '{folder_id}'")
+            
+            # Opción 2: Usar directamente la carpeta "Adjuntos solicitudes" (comentado por ahora)
+            # folder_id = parent_folder_id
+            # print(f"🔍 DEBUG - Usando carpeta padre directamente: '{folder_id}'")
+            
+            # Subir los adjuntos en paralelo, informando el avance en un mensaje
+            total_archivos = len(message.attachments)
+            mensaje_progreso = await message.reply(f'⏳ Subiendo {total_archivos} archivo(s) a Google Drive...')
+            
+            async def informar_progreso(completados, total):
+                await mensaje_progreso.edit(content=f'⏳ Subiendo archivos a Google Drive: {completados}/{total} completados...')
+            
             try:
-                # Obtener servicio de Google Drive
-                drive_service = await self.get_drive_service()
-                
-                # Buscar o crear carpeta del pedido
-                parent_folder_id = getattr(config, 'PARENT_DRIVE_FOLDER_ID', None)
-                print(f"🔍 DEBUG - PARENT_DRIVE_FOLDER_ID desde config: '{parent_folder_id}'")
-                
-                if not parent_folder_id:
-                    print("❌ Advertencia: PARENT_DRIVE_FOLDER_ID no está configurado, creando carpeta en raíz")
-                else:
-                    print(f"✅ PARENT_DRIVE_FOLDER_ID configurado: '{parent_folder_id}'")
-                
-                # Opción 1: Crear carpeta específica para el pedido
-                folder_name = f'FacturaA_{pedido}'
-                print(f"🔍 DEBUG - Nombre de carpeta a crear: '{folder_name}'")
-                print(f"🔍 DEBUG - Llamando find_or_create_drive_folder con parent_id: '{parent_folder_id}'")
-                
-                folder_id = find_or_create_drive_folder(drive_service, parent_folder_id or "", folder_name)
-                print(f"🔍 DEBUG - ID de carpeta retornado: '{folder_id}'")
-                
-                # Opción 2: Usar directamente la carpeta "Adjuntos solicitudes" (comentado por ahora)
-                # folder_id = parent_folder_id
-                # print(f"🔍 DEBUG - Usando carpeta padre directamente: '{folder_id}'")
-                
-                # Subir cada adjunto
-                uploaded_files = []
-                
-                for attachment in message.attachments:
-                    try:
-                        uploaded = upload_file_to_drive(drive_service, folder_id, attachment)
-                        uploaded_files.append(uploaded)
-                        
-                        # Delay adicional entre archivos para mayor seguridad
-                        import asyncio
-                        await asyncio.sleep(0.5)
-                            
-                    except Exception as upload_error:
-                        # Mostrar error detallado en Discord
-                        error_details = f"❌ **Error al subir {attachment.filename}:**\n{str(upload_error)}"
-                        
-                        # Agregar debug info si está disponible
-                        if hasattr(upload_file_to_drive, 'debug_info') and upload_file_to_drive.debug_info:
-                            error_details = f"{upload_file_to_drive.debug_info}\n\n{error_details}"
-                            upload_file_to_drive.debug_info = ""
-                        
-                        await message.reply(error_details)
-                        return
-                
-                # Confirmar al usuario
-                file_names = ', '.join([f["name"] for f in uploaded_files])
-                success_message = f'✅ **Archivos subidos exitosamente**\n\n📁 **Pedido:** {pedido}\n📎 **Archivos:** {file_names}'
-                
-                await message.reply(success_message)
-                
-                # Solo enviar embed con botón de confirmación para Factura A
-                # Buscar información del caso en Google Sheets para crear el embed
-                if not config.GOOGLE_CREDENTIALS_JSON or not config.SPREADSHEET_ID_FAC_A:
-                    print("Advertencia: Credenciales de Google no configuradas para buscar información del caso")
-                    caso_info = "N/A"
-                    fecha_carga = "N/A"
-                else:
-                    client = get_sheets_client()
-                    spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
-                    sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
-                    
-                    # Determinar la hoja
-                    hoja_nombre = None
-                    if '!' in sheet_range:
-                        partes = sheet_range.split('!')
-                        if len(partes) == 2:
-                            hoja_nombre = partes[0].strip("'")
-                            sheet_range_puro = partes[1]
-                        else:
-                            hoja_nombre = None
-                            sheet_range_puro = sheet_range
-                    else:
-                        sheet_range_puro = sheet_range
-                    
-                    if hoja_nombre:
-                        sheet = spreadsheet.worksheet(hoja_nombre)
-                    else:
-                        sheet = spreadsheet.sheet1
-                    
-                    # Buscar la fila del pedido para obtener información completa
-                    rows = sheet.get(sheet_range_puro)
-                    caso_info = "N/A"
-                    fecha_carga = "N/A"
-                    
-                    def normaliza_columna(nombre):
-                        return str(nombre).strip().replace(' ', '').replace('/', '').replace('-', '').lower()
-                    
-                    if rows and len(rows) > 1:
-                        header_row = rows[0]
-                        # Buscar columnas robustamente
-                        pedido_col = None
-                        caso_col = None
-                        fecha_col = None
-                        for idx, col_name in enumerate(header_row):
-                            norm = normaliza_columna(col_name)
-                            if norm == normaliza_columna('Número de pedido'):
-                                pedido_col = idx
-                            if norm == normaliza_columna('Caso'):
-                                caso_col = idx
-                            if norm == normaliza_columna('Fecha/Hora'):
-                                fecha_col = idx
-                        if pedido_col is not None:
-                            for row in rows[1:]:
-                                if len(row) > pedido_col and str(row[pedido_col]).strip() == pedido:
-                                    if caso_col is not None and len(row) > caso_col:
-                                        caso_info = str(row[caso_col]).replace('#', '')
-                                    if fecha_col is not None and len(row) > fecha_col:
-                                        fecha_carga = str(row[fecha_col])
-                                    break
-                
-                # Crear y enviar el embed solo para Factura A
-                embed = discord.Embed(
-                    title='🧾 Nueva Solicitud de Factura A',
-                    description=f'Se ha cargado una nueva solicitud de Factura A con archivos adjuntos.',
-                    color=discord.Color.blue(),
-                    timestamp=datetime.now()
-                )
-                
-                embed.add_field(
-                    name='📋 Número de Pedido',
-                    value=pedido,
-                    inline=True
-                )
-                
-                embed.add_field(
-                    name='📝 Número de Caso',
-                    value=caso_info,
-                    inline=True
-                )
+                try:
+                    resultados = await upload_files_to_drive(drive_service, folder_id, message.attachments, progreso=informar_progreso)
+                except Exception:
+                    # La carpeta del cache pudo haberse borrado o movido: resolverla de nuevo y reintentar una vez
+                    invalidar_carpeta(parent_folder_id or "", folder_name)
+                    folder_id = await asyncio.to_thread(find_or_create_drive_folder, drive_service, parent_folder_id or "", folder_name)
+                    resultados = await upload_files_to_drive(drive_service, folder_id, message.attachments, progreso=informar_progreso)
+            except Exception as folder_error:
+                # No se pudo acceder a la carpeta destino: no se subió ningún archivo
+                error_details = f"❌ **Error al subir los archivos:**\n{str(folder_error)}"
+                if getattr(upload_file_to_drive, 'debug_info', ''):
+                    error_details = f"{upload_file_to_drive.debug_info}\n\n{error_details}"
+                    upload_file_to_drive.debug_info = ""
+                await mensaje_progreso.edit(content=error_details[:2000])
+                return
+            
+            uploaded_files = [r for r in resultados if not isinstance(r, Exception)]
+            errores = [(a, r) for a, r in zip(message.attachments, resultados) if isinstance(r, Exception)]
+            if errores:
+                # Mostrar error detallado en Discord
+                error_details = '\n'.join(f"❌ **Error al subir {a.filename}:**\n{str(e)}" for a, e in errores)
+                if uploaded_files:
+                    error_details += f"\n\n✅ Subidos: {', '.join(f['name'] for f in uploaded_files)}"
+                await mensaje_progreso.edit(content=error_details[:2000])
+                return
+            
+            # Confirmar al usuario
+            file_names = ', '.join([f["name"] for f in uploaded_files])
+            success_message = f'✅ **Archivos subidos exitosamente**\n\n📁 **Pedido:** {pedido}\n📎 **Archivos:** {file_names}'
+            
+            await mensaje_progreso.edit(content=success_message)
+            
+            # Solo enviar embed con botón de confirmación para Factura A
+            # Buscar información del caso en Google Sheets para crear el embed
+            if not config.GOOGLE_CREDENTIALS_JSON or not config.SPREADSHEET_ID_FAC_A:
+                print("Advertencia: Credenciales de Google no configuradas para buscar información del caso")
+                caso_info = "N/A"
+                fecha_carga = "N/A"
+            else:
+                sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
+                sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_FAC_A, sheet_range)
                 
-                embed.add_field(
-                    name='👤 Agente',
-                    value=message.author.display_name,
-                    inline=True
-                )
+                # Buscar la fila del pedido para obtener información completa
+                rows = await run_sheets_call(sheet.get, sheet_range_puro)
+                caso_info = "N/A"
+                fecha_carga = "N/A"
                 
-                embed.add_field(
-                    name='📅 Fecha de Carga',
-                    value=fecha_carga,
-                    inline=True
+                if rows and len(rows) > 1:
+                    schema = SheetSchema(rows[0])
+                    pedido_col = schema.col('Número de pedido')
+                    caso_col = schema.col('Caso')
+                    fecha_col = schema.col('Fecha/Hora')
+                    if pedido_col is not None:
+                        for row in rows[1:]:
+                            if len(row) > pedido_col and str(row[pedido_col]).strip() == pedido:
+                                if caso_col is not None and len(row) > caso_col:
+                                    caso_info = str(row[caso_col]).replace('#', '')
+                                if fecha_col is not None and len(row) > fecha_col:
+                                    fecha_carga = str(row[fecha_col])
+                                break
+            
+            # Crear y enviar el embed solo para Factura A
+            embed = discord.Embed(
+                title='🧾 Nueva Solicitud de Factura A',
+                description=f'Se ha cargado una nueva solicitud de Factura A con archivos adjuntos.',
+                color=discord.Color.blue(),
+                timestamp=datetime.now()
+            )
+            
+            embed.add_field(
+                name='📋 Número de Pedido',
+                value=pedido,
+                inline=True
+            )
+            
+            embed.add_field(
+                name='📝 Número de Caso',
+                value=caso_info,
+                inline=True
+            )
+            
+            embed.add_field(
+                name='👤 Agente',
+                value=message.author.display_name,
+                inline=True
+            )
+            
+            embed.add_field(
+                name='📅 Fecha de Carga',
+                value=fecha_carga,
+                inline=True
+            )
+            
+            embed.add_field(
+                name='📎 Archivos',
+                value=file_names,
+                inline=False
+            )
+            
+            embed.set_footer(text='Presiona el botón para marcar como cargada')
+            
+            # Crear la vista con el botón
+            view = SolicitudCargadaView(pedido, caso_info, message.author.display_name, fecha_carga, str(message.id))
+            
+            # Enviar el embed mencionando al rol configurado
+            bo_role_id = getattr(config, 'SETUP_BO_ROL', None)
+            if bo_role_id:
+                await message.channel.send(
+                    content=f'<@&{bo_role_id}> Nueva solicitud de Factura A cargada',
+                    embed=embed,
+                    view=view
                 )
-                
-                embed.add_field(
-                    name='📎 Archivos',
-                    value=file_names,
-                    inline=False
+            else:
+                await message.channel.send(
+                    content='Nueva solicitud de Factura A cargada',
+                    embed=embed,
+                    view=view
                 )
-                
-                embed.set_footer(text='Presiona el botón para marcar como cargada')
-                
-                # Crear la vista con el botón
-                view = SolicitudCargadaView(pedido, caso_info, message.author.display_name, fecha_carga, str(message.id))
-                
-                # Enviar el embed mencionando al rol configurado
-                bo_role_id = getattr(config, 'SETUP_BO_ROL', None)
-                if bo_role_id:
-                    await message.channel.send(
-                        content=f'<@&{bo_role_id}> Nueva solicitud de Factura A cargada',
-                        embed=embed,
-                        view=view
-                    )
-                else:
-                    await message.channel.send(
-                        content='Nueva solicitud de Factura A cargada',
-                        embed=embed,
-                        view=view
-                    )
-                
-            except Exception as error:
-                print(f'Error al subir adjuntos a Google Drive para Factura A: {error}')
-                await message.reply(f'❌ Hubo un error al subir los archivos a Google Drive. Detalles: {error}')
+            
+        except Exception as error:
+            print(f'Error al subir adjuntos a Google Drive para Factura A: {error}')
+            await message.reply(f'❌ Hubo un error al subir los archivos a Google Drive. Detalles: {error}')
 
 class NotaCreditoCargadaButton(discord.ui.Button):
     def __init__(self, pedido, caso, agente, fecha_carga, message_id):
@@ -404,38 +372,18 @@ class NotaCreditoCargadaButton(discord.ui.Button):
                 return
             
             # Actualizar Google Sheets
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_NC', 'NC!A:G')
-            
-            # Determinar la hoja
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_FAC_A, sheet_range)
             
             # Buscar la fila del pedido
-            rows = sheet.get(sheet_range_puro)
+            rows = await run_sheets_call(sheet.get, sheet_range_puro)
             if not rows or len(rows) <= 1:
                 await interaction.response.send_message('❌ No se encontró la solicitud en Google Sheets.', ephemeral=True)
                 return
             
-            header_row = rows[0]
-            from utils.google_sheets import get_col_index
-            pedido_col = get_col_index(header_row, 'Número de Pedido')
-            check_bo_col = get_col_index(header_row, 'Check BO Carga')
+            schema = SheetSchema(rows[0])
+            pedido_col = schema.col('Número de Pedido')
+            check_bo_col = schema.col('Check BO Carga')
             
             if pedido_col is None:
                 await interaction.response.send_message('❌ No se encontró la columna "Número de Pedido" en la hoja.', ephemeral=True)
@@ -457,7 +405,7 @@ class NotaCreditoCargadaButton(discord.ui.Button):
                     
                     # Actualizar la celda específica
                     cell_address = f'{chr(65 + check_bo_col)}{i}'  # Convertir índice a letra de columna
-                    sheet.update(cell_address,  [[fecha_hora_confirmacion]])
+                    await run_sheets_call(sheet.update, cell_address, [[fecha_hora_confirmacion]])
                     break
             
             if not pedido_found:
@@ -2,10 +2,15 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import config
-from utils.andreani import get_andreani_tracking
+from utils.andreani import consultar_tracking, formatear_tracking, consultar_trackings, estado_tracking
+from utils.sheets_gateway import run_sheets_call, open_worksheet, columna_inicial
+from utils.sheet_schema import SheetSchema
+from gspread.utils import rowcol_to_a1
+from typing import Optional
 from utils.google_client_manager import get_sheets_client
 from interactions.modals import FacturaAModal, PiezaFaltanteModal
 import re
+import time
 from datetime import datetime
 
 def get_guild_object():
@@ -156,36 +161,8 @@ class InteractionCommands(commands.Cog):
             await interaction.followup.send('❌ Error: La API de Andreani no está configurada correctamente.', ephemeral=True)
             return
         try:
-            tracking_data = get_andreani_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
-            if tracking_data:
-                info = tracking_data
-                # Estado actual y fecha
-                estado = info.get('procesoActual', {}).get('titulo', 'Sin datos')
-                fecha_entrega = clean_html(info.get('fechaEstimadaDeEntrega', ''))
-                tracking_info = f"📦 Estado del tracking {tracking_number}:\n{estado} - {fecha_entrega}\n\n"
-                # Historial
-                timelines = info.get('timelines', [])
-                if timelines:
-                    tracking_info += "Historial:\n"
-                    # Ordenar por fecha descendente
-                    eventos = []
-                    for tl in sorted(timelines, key=lambda x: x.get('orden', 0), reverse=True):
-                        for traduccion in tl.get('traducciones', []):
-                            fecha_iso = traduccion.get('fechaEvento', '')
-                            # Formatear fecha a dd/mm/yyyy HH:MM
-                            try:
-                                dt = datetime.fromisoformat(fecha_iso)
-                                fecha_fmt = dt.strftime('%d/%m/%Y, %H:%M')
-                            except Exception:
-                                fecha_fmt = fecha_iso
-                            desc = clean_html(traduccion.get('traduccion', ''))
-                            suc = traduccion.get('sucursal', {}).get('nombre', '')
-                            eventos.append(f"{fecha_fmt}: {desc} ({suc})")
-                    tracking_info += '\n'.join(eventos)
-                else:
-                    tracking_info += "Historial: No disponible\n"
-            else:
-                tracking_info = f"😕 No se pudo encontrar la información de tracking para **{tracking_number}**."
+            tracking_data = await consultar_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
+            tracking_info = formatear_tracking(tracking_number, tracking_data)
         except ValueError as ve:
             print('Error de validación en tracking de Andreani:', ve)
             tracking_info = f"❌ Error de configuración: {ve}"
@@ -194,6 +171,134 @@ class InteractionCommands(commands.Cog):
             tracking_info = f"❌ Hubo un error al consultar el estado del tracking para **{tracking_number}**. Detalles: {error}"
         await interaction.followup.send(tracking_info, ephemeral=False)
 
+    @maybe_guild_decorator()
+    @app_commands.command(name="tracking-masivo", description="Consulta el estado de varios envíos de Andreani a la vez (Back Office)")
+    @app_commands.describe(
+        numeros="Números de seguimiento separados por coma, espacio o salto de línea",
+        columna="Nombre de la columna de la hoja de envíos de donde leer los números (en lugar de 'numeros')",
+        columna_estado="Columna de la hoja de envíos donde escribir el estado actual (solo con 'columna')"
+    )
+    async def tracking_masivo(self, interaction: discord.Interaction, numeros: Optional[str] = None,
+                              columna: Optional[str] = None, columna_estado: Optional[str] = None):
+        if not check_back_office_permissions(interaction):
+            await interaction.response.send_message('❌ No tienes permisos para usar este comando.', ephemeral=True)
+            return
+        if not config.ANDREANI_AUTH_HEADER:
+            await interaction.response.send_message('❌ Error: La API de Andreani no está configurada correctamente.', ephemeral=True)
+            return
+        if not numeros and not columna:
+            await interaction.response.send_message('❌ Debes indicar los números de seguimiento o la columna de la hoja de donde leerlos.', ephemeral=True)
+            return
+        await interaction.response.defer(thinking=True)
+
+        # número -> filas de la hoja donde aparece (solo cuando se leen de la hoja)
+        filas_por_numero = {}
+        sheet = None
+        schema = None
+        try:
+            if columna:
+                sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, config.GOOGLE_SHEET_RANGE_ENVIOS)
+                rows = await run_sheets_call(sheet.get, sheet_range_puro)
+                schema = SheetSchema(rows[0] if rows else [])
+                col_idx = schema.col(columna)
+                if col_idx is None:
+                    await interaction.followup.send(f'❌ No se encontró la columna "{columna}" en la hoja de envíos.', ephemeral=True)
+                    return
+                for fila_idx, row in enumerate(rows[1:], start=2):
+                    numero = schema.valor(row, columna).strip()
+                    if numero:
+                        filas_por_numero.setdefault(numero, []).append(fila_idx)
+                lista = list(filas_por_numero)
+            else:
+                lista = list(dict.fromkeys(n for n in re.split(r'[\s,;]+', numeros) if n))
+        except Exception as error:
+            print('Error al leer los números de tracking de la hoja:', error)
+            await interaction.followup.send(f'❌ No se pudieron leer los números de la hoja. Detalles: {error}', ephemeral=True)
+            return
+
+        if not lista:
+            await interaction.followup.send('😕 No se encontraron números de seguimiento para consultar.', ephemeral=True)
+            return
+        if len(lista) > config.TRACKING_BULK_MAX:
+            await interaction.followup.send(f'⚠️ Se consultarán solo los primeros {config.TRACKING_BULK_MAX} de {len(lista)} números.', ephemeral=True)
+            lista = lista[:config.TRACKING_BULK_MAX]
+
+        # Resultados paginados: un embed por página que se va completando a medida que llegan
+        por_pagina = 10
+        total_paginas = (len(lista) + por_pagina - 1) // por_pagina
+        estados = {}
+        lineas = []
+        mensaje = None
+        ultima_edicion = 0.0
+        pendiente = False
+
+        def armar_embed():
+            pagina = (len(lineas) - 1) // por_pagina
+            embed = discord.Embed(
+                title=f'📦 Tracking masivo - página {pagina + 1}/{total_paginas}',
+                description='\n'.join(lineas[pagina * por_pagina:(pagina + 1) * por_pagina]),
+                color=discord.Color.blue(),
+                timestamp=datetime.now()
+            )
+            embed.set_footer(text=f'{len(lineas)}/{len(lista)} consultados')
+            return embed
+
+        async for numero, resultado in consultar_trackings(lista, config.ANDREANI_AUTH_HEADER):
+            if isinstance(resultado, Exception):
+                lineas.append(f'❌ **{numero}**: {str(resultado)[:150]}')
+            elif not resultado:
+                lineas.append(f'😕 **{numero}**: sin información')
+            else:
+                estado, fecha_entrega = estado_tracking(resultado)
+                estados[numero] = estado
+                lineas.append(f'✅ **{numero}**: {estado}' + (f' - {fecha_entrega}' if fecha_entrega else ''))
+            pendiente = True
+            try:
+                if mensaje is None or (len(lineas) - 1) % por_pagina == 0:
+                    # Primera línea de una página nueva: nuevo mensaje
+                    mensaje = await interaction.followup.send(embed=armar_embed(), wait=True)
+                    ultima_edicion, pendiente = time.monotonic(), False
+                elif len(lineas) % por_pagina == 0 or time.monotonic() - ultima_edicion >= 2:
+                    # Editar como mucho cada 2 segundos (o al completar la página) por el rate limit de Discord
+                    await mensaje.edit(embed=armar_embed())
+                    ultima_edicion, pendiente = time.monotonic(), False
+            except Exception as error:
+                print('Error al enviar resultados del tracking masivo:', error)
+        if mensaje is not None and pendiente:
+            try:
+                await mensaje.edit(embed=armar_embed())
+            except Exception as error:
+                print('Error al enviar resultados del tracking masivo:', error)
+
+        # Escribir el estado actual en la hoja con una sola actualización en lote
+        if columna_estado:
+            if sheet is None:
+                await interaction.followup.send('⚠️ Para escribir el estado en la hoja hay que leer los números desde una columna.', ephemeral=True)
+                return
+            estado_col = schema.col(columna_estado)
+            if estado_col is None:
+                await interaction.followup.send(f'❌ No se encontró la columna "{columna_estado}" en la hoja de envíos.', ephemeral=True)
+                return
+            hoja = "'" + sheet.title.replace("'", "''") + "'!"
+            # estado_col es relativo al rango: sumar su primera columna para escribir en la columna real
+            columna = columna_inicial(sheet_range_puro) + estado_col + 1
+            data = [
+                {'range': hoja + rowcol_to_a1(fila_idx, columna), 'values': [[estado]]}
+                for numero, estado in estados.items()
+                for fila_idx in filas_por_numero.get(numero, [])
+            ]
+            if data:
+                try:
+                    await run_sheets_call(
+                        sheet.spreadsheet.values_batch_update,
+                        {'valueInputOption': 'USER_ENTERED', 'data': data},
+                        spreadsheet_id=config.SPREADSHEET_ID_CASOS
+                    )
+                    await interaction.followup.send(f'✅ Estado actualizado en {len(data)} filas de la hoja.', ephemeral=True)
+                except Exception as error:
+                    print('Error al escribir los estados de tracking en la hoja:', error)
+                    await interaction.followup.send(f'❌ No se pudo escribir el estado en la hoja. Detalles: {error}', ephemeral=True)
+
     @maybe_guild_decorator()
     @app_commands.command(name="cambios-devoluciones", description="Inicia el registro de un nuevo caso de Cambios/Devoluciones")
     async def cambios_devoluciones(self, interaction: discord.Interaction):
@@ -254,52 +359,10 @@ class InteractionCommands(commands.Cog):
             if not config.SPREADSHEET_ID_BUSCAR_CASO:
                 await interaction.followup.send('❌ Error: El ID de la hoja de búsqueda no está configurado.', ephemeral=True)
                 return
-            # Obtener cliente de Google Sheets
-            from utils.google_client_manager import get_sheets_client
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_BUSCAR_CASO)
-            found_rows = []
-            search_summary = f"Resultados de la búsqueda para el pedido **{pedido}**:\n\n"
-            for sheet_name in config.SHEETS_TO_SEARCH:
-                try:
-                    sheet = spreadsheet.worksheet(sheet_name)
-                    rows = sheet.get('A:Z')
-                except Exception as sheet_error:
-                    search_summary += f"⚠️ Error al leer la pestaña \"{sheet_name}\".\n"
-                    continue
-                if not rows or len(rows) <= 1:
-                    continue
-                header_row = rows[0]
-                try:
-                    pedido_column_index = next(i for i, h in enumerate(header_row) if h and str(h).strip().lower() == 'número de pedido')
-                except StopIteration:
-                    search_summary += f"⚠️ No se encontró la columna \"Número de pedido\" en la pestaña \"{sheet_name}\".\n"
-                    continue
-                for i, row in enumerate(rows[1:], start=2):
-                    if len(row) <= pedido_column_index:
-                        continue
-                    row_pedido_value = str(row[pedido_column_index]).strip() if row[pedido_column_index] else ''
-                    if row_pedido_value.lower() == pedido.lower():
-                        found_rows.append({
-                            'sheet': sheet_name,
-                            'row_number': i,
-                            'data': row
-                        })
-            if found_rows:
-                search_summary += f"✅ Se encontraron **{len(found_rows)}** coincidencias:\n\n"
-                detailed_results = ''
-                for found in found_rows:
-                    detailed_results += f"**Pestaña:** \"{found['sheet']}\", **Fila:** {found['row_number']}\n"
-                    display_columns = ' | '.join(found['data'][:6])
-                    detailed_results += f"`{display_columns}`\n\n"
-                full_message = search_summary + detailed_results
-                if len(full_message) > 2000:
-                    await interaction.followup.send(search_summary + "Los resultados completos son demasiado largos para mostrar aquí. Por favor, revisa la hoja de Google Sheets directamente.", ephemeral=False)
-                else:
-                    await interaction.followup.send(full_message, ephemeral=False)
-            else:
-                search_summary += '😕 No se encontraron coincidencias en las pestañas configuradas.'
-                await interaction.followup.send(search_summary, ephemeral=False)
+            # Buscar en el índice de pedidos (se refresca en segundo plano)
+            from utils.case_index import armar_respuesta_busqueda
+            mensaje = await armar_respuesta_busqueda(pedido)
+            await interaction.followup.send(mensaje, ephemeral=False)
         except Exception as error:
             print('Error general durante la búsqueda de casos en Google Sheets:', error)
             await interaction.followup.send('❌ Hubo un error al realizar la búsqueda de casos. Por favor, inténtalo de nuevo o contacta a un administrador.', ephemeral=False)
@@ -463,7 +526,7 @@ class InteractionCommands(commands.Cog):
             
             # Importar las funciones necesarias
             import config
-            from utils.google_sheets import initialize_google_sheets, check_sheet_for_errors
+            from utils.google_sheets import initialize_google_sheets
             
             # Verificar configuración
             if not config.GOOGLE_CREDENTIALS_JSON:
@@ -477,64 +540,45 @@ class InteractionCommands(commands.Cog):
                 return
             
             # Inicializar Google Sheets
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
+            from utils.sheets_gateway import open_spreadsheet, split_sheet_range
+            from utils.error_sweep import barrer_errores
+            spreadsheet = await open_spreadsheet(config.SPREADSHEET_ID_CASOS)
             
             # Contador de errores encontrados
             total_errores = 0
             hojas_verificadas = 0
             
-            # Verificar cada rango/canal configurado
-            for sheet_range, channel_id in config.MAPA_RANGOS_ERRORES.items():
-                if not sheet_range or not channel_id:
+            # Mismo barrido que la tarea periódica: comparte su lock y sus puntos de control,
+            # así una verificación manual simultánea no duplica avisos
+            rangos = {r: c for r, c in config.MAPA_RANGOS_ERRORES.items() if r and c}
+            resumen = await barrer_errores(self.bot, spreadsheet, rangos, int(config.GUILD_ID))
+            
+            for sheet_range, resultado in resumen.items():
+                hoja_nombre, _ = split_sheet_range(sheet_range)
+                if resultado['error']:
+                    await interaction.followup.send(f"❌ Error al verificar {sheet_range}: {resultado['error']}", ephemeral=True)
                     continue
-                
-                try:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-                    if '!' in sheet_range:
-                        partes = sheet_range.split('!')
-                        if len(partes) == 2:
-                            hoja_nombre = partes[0].strip("'")
-                            sheet_range_puro = partes[1]
-                    
-                    if hoja_nombre:
-                        sheet = spreadsheet.worksheet(hoja_nombre)
-                    else:
-                        sheet = spreadsheet.sheet1
-                    
-                    # Ejecutar verificación de errores
-                    await check_sheet_for_errors(
-                        self.bot,
-                        sheet,
-                        sheet_range,
-                        int(channel_id),
-                        int(config.GUILD_ID)
-                    )
-                    
-                    hojas_verificadas += 1
-                    await interaction.followup.send(f"✅ Verificada hoja: {hoja_nombre or '[default]'} (Rango: {sheet_range})", ephemeral=True)
-                    
-                except Exception as error:
-                    await interaction.followup.send(f"❌ Error al verificar {sheet_range}: {error}", ephemeral=True)
+                hojas_verificadas += 1
+                total_errores += resultado['notificadas']
+                await interaction.followup.send(
+                    f"✅ Verificada hoja: {hoja_nombre or '[default]'} (Rango: {sheet_range}) - {resultado['notificadas']} errores notificados",
+                    ephemeral=True
+                )
             
             # Resumen final
             await interaction.followup.send(
                 f"🎯 **Verificación manual completada**\n\n"
                 f"📊 **Resumen:**\n"
                 f"• Hojas verificadas: {hojas_verificadas}\n"
+                f"• Errores notificados: {total_errores}\n"
                 f"• Rangos configurados: {len(config.MAPA_RANGOS_ERRORES)}\n\n"
-                f"✅ La verificación automática continuará ejecutándose cada {config.ERROR_CHECK_INTERVAL_MS / 1000} segundos.",
+                f"✅ La verificación automática continuará ejecutándose cada {config.ERROR_CHECK_INTERVAL_MIN} minutos.",
                 ephemeral=True
             )
             
         except Exception as error:
             await interaction.followup.send(f"❌ Error general en la verificación manual: {error}", ephemeral=True)
 
-def clean_html(raw_html):
-    cleanr = re.compile('<.*?>')
-    return re.sub(cleanr, '', raw_html).replace('&nbsp;', ' ').replace('&aacute;', 'á').replace('&eacute;', 'é').replace('&iacute;', 'í').replace('&oacute;', 'ó').replace('&uacute;', 'ú').replace('&ntilde;', 'ñ')
-
 async def setup(bot):
     await bot.add_cog(InteractionCommands(bot)) 
 
@@ -6,7 +6,6 @@ import utils.state_manager as state_manager
 import config
 from utils.state_manager import generar_solicitud_id
 import time
-from utils.state_manager import cleanup_expired_states
 
 # --- NUEVO: Definición de la View y el Button fuera de la función ---
 class CompleteCasoButton(Button):
@@ -27,7 +26,6 @@ class InteractionSelects(commands.Cog):
 
     @commands.Cog.listener()
     async def on_interaction(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         # --- Manejar Select Menu de Tipo de Solicitud ---
         if (interaction.type == discord.InteractionType.component and 
             interaction.data and 
@@ -5,10 +5,13 @@ import asyncio
 import re
 from discord.ext import commands
 from datetime import datetime
-from utils.google_sheets import check_if_pedido_exists
-from utils.google_sheets import initialize_google_sheets, check_if_pedido_exists
+from utils.google_sheets import initialize_google_sheets
+from utils.sheet_cache import get_sheet_cache
+from utils.sheet_schema import SheetSchema
+from utils.case_index import armar_respuesta_busqueda
 from utils.google_client_manager import get_sheets_client
-from utils.state_manager import generar_solicitud_id, cleanup_expired_states, get_user_state
+from utils.sheets_gateway import run_sheets_call, open_worksheet, open_worksheet_by_title
+from utils.state_manager import generar_solicitud_id, get_user_state
 import utils.state_manager as state_manager
 
 class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
@@ -54,7 +57,6 @@ class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
         self.add_item(self.descripcion)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             solicitud_id = generar_solicitud_id(user_id)
@@ -72,44 +74,24 @@ class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de Factura A no está configurado.', ephemeral=True)
                 return
             
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_FAC_A', 'A:E')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_FAC_A, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Factura A.', ephemeral=True)
                 return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-            header = rows[0] if rows else []
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
+            header = cache.header
+            schema = SheetSchema(header)
             # Buscar índices de columnas por nombre
-            pedido_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'número de pedido'), 0)
-            fecha_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'fecha/hora'), 1)
-            caso_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'caso'), 2)
-            email_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'email'), 3)
-            desc_col = next((i for i, h in enumerate(header) if 'observaciones' in normaliza_columna(h)), 4)
+            pedido_col = schema.col('Número de pedido', default=0)
+            fecha_col = schema.col('Fecha/Hora', default=1)
+            caso_col = schema.col('Caso', default=2)
+            email_col = schema.col('Email', default=3)
+            desc_col = schema.col_contiene('Observaciones', default=4)
             # Crear fila con datos en las posiciones correctas
             row_data = [''] * len(header)
             row_data[pedido_col] = pedido
@@ -117,7 +99,8 @@ class FacturaAModal(discord.ui.Modal, title='Registrar Solicitud Factura A'):
             row_data[caso_col] = f'#{caso}'
             row_data[email_col] = email
             row_data[desc_col] = descripcion
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             parent_folder_id = getattr(config, 'PARENT_DRIVE_FOLDER_ID', None)
             if parent_folder_id:
                 state_manager.set_user_state(user_id, {"type": "facturaA", "pedido": pedido, "solicitud_id": solicitud_id, "timestamp": now.timestamp()}, "facturaA")
@@ -166,7 +149,6 @@ class FacturaBModal(discord.ui.Modal, title='Registrar Solicitud Factura B'):
         self.add_item(self.email)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             solicitud_id = generar_solicitud_id(user_id)
@@ -192,45 +174,25 @@ class FacturaBModal(discord.ui.Modal, title='Registrar Solicitud Factura B'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de Factura B no está configurado.', ephemeral=True)
                 return
             
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_FAC_B', 'FacB!A:G')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_FAC_A, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Factura B.', ephemeral=True)
                 return
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-            header = rows[0] if rows else []
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
+            header = cache.header
+            schema = SheetSchema(header)
             # Buscar índices de columnas por nombre
-            fecha_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'fecha de carga'), 0)
-            asesor_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'asesor que carga'), 1)
-            pedido_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'número de pedido'), 2)
-            caso_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'id caso wise'), 3)
-            canal_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'canal de compra'), 4)
-            email_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'correo electronico'), 5)
+            fecha_col = schema.col('Fecha de carga', default=0)
+            asesor_col = schema.col('Asesor que carga', default=1)
+            pedido_col = schema.col('Número de pedido', default=2)
+            caso_col = schema.col('ID Caso Wise', default=3)
+            canal_col = schema.col('Canal de compra', default=4)
+            email_col = schema.col('Correo electronico', default=5)
             # Crear fila con datos en las posiciones correctas
             row_data = [''] * len(header)
             row_data[fecha_col] = fecha_hora
@@ -239,7 +201,8 @@ class FacturaBModal(discord.ui.Modal, title='Registrar Solicitud Factura B'):
             row_data[caso_col] = caso
             row_data[canal_col] = canal_compra
             row_data[email_col] = email
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             
             # Crear embed con los datos de la solicitud
             embed = discord.Embed(
@@ -327,7 +290,6 @@ class CasoModal(discord.ui.Modal, title='Detalles del Caso'):
         self.add_item(self.datos_contacto)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             pending_data = state_manager.get_user_state(user_id, "cambios_devoluciones")
@@ -357,26 +319,10 @@ class CasoModal(discord.ui.Modal, title='Detalles del Caso'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de Casos no está configurado.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "cambios_devoluciones")
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
             sheet_range = getattr(config, 'SHEET_RANGE_CASOS_READ', 'A:K')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Casos.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "cambios_devoluciones")
@@ -398,18 +344,11 @@ class CasoModal(discord.ui.Modal, title='Detalles del Caso'):
                 ''                # J - Notificado
             ]
             # Ajustar la cantidad de columnas al header
-            header = rows[0] if rows else []
+            header = cache.header
             # Buscar índices de 'Agente Back' y 'Resuelto'
-            def normaliza_columna(nombre):
-                return str(nombre).strip().replace(' ', '').replace('/', '').replace('-', '').lower()
-            idx_agente_back = None
-            idx_resuelto = None
-            for idx, col_name in enumerate(header):
-                norm = normaliza_columna(col_name)
-                if norm == normaliza_columna('Agente Back'):
-                    idx_agente_back = idx
-                if norm == normaliza_columna('Resuelto'):
-                    idx_resuelto = idx
+            schema = SheetSchema(header)
+            idx_agente_back = schema.col('Agente Back')
+            idx_resuelto = schema.col('Resuelto')
             # Ajustar row_data al header
             if len(row_data) < len(header):
                 row_data += [''] * (len(header) - len(row_data))
@@ -420,7 +359,8 @@ class CasoModal(discord.ui.Modal, title='Detalles del Caso'):
                 row_data[idx_agente_back] = 'Nadie'
             if idx_resuelto is not None:
                 row_data[idx_resuelto] = 'No'
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             confirmation_message = f"""✅ **Caso registrado exitosamente**\n\n📋 **Detalles del caso:**\n• **N° de Pedido:** {pedido}\n• **N° de Caso:** {numero_caso}\n• **Tipo de Solicitud:** {tipo_solicitud}\n• **Agente:** {agente_name}\n• **Fecha:** {fecha_hora}\n\nEl caso ha sido guardado en Google Sheets y será monitoreado automáticamente."""
             await interaction.response.send_message(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "cambios_devoluciones")
@@ -447,7 +387,7 @@ class TrackingModal(discord.ui.Modal, title='Consulta de Tracking'):
         self.add_item(self.numero)
 
     async def on_submit(self, interaction: discord.Interaction):
-        from utils.andreani import get_andreani_tracking
+        from utils.andreani import consultar_tracking, formatear_tracking
         try:
             tracking_number = self.numero.value.strip()
             if not tracking_number:
@@ -462,39 +402,11 @@ class TrackingModal(discord.ui.Modal, title='Consulta de Tracking'):
             # Deferir la respuesta porque la consulta puede tomar tiempo
             await interaction.response.defer(thinking=True)
             
-            # Consultar tracking (función síncrona)
-            tracking_data = get_andreani_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
+            # Consultar tracking (asíncrona, no bloquea el bot)
+            tracking_data = await consultar_tracking(tracking_number, config.ANDREANI_AUTH_HEADER)
             
             # Procesar respuesta igual que el comando original
-            if tracking_data:
-                info = tracking_data
-                # Estado actual y fecha
-                estado = info.get('procesoActual', {}).get('titulo', 'Sin datos')
-                fecha_entrega = clean_html(info.get('fechaEstimadaDeEntrega', ''))
-                tracking_info = f"📦 Estado del tracking {tracking_number}:\n{estado} - {fecha_entrega}\n\n"
-                # Historial
-                timelines = info.get('timelines', [])
-                if timelines:
-                    tracking_info += "Historial:\n"
-                    # Ordenar por fecha descendente
-                    eventos = []
-                    for tl in sorted(timelines, key=lambda x: x.get('orden', 0), reverse=True):
-                        for traduccion in tl.get('traducciones', []):
-                            fecha_iso = traduccion.get('fechaEvento', '')
-                            # Formatear fecha a dd/mm/yyyy HH:MM
-                            try:
-                                dt = datetime.fromisoformat(fecha_iso)
-                                fecha_fmt = dt.strftime('%d/%m/%Y, %H:%M')
-                            except Exception:
-                                fecha_fmt = fecha_iso
-                            desc = clean_html(traduccion.get('traduccion', ''))
-                            suc = traduccion.get('sucursal', {}).get('nombre', '')
-                            eventos.append(f"{fecha_fmt}: {desc} ({suc})")
-                    tracking_info += '\n'.join(eventos)
-                else:
-                    tracking_info += "Historial: No disponible\n"
-            else:
-                tracking_info = f"😕 No se pudo encontrar la información de tracking para **{tracking_number}**."
+            tracking_info = formatear_tracking(tracking_number, tracking_data)
             
             # Enviar resultado
             await interaction.followup.send(tracking_info, ephemeral=False)
@@ -504,11 +416,6 @@ class TrackingModal(discord.ui.Modal, title='Consulta de Tracking'):
         if not interaction.response.is_done():
             await interaction.response.send_message('✅ Tarea finalizada.', ephemeral=True)
 
-def clean_html(raw_html):
-    """Limpia etiquetas HTML de un string"""
-    clean = re.compile('<.*?>')
-    return re.sub(clean, '', raw_html)
-
 class BuscarCasoModal(discord.ui.Modal, title='Búsqueda de Caso'):
     def __init__(self):
         super().__init__(custom_id='buscarCasoModal')
@@ -547,53 +454,9 @@ class BuscarCasoModal(discord.ui.Modal, title='Búsqueda de Caso'):
                 await interaction.followup.send('❌ Error: El ID de la hoja de búsqueda no está configurado.', ephemeral=True)
                 return
             
-            # Inicializar cliente de Google Sheets
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_BUSCAR_CASO)
-            found_rows = []
-            search_summary = f"Resultados de la búsqueda para el pedido **{pedido}**:\n\n"
-
-            for sheet_name in config.SHEETS_TO_SEARCH:
-                try:
-                    sheet = spreadsheet.worksheet(sheet_name)
-                    rows = sheet.get('A:Z')
-                except Exception as sheet_error:
-                    search_summary += f"⚠️ Error al leer la pestaña \"{sheet_name}\".\n"
-                    continue
-                if not rows or len(rows) <= 1:
-                    continue
-                header_row = rows[0]
-                try:
-                    pedido_column_index = next(i for i, h in enumerate(header_row) if h and str(h).strip().lower() == 'número de pedido')
-                except StopIteration:
-                    search_summary += f"⚠️ No se encontró la columna \"Número de pedido\" en la pestaña \"{sheet_name}\".\n"
-                    continue
-                for i, row in enumerate(rows[1:], start=2):
-                    if len(row) <= pedido_column_index:
-                        continue
-                    row_pedido_value = str(row[pedido_column_index]).strip() if row[pedido_column_index] else ''
-                    if row_pedido_value.lower() == pedido.lower():
-                        found_rows.append({
-                            'sheet': sheet_name,
-                            'row_number': i,
-                            'data': row
-                        })
-            
-            if found_rows:
-                search_summary += f"✅ Se encontraron **{len(found_rows)}** coincidencias:\n\n"
-                detailed_results = ''
-                for found in found_rows:
-                    detailed_results += f"**Pestaña:** \"{found['sheet']}\", **Fila:** {found['row_number']}\n"
-                    display_columns = ' | '.join(found['data'][:6])
-                    detailed_results += f"`{display_columns}`\n\n"
-                full_message = search_summary + detailed_results
-                if len(full_message) > 2000:
-                    await interaction.followup.send(search_summary + "Los resultados completos son demasiado largos para mostrar aquí. Por favor, revisa la hoja de Google Sheets directamente.", ephemeral=False)
-                else:
-                    await interaction.followup.send(full_message, ephemeral=False)
-            else:
-                search_summary += '😕 No se encontraron coincidencias en las pestañas configuradas.'
-                await interaction.followup.send(search_summary, ephemeral=False)
+            # Buscar en el índice de pedidos (se refresca en segundo plano)
+            mensaje = await armar_respuesta_busqueda(pedido)
+            await interaction.followup.send(mensaje, ephemeral=False)
             
         except Exception as error:
             print('Error general durante la búsqueda de casos en Google Sheets:', error)
@@ -630,12 +493,10 @@ class CantidadCasosModal(discord.ui.Modal, title='Finalizar Tarea'):
             if not config.GOOGLE_SHEET_ID_TAREAS:
                 await interaction.followup.send('❌ Error: El ID de la hoja de tareas no está configurado.', ephemeral=True)
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
+            sheet_historial = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Historial')
             from utils.google_sheets import obtener_tarea_por_id
-            datos_tarea = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+            datos_tarea = await run_sheets_call(obtener_tarea_por_id, sheet_activas, self.tarea_id)
             if not datos_tarea:
                 await interaction.followup.send('❌ No se encontró la tarea especificada.', ephemeral=True)
                 return
@@ -650,7 +511,7 @@ class CantidadCasosModal(discord.ui.Modal, title='Finalizar Tarea'):
             from utils.google_sheets import finalizar_tarea_por_id_con_cantidad
             for intento in range(max_intentos_sheet):
                 try:
-                    finalizar_tarea_por_id_con_cantidad(
+                    await finalizar_tarea_por_id_con_cantidad(
                         sheet_activas,
                         sheet_historial,
                         self.tarea_id,
@@ -757,7 +618,6 @@ class SolicitudEnviosModal(discord.ui.Modal, title='Detalles de la Solicitud de
         self.add_item(self.observaciones)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             pending_data = state_manager.get_user_state(user_id, "solicitudes_envios")
@@ -788,26 +648,10 @@ class SolicitudEnviosModal(discord.ui.Modal, title='Detalles de la Solicitud de
                 await interaction.response.send_message('❌ Error: La variable GOOGLE_SHEET_RANGE_ENVIOS no está configurada.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "solicitudes_envios")
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
             sheet_range = getattr(config, 'GOOGLE_SHEET_RANGE_ENVIOS', 'CAMBIO DE DIRECCIÓN 2025!A:M')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Solicitudes de Envíos.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "solicitudes_envios")
@@ -835,24 +679,19 @@ class SolicitudEnviosModal(discord.ui.Modal, title='Detalles de la Solicitud de
             ]
             
             # Ajustar la cantidad de columnas al header (igual que CasoModal)
-            header = rows[0] if rows else []
+            header = cache.header
             if len(row_data) < len(header):
                 row_data.extend([''] * (len(header) - len(row_data)))
             elif len(row_data) > len(header):
                 row_data = row_data[:len(header)]
             
-            # Buscar columnas especiales por nombre (igual que CasoModal)
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
-            
-            # Buscar índice de Agente Back si existe
-            idx_agente_back = next((i for i, h in enumerate(header) if 'agente back' in normaliza_columna(h)), None)
+            # Buscar índice de Agente Back si existe (igual que CasoModal)
+            idx_agente_back = SheetSchema(header).col_contiene('Agente Back')
             if idx_agente_back is not None and idx_agente_back < len(row_data):
                 row_data[idx_agente_back] = 'Nadie'
             
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             confirmation_message = f"""✅ **Solicitud registrada exitosamente**\n\n📋 **Detalles de la solicitud:**\n• **N° de Pedido:** {pedido}\n• **N° de Caso:** {numero_caso}\n• **Tipo de Solicitud:** {tipo_solicitud}\n• **Agente:** {agente_name}\n• **Fecha:** {fecha_hora}\n• **Dirección y Teléfono:** {direccion_telefono}\n"""
             if observaciones:
                 confirmation_message += f"• **Observaciones:** {observaciones}\n"
@@ -916,7 +755,6 @@ class ReembolsoModal(discord.ui.Modal, title='Detalles del Reembolso'):
         self.add_item(self.observacion)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             pending_data = state_manager.get_user_state(user_id, "reembolsos")
@@ -957,26 +795,10 @@ class ReembolsoModal(discord.ui.Modal, title='Detalles del Reembolso'):
                 await interaction.response.send_message('❌ Error: La variable SHEET_RANGE_REEMBOLSOS no está configurada.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reembolsos")
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
             sheet_range = getattr(config, 'SHEET_RANGE_REEMBOLSOS', 'REEMBOLSOS!A:L')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Reembolsos.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reembolsos")
@@ -999,12 +821,13 @@ class ReembolsoModal(discord.ui.Modal, title='Detalles del Reembolso'):
                 'Agente (Back/TL)': 'Nadie',
             }
             # Armar la fila final según el header
-            header = rows[0] if rows else []
+            header = cache.header
             row_data = []
             for col in header:
                 valor = datos.get(col, '')
                 row_data.append(valor)
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             confirmation_message = f"""✅ **Reembolso registrado exitosamente**\n\n📋 **Detalles del reembolso:**\n• **N° de Pedido:** {pedido}\n• **ZRE2/ZRE4:** {zre}\n• **Tarjeta:** {tarjeta}\n• **Correo:** {correo}\n• **Motivo:** {motivo_reembolso}\n• **Agente:** {agente_name}\n• **Fecha:** {fecha_hora}\n"""
             if observacion:
                 confirmation_message += f"• **Observación:** {observacion}\n"
@@ -1069,41 +892,24 @@ class CancelacionModal(discord.ui.Modal, title='Registrar Cancelación'):
             if not config.GOOGLE_CREDENTIALS_JSON or not config.SPREADSHEET_ID_CASOS or not config.GOOGLE_SHEET_RANGE_CANCELACIONES:
                 await interaction.response.send_message('❌ Error de configuración para Google Sheets.', ephemeral=True)
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
             sheet_range = config.GOOGLE_SHEET_RANGE_CANCELACIONES
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            header = rows[0] if rows else []
-            def normaliza_columna(nombre):
-                return str(nombre).strip().replace(' ', '').replace('/', '').replace('-', '').lower()
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            header = cache.header
+            schema = SheetSchema(header)
             # Buscar índices de columnas según la nueva estructura
-            idx_pedido = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('Número de pedido')), None)
-            idx_agente = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('Agente que carga')), None)
-            idx_fecha = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('FECHA')), None)
-            idx_solicitud = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('SOLICITUD')), None)
-            idx_motivo = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('MOTIVO DE CANCELACIÓN')), None)
-            idx_frenado = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('FRENADO')), None)
-            idx_reembolso = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('REEMBOLSO')), None)
-            idx_codigo_sap = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('CODIGO SAP (Gestión Back Office)')), None)
-            idx_agente_back = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('AGENTE BACK')), None)
-            idx_observaciones = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('OBSERVACIONES')), None)
-            idx_error = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('ERROR')), None)
-            idx_error_envio = next((i for i, col in enumerate(header) if normaliza_columna(col) == normaliza_columna('ErrorEnvioCheck')), None)
+            idx_pedido = schema.col('Número de pedido')
+            idx_agente = schema.col('Agente que carga')
+            idx_fecha = schema.col('FECHA')
+            idx_solicitud = schema.col('SOLICITUD')
+            idx_motivo = schema.col('MOTIVO DE CANCELACIÓN')
+            idx_frenado = schema.col('FRENADO')
+            idx_reembolso = schema.col('REEMBOLSO')
+            idx_codigo_sap = schema.col('CODIGO SAP (Gestión Back Office)')
+            idx_agente_back = schema.col('AGENTE BACK')
+            idx_observaciones = schema.col('OBSERVACIONES')
+            idx_error = schema.col('ERROR')
+            idx_error_envio = schema.col('ErrorEnvioCheck')
             
             # Preparar la fila
             row_data = [''] * len(header)
@@ -1132,7 +938,8 @@ class CancelacionModal(discord.ui.Modal, title='Registrar Cancelación'):
             if idx_error_envio is not None:
                 row_data[idx_error_envio] = ''
             
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             confirmation_message = f"✅ **Cancelación registrada exitosamente**\n\n📋 **Detalles:**\n• **N° de Pedido:** {pedido}\n• **Motivo:** {motivo}\n• **Agente:** {agente}\n• **Fecha:** {fecha_hora}\n\nLa cancelación ha sido guardada en Google Sheets."
             await interaction.response.send_message(confirmation_message, ephemeral=True)
             state_manager.delete_user_state(user_id, "cancelaciones")
@@ -1172,7 +979,6 @@ class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
         self.add_item(self.observaciones)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             pending_data = state_manager.get_user_state(user_id, "reclamos_ml")
@@ -1201,26 +1007,10 @@ class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
                 await interaction.response.send_message('❌ Error: La variable GOOGLE_SHEET_RANGE_RECLAMOS_ML no está configurada.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reclamos_ml")
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
             sheet_range = getattr(config, 'GOOGLE_SHEET_RANGE_RECLAMOS_ML', 'SOLICITUDES CON RECLAMO ABIERTO 2025 ML!A:L')
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Reclamos ML.', ephemeral=True)
                 state_manager.delete_user_state(user_id, "reclamos_ml")
@@ -1229,7 +1019,7 @@ class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
             # Construir la fila según el header
-            header = rows[0] if rows else []
+            header = cache.header
             row_data = [
                 pedido,           # A - Número de Pedido
                 fecha_hora,       # B - Fecha
@@ -1245,7 +1035,8 @@ class ReclamosMLModal(discord.ui.Modal, title='Detalles del Reclamo ML'):
                 row_data += [''] * (len(header) - len(row_data))
             elif len(row_data) > len(header):
                 row_data = row_data[:len(header)]
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             confirmation_message = f"""✅ **Reclamo ML registrado exitosamente**\n\n📋 **Detalles del reclamo:**\n• **N° de Pedido:** {pedido}\n• **Tipo de Reclamo:** {tipo_reclamo}\n• **Fecha:** {fecha_hora}\n• **Dirección/Datos:** {direccion_datos}\n"""
             if observaciones:
                 confirmation_message += f"• **Observaciones:** {observaciones}\n"
@@ -1309,7 +1100,6 @@ class PiezaFaltanteModal(discord.ui.Modal, title='Registrar Pieza Faltante'):
         self.add_item(self.observaciones)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             solicitud_id = generar_solicitud_id(user_id)
@@ -1330,25 +1120,9 @@ class PiezaFaltanteModal(discord.ui.Modal, title='Registrar Pieza Faltante'):
             if not config.GOOGLE_SHEET_RANGE_PIEZA_FALTANTE:
                 await interaction.response.send_message('❌ Error: La variable GOOGLE_SHEET_RANGE_PIEZA_FALTANTE no está configurada.', ephemeral=True)
                 return
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_CASOS)
             sheet_range = config.GOOGLE_SHEET_RANGE_PIEZA_FALTANTE
-            hoja_nombre = None
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
-            rows = sheet.get(sheet_range_puro)
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_CASOS, sheet_range)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
             # No se verifica duplicado porque puede haber varios casos por pedido
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
@@ -1368,13 +1142,14 @@ class PiezaFaltanteModal(discord.ui.Modal, title='Registrar Pieza Faltante'):
             ]
             
             # Ajustar la cantidad de columnas al header (igual que CasoModal)
-            header = rows[0] if rows else []
+            header = cache.header
             if len(row_data) < len(header):
                 row_data.extend([''] * (len(header) - len(row_data)))
             elif len(row_data) > len(header):
                 row_data = row_data[:len(header)]
             
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             confirmation_message = f"""✅ **Pieza faltante registrada exitosamente**\n\n📋 **Detalles:**\n• **N° de Pedido:** {pedido}\n• **ID Wise:** {id_wise}\n• **Pieza faltante:** {pieza}\n• **SKU:** {sku}\n• **Fecha:** {fecha_hora}\n"""
             if observaciones:
                 confirmation_message += f"• **Observaciones:** {observaciones}\n"
@@ -1472,7 +1247,6 @@ class ICBCModal(discord.ui.Modal, title='Registrar Solicitud ICBC'):
         self.add_item(self.observaciones)
 
     async def on_submit(self, interaction: discord.Interaction):
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             solicitud_id = generar_solicitud_id(user_id)
@@ -1492,31 +1266,13 @@ class ICBCModal(discord.ui.Modal, title='Registrar Solicitud ICBC'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja de ICBC no está configurado.', ephemeral=True)
                 return
                         
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_ICBC)
             sheet_range = getattr(config, 'GOOGLE_SHEET_RANGE_ICBC', 'ICBC!A:F')
-            hoja_nombre = None
-            
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-            
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_ICBC, sheet_range)
             
-            rows = sheet.get(sheet_range_puro)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
             
             # Verificar si el pedido ya existe
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, numero_pedido)
+            is_duplicate = cache.pedido_existe(numero_pedido)
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{numero_pedido}** ya se encuentra registrado en la hoja de ICBC.', ephemeral=True)
                 return
@@ -1525,16 +1281,10 @@ class ICBCModal(discord.ui.Modal, title='Registrar Solicitud ICBC'):
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
             
-            header = rows[0] if rows else []
-            
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().lower().replace(' ', '_').replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
+            header = cache.header
             
-            # Crear diccionario de columnas normalizadas
-            columnas = {normaliza_columna(col): i for i, col in enumerate(header)}
+            # Columnas por nombre normalizado
+            schema = SheetSchema(header)
             
             # Obtener el tipo de ICBC del estado del usuario
             user_state = state_manager.get_user_state(user_id, "icbc")
@@ -1544,21 +1294,28 @@ class ICBCModal(discord.ui.Modal, title='Registrar Solicitud ICBC'):
             nueva_fila = [''] * len(header)
             
             # Mapear datos a las columnas correctas por nombre
-            if 'numero_de_hilo' in columnas:
-                nueva_fila[columnas['numero_de_hilo']] = numero_hilo
-            if 'numero_de_pedido' in columnas:
-                nueva_fila[columnas['numero_de_pedido']] = numero_pedido
-            if 'tipo' in columnas:
-                nueva_fila[columnas['tipo']] = tipo_icbc
-            if 'observaciones' in columnas:
-                nueva_fila[columnas['observaciones']] = observaciones
-            if 'fecha_y_hora' in columnas:
-                nueva_fila[columnas['fecha_y_hora']] = fecha_hora
-            if 'agente' in columnas:
-                nueva_fila[columnas['agente']] = str(interaction.user)
+            idx_hilo = schema.col('Número de hilo')
+            if idx_hilo is not None:
+                nueva_fila[idx_hilo] = numero_hilo
+            idx_pedido = schema.col('Número de pedido')
+            if idx_pedido is not None:
+                nueva_fila[idx_pedido] = numero_pedido
+            idx_tipo = schema.col('Tipo')
+            if idx_tipo is not None:
+                nueva_fila[idx_tipo] = tipo_icbc
+            idx_observaciones = schema.col('Observaciones')
+            if idx_observaciones is not None:
+                nueva_fila[idx_observaciones] = observaciones
+            idx_fecha = schema.col('Fecha y hora')
+            if idx_fecha is not None:
+                nueva_fila[idx_fecha] = fecha_hora
+            idx_agente = schema.col('Agente')
+            if idx_agente is not None:
+                nueva_fila[idx_agente] = str(interaction.user)
             
             # Insertar la nueva fila
-            sheet.append_row(nueva_fila)
+            await run_sheets_call(sheet.append_row, nueva_fila)
+            cache.registrar_fila(nueva_fila)
             
             # Limpiar el estado del usuario
             state_manager.delete_user_state(user_id, "icbc")
@@ -1635,7 +1392,6 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
     async def on_submit(self, interaction: discord.Interaction):
         
         
-        cleanup_expired_states()
         try:
             user_id = str(interaction.user.id)
             solicitud_id = generar_solicitud_id(user_id)
@@ -1656,29 +1412,11 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
                 await interaction.response.send_message('❌ Error: El ID de la hoja no está configurado.', ephemeral=True)
                 return
                 
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.SPREADSHEET_ID_FAC_A)
             sheet_range = getattr(config, 'SHEET_RANGE_NC', 'NC!A:G')
-            hoja_nombre = None
-            
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-                else:
-                    hoja_nombre = None
-                    sheet_range_puro = sheet_range
-            else:
-                sheet_range_puro = sheet_range
-                
-            if hoja_nombre:
-                sheet = spreadsheet.worksheet(hoja_nombre)
-            else:
-                sheet = spreadsheet.sheet1
+            sheet, sheet_range_puro = await open_worksheet(config.SPREADSHEET_ID_FAC_A, sheet_range)
                 
-            rows = sheet.get(sheet_range_puro)
-            is_duplicate = check_if_pedido_exists(sheet, sheet_range_puro, pedido)
+            cache = await get_sheet_cache(sheet, sheet_range_puro)
+            is_duplicate = cache.pedido_existe(pedido)
             
             if is_duplicate:
                 await interaction.response.send_message(f'❌ El número de pedido **{pedido}** ya se encuentra registrado en la hoja de Nota de Crédito.', ephemeral=True)
@@ -1687,22 +1425,17 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
             tz = pytz.timezone('America/Argentina/Buenos_Aires')
             now = datetime.now(tz)
             fecha_hora = now.strftime('%d-%m-%Y %H:%M:%S')
-            header = rows[0] if rows else []
-            
-            # Normalizar nombres de columnas
-            def normaliza_columna(nombre):
-                if not nombre:
-                    return ''
-                return str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
+            header = cache.header
+            schema = SheetSchema(header)
             
             # Buscar índices de columnas por nombre
-            pedido_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'número de pedido'), 0)
-            asesor_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'asesor que carga'), 1)
-            fecha_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'fecha/hora'), 2)
-            caso_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'caso'), 3)
-            email_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'email'), 4)
-            obs_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'observaciones'), 5)
-            check_col = next((i for i, h in enumerate(header) if normaliza_columna(h) == 'check bo carga'), 6)
+            pedido_col = schema.col('Número de pedido', default=0)
+            asesor_col = schema.col('Asesor que carga', default=1)
+            fecha_col = schema.col('Fecha/Hora', default=2)
+            caso_col = schema.col('Caso', default=3)
+            email_col = schema.col('Email', default=4)
+            obs_col = schema.col('Observaciones', default=5)
+            check_col = schema.col('Check BO Carga', default=6)
             
             # Crear fila con datos en las posiciones correctas
             row_data = [''] * len(header)
@@ -1714,7 +1447,8 @@ class NotaCreditoModal(discord.ui.Modal, title='Registrar Nota de Crédito'):
             row_data[obs_col] = observaciones
             row_data[check_col] = ''  # Se llenará cuando se confirme
             
-            sheet.append_row(row_data)
+            await run_sheets_call(sheet.append_row, row_data)
+            cache.registrar_fila(row_data)
             
             # Crear embed de confirmación
             embed = discord.Embed(
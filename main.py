@@ -51,16 +51,20 @@ async def on_ready():
         bot.sheets_instance = None
         bot.drive_instance = None
 
-    # Cargar el manual en memoria
-    if config.MANUAL_DRIVE_FILE_ID and drive_instance:
+    # Cargar el manual en memoria: primero la copia local y luego se sincroniza con Drive en segundo plano
+    if config.MANUAL_DRIVE_FILE_ID:
         try:
-            from utils.manual_processor import load_and_cache_manual
-            await load_and_cache_manual(drive_instance, config.MANUAL_DRIVE_FILE_ID)
-            print("Manual cargado en memoria.")
+            from utils.manual_processor import cargar_manual_local
+            if await asyncio.to_thread(cargar_manual_local, config.MANUAL_DRIVE_FILE_ID):
+                print("Manual cargado en memoria desde la copia local.")
         except Exception as error:
-            print(f"Error al cargar el manual: {error}")
+            print(f"Error al cargar la copia local del manual: {error}")
+    if config.MANUAL_DRIVE_FILE_ID and drive_instance:
+        if not sync_manual.is_running():
+            print(f"Iniciando sincronización del manual cada {config.MANUAL_SYNC_INTERVAL_MIN} minutos.")
+            sync_manual.start()
     else:
-        print("No se cargará el manual porque falta MANUAL_DRIVE_FILE_ID o la instancia de Drive no está disponible.")
+        print("No se sincronizará el manual porque falta MANUAL_DRIVE_FILE_ID o la instancia de Drive no está disponible.")
 
     print("Conectado a Discord.")
     
@@ -73,9 +77,27 @@ async def on_ready():
             check_errors.start()
         else:
             print("La verificación periódica de errores ya está ejecutándose.")
+        # Barrer además apenas cambia la hoja de casos (consultando su versión en Drive)
+        if config.SPREADSHEET_ID_CASOS and drive_instance and not watch_cases_sheet.is_running():
+            print(f"Iniciando detección de cambios en la hoja de casos cada {config.CASES_CHANGE_POLL_SEC} segundos.")
+            watch_cases_sheet.start()
     else:
         print("La verificación periódica de errores en la hoja de búsqueda no se iniciará debido a la falta de configuración.")
 
+    # Construir (y refrescar periódicamente) el índice de pedidos para /buscar-caso
+    if config.SPREADSHEET_ID_BUSCAR_CASO and config.SHEETS_TO_SEARCH and sheets_instance:
+        from utils.case_index import cargar_indice_desde_disco
+        await asyncio.to_thread(cargar_indice_desde_disco)
+        if not refresh_case_index.is_running():
+            print(f"Iniciando índice de pedidos con refresco cada {config.CASE_INDEX_REFRESH_MIN} minutos.")
+            refresh_case_index.start()
+    else:
+        print("El índice de pedidos para /buscar-caso no se iniciará debido a la falta de configuración.")
+
+    # Barrido periódico de estados de usuario vencidos
+    if not sweep_user_states.is_running():
+        sweep_user_states.start()
+
     # --- Sincronizar comandos de aplicación (slash) SOLO en el servidor configurado ---
     try:
         if not config.GUILD_ID:
@@ -104,36 +126,12 @@ async def check_errors():
         if not config.GUILD_ID:
             print("Error: GUILD_ID no está configurado")
             return
-        spreadsheet = sheets_instance.open_by_key(config.SPREADSHEET_ID_CASOS)
-        for sheet_range, channel_id in config.MAPA_RANGOS_ERRORES.items():
-            if not sheet_range or not channel_id:
-                continue
-            hoja_nombre = None
-            sheet_range_puro = sheet_range
-            if '!' in sheet_range:
-                partes = sheet_range.split('!')
-                if len(partes) == 2:
-                    hoja_nombre = partes[0].strip("'")
-                    sheet_range_puro = partes[1]
-            try:
-                if hoja_nombre:
-                    sheet = spreadsheet.worksheet(hoja_nombre)
-                else:
-                    sheet = spreadsheet.sheet1
-            except Exception as sheet_error:
-                print(f"Error al abrir la hoja {hoja_nombre or '[default]'}: {sheet_error}")
-                continue
-            try:
-                from utils.google_sheets import check_sheet_for_errors
-                await check_sheet_for_errors(
-                    bot,
-                    sheet,
-                    sheet_range,
-                    int(channel_id),
-                    int(config.GUILD_ID)
-                )
-            except Exception as error:
-                print(f"Error al verificar errores en el rango {sheet_range}: {error}")
+        from utils.sheets_gateway import open_spreadsheet
+        from utils.error_sweep import barrer_errores
+        spreadsheet = await open_spreadsheet(config.SPREADSHEET_ID_CASOS)
+        rangos = {r: c for r, c in config.MAPA_RANGOS_ERRORES.items() if r and c}
+        # Barrido incremental: cada rango se lee desde su último punto de control
+        await barrer_errores(bot, spreadsheet, rangos, int(config.GUILD_ID))
     except Exception as error:
         print(f"Error en la verificación periódica: {error}")
 
@@ -142,6 +140,66 @@ async def before_check_errors():
     """Esperar hasta que el bot esté listo antes de iniciar la tarea"""
     await bot.wait_until_ready()
 
+@tasks.loop(seconds=config.CASES_CHANGE_POLL_SEC)
+async def watch_cases_sheet():
+    """Tarea periódica que lanza el barrido de errores cuando cambia el spreadsheet de casos"""
+    drive = getattr(bot, 'drive_instance', None)
+    if not drive or not config.SPREADSHEET_ID_CASOS:
+        return
+    try:
+        from utils.sheet_change_detector import detectar_cambio, barrido_pendiente, marcar_barrido
+        await detectar_cambio(drive, config.SPREADSHEET_ID_CASOS)
+        if barrido_pendiente(config.ERROR_SWEEP_DEBOUNCE_SEC, config.ERROR_SWEEP_MAX_DELAY_SEC):
+            marcar_barrido()
+            await check_errors()
+    except Exception as error:
+        print(f"Error al detectar cambios en la hoja de casos: {error}")
+
+@watch_cases_sheet.before_loop
+async def before_watch_cases_sheet():
+    await bot.wait_until_ready()
+
+@tasks.loop(minutes=config.CASE_INDEX_REFRESH_MIN)
+async def refresh_case_index():
+    """Tarea periódica para reconstruir el índice de pedidos de /buscar-caso"""
+    try:
+        from utils.case_index import construir_indice_casos
+        await construir_indice_casos()
+    except Exception as error:
+        print(f"Error al refrescar el índice de pedidos: {error}")
+
+@refresh_case_index.before_loop
+async def before_refresh_case_index():
+    await bot.wait_until_ready()
+
+@tasks.loop(minutes=config.MANUAL_SYNC_INTERVAL_MIN)
+async def sync_manual():
+    """Tarea periódica para descargar el manual de Drive solo si cambió"""
+    drive = getattr(bot, 'drive_instance', None)
+    if not drive or not config.MANUAL_DRIVE_FILE_ID:
+        return
+    try:
+        from utils.manual_processor import sincronizar_manual
+        if await sincronizar_manual(drive, config.MANUAL_DRIVE_FILE_ID):
+            print("Manual actualizado desde Drive.")
+    except Exception as error:
+        print(f"Error al sincronizar el manual: {error}")
+
+@sync_manual.before_loop
+async def before_sync_manual():
+    await bot.wait_until_ready()
+
+@tasks.loop(seconds=config.STATE_SWEEP_INTERVAL_SEC)
+async def sweep_user_states():
+    """Tarea periódica para borrar los estados de usuario vencidos"""
+    try:
+        from utils.state_manager import sweep_expired_states
+        eliminados = await asyncio.to_thread(sweep_expired_states)
+        if eliminados:
+            print(f"Estados vencidos eliminados: {eliminados}")
+    except Exception as error:
+        print(f"Error al limpiar estados vencidos: {error}")
+
 @bot.event
 async def on_error(event, *args, **kwargs):
     """Manejador global de errores"""
@@ -170,6 +228,18 @@ async def on_disconnect():
         if check_errors.is_running():
             check_errors.cancel()
             print("Tarea check_errors detenida.")
+        if refresh_case_index.is_running():
+            refresh_case_index.cancel()
+            print("Tarea refresh_case_index detenida.")
+        if sweep_user_states.is_running():
+            sweep_user_states.cancel()
+            print("Tarea sweep_user_states detenida.")
+        if sync_manual.is_running():
+            sync_manual.cancel()
+            print("Tarea sync_manual detenida.")
+        if watch_cases_sheet.is_running():
+            watch_cases_sheet.cancel()
+            print("Tarea watch_cases_sheet detenida.")
     except Exception as e:
         print(f"Error al detener tareas: {e}")
 
@@ -239,6 +309,21 @@ async def main():
         await bot.start(config.TOKEN)
     finally:
         print("Paso 4: Apagando bot de forma inmediata...")
+        try:
+            from utils.sheets_write_queue import flush_pending_writes
+            await flush_pending_writes()
+        except Exception as e:
+            print(f"Error al enviar escrituras pendientes a Sheets: {e}")
+        try:
+            from utils.sheets_gateway import shutdown_sheets_gateway
+            shutdown_sheets_gateway()
+        except Exception:
+            pass
+        try:
+            from utils.andreani import close_andreani_session
+            await close_andreani_session()
+        except Exception:
+            pass
         # Limpiar sistema de logging si existe
         try:
             if 'console_redirector' in globals():
@@ -15,7 +15,8 @@ import asyncio
 import pytz
 import re
 import time
-from utils.google_client_manager import get_sheets_client, get_drive_client
+from utils.google_client_manager import get_sheets_client, get_drive_client, invalidate_sheet_handles
+from utils.sheets_gateway import run_sheets_call, open_spreadsheet, open_worksheet_by_title, list_worksheets
 
 # Obtener el ID del canal desde la variable de entorno
 target_channel_id = int(getattr(config, 'TARGET_CHANNEL_ID_TAREAS', '0') or '0')
@@ -157,15 +158,13 @@ class TaskPanel(commands.Cog):
         try:
             # Inicializar Google Sheets
             await interaction.followup.send('🔄 Inicializando Google Sheets...', ephemeral=True)
-            client = get_sheets_client()
-            
             # Abrir spreadsheet
             await interaction.followup.send('🔄 Abriendo spreadsheet...', ephemeral=True)
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
+            spreadsheet = await open_spreadsheet(config.GOOGLE_SHEET_ID_TAREAS)
             
             # Obtener lista de hojas existentes
             await interaction.followup.send('🔄 Verificando hojas existentes...', ephemeral=True)
-            hojas_existentes = [worksheet.title for worksheet in spreadsheet.worksheets()]
+            hojas_existentes = [worksheet.title for worksheet in await run_sheets_call(spreadsheet.worksheets)]
             
             await interaction.followup.send(f'📋 **Hojas existentes:**\n{", ".join(hojas_existentes)}', ephemeral=True)
             
@@ -179,14 +178,16 @@ class TaskPanel(commands.Cog):
                 # Crear hojas faltantes
                 for hoja in hojas_faltantes:
                     await interaction.followup.send(f'🔄 Creando hoja "{hoja}"...', ephemeral=True)
-                    nueva_hoja = spreadsheet.add_worksheet(title=hoja, rows=1000, cols=20)
+                    nueva_hoja = await run_sheets_call(spreadsheet.add_worksheet, title=hoja, rows=1000, cols=20)
                     
                     # Agregar headers según el tipo de hoja
                     if hoja == 'Tareas Activas':
-                        nueva_hoja.append_row(COLUMNAS_TAREAS_ACTIVAS)
+                        await run_sheets_call(nueva_hoja.append_row, COLUMNAS_TAREAS_ACTIVAS)
                     elif hoja == 'Historial':
-                        nueva_hoja.append_row(COLUMNAS_HISTORIAL)
+                        await run_sheets_call(nueva_hoja.append_row, COLUMNAS_HISTORIAL)
                 
+                # Las hojas nuevas deben aparecer en los handles memorizados
+                invalidate_sheet_handles(config.GOOGLE_SHEET_ID_TAREAS)
                 await interaction.followup.send('✅ **¡Hojas creadas exitosamente!**\n\nAhora puedes usar el panel de tareas.', ephemeral=True)
             else:
                 await interaction.followup.send('✅ **Todas las hojas requeridas ya existen.**\n\nEl problema puede ser de permisos o estructura de datos.', ephemeral=True)
@@ -272,11 +273,8 @@ class TaskStartButton(discord.ui.Button):
         
         try:
             # --- Google Sheets ---
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            
-            # Verificar qué hojas existen
-            hojas_existentes = [worksheet.title for worksheet in spreadsheet.worksheets()]
+            # Verificar qué hojas existen (lista memorizada, sin consultas extra a la API)
+            hojas_existentes = [worksheet.title for worksheet in await list_worksheets(config.GOOGLE_SHEET_ID_TAREAS)]
             
             # Verificar si existen las hojas requeridas
             if 'Tareas Activas' not in hojas_existentes:
@@ -286,8 +284,8 @@ class TaskStartButton(discord.ui.Button):
                 await interaction.followup.send(f'❌ **Error:** No existe la hoja "Historial" en el spreadsheet', ephemeral=True)
                 return
             
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
+            sheet_historial = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Historial')
             
             usuario = str(interaction.user)
             tarea = self.tarea
@@ -297,10 +295,11 @@ class TaskStartButton(discord.ui.Button):
             inicio = now.strftime('%d/%m/%Y %H:%M:%S')
             
             # Registrar tarea activa
-            tarea_id = registrar_tarea_activa(sheet_activas, user_id, usuario, tarea, observaciones, inicio)
+            tarea_id = await run_sheets_call(registrar_tarea_activa, sheet_activas, user_id, usuario, tarea, observaciones, inicio)
             
             # Agregar evento al historial
-            agregar_evento_historial(
+            await run_sheets_call(
+                agregar_evento_historial,
                 sheet_historial,
                 user_id,
                 tarea_id,
@@ -358,10 +357,8 @@ class TaskObservacionesModal(discord.ui.Modal, title='Registrar Observaciones'):
         
         try:
             # --- Google Sheets ---
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
+            sheet_historial = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Historial')
             
             usuario = str(interaction.user)
             tarea = 'Otra'
@@ -370,9 +367,10 @@ class TaskObservacionesModal(discord.ui.Modal, title='Registrar Observaciones'):
             now = datetime.now(tz)
             inicio = now.strftime('%d/%m/%Y %H:%M:%S')
             
-            tarea_id = registrar_tarea_activa(sheet_activas, user_id, usuario, tarea, obs, inicio)
+            tarea_id = await run_sheets_call(registrar_tarea_activa, sheet_activas, user_id, usuario, tarea, obs, inicio)
             
-            agregar_evento_historial(
+            await run_sheets_call(
+                agregar_evento_historial,
                 sheet_historial,
                 user_id,
                 tarea_id,
@@ -535,11 +533,9 @@ class PausarReanudarButton(discord.ui.Button):
         await interaction.response.defer()
         
         try:
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
-            datos_tarea = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+            sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
+            sheet_historial = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Historial')
+            datos_tarea = await run_sheets_call(obtener_tarea_por_id, sheet_activas, self.tarea_id)
             if not datos_tarea:
                 await interaction.followup.send('❌ No se encontró la tarea especificada.', ephemeral=True)
                 return
@@ -550,10 +546,10 @@ class PausarReanudarButton(discord.ui.Button):
             
             if datos_tarea['estado'].lower() == 'en proceso':
                 # Pausar la tarea
-                pausar_tarea_por_id(sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
+                await run_sheets_call(pausar_tarea_por_id, sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+                datos_tarea_actualizados = await run_sheets_call(obtener_tarea_por_id, sheet_activas, self.tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -580,10 +576,10 @@ class PausarReanudarButton(discord.ui.Button):
                 
             elif datos_tarea['estado'].lower() == 'pausada':
                 # Reanudar la tarea
-                reanudar_tarea_por_id(sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
+                await run_sheets_call(reanudar_tarea_por_id, sheet_activas, sheet_historial, self.tarea_id, str(interaction.user), fecha_actual)
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, self.tarea_id)
+                datos_tarea_actualizados = await run_sheets_call(obtener_tarea_por_id, sheet_activas, self.tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -716,11 +712,9 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 import utils.google_sheets as google_sheets
                 import config
                 
-                client = get_sheets_client()
-                spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-                sheet_activas = spreadsheet.worksheet('Tareas Activas')
+                sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
                 
-                datos_tarea = obtener_tarea_activa_por_usuario(sheet_activas, user_id)
+                datos_tarea = await run_sheets_call(obtener_tarea_activa_por_usuario, sheet_activas, user_id)
                 if datos_tarea:
                     tarea_id = datos_tarea['tarea_id']
                 else:
@@ -733,11 +727,9 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 import utils.google_sheets as google_sheets
                 import config
                 
-                client = get_sheets_client()
-                spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-                sheet_activas = spreadsheet.worksheet('Tareas Activas')
+                sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
                 
-                datos_tarea = obtener_tarea_activa_por_usuario(sheet_activas, user_id)
+                datos_tarea = await run_sheets_call(obtener_tarea_activa_por_usuario, sheet_activas, user_id)
                 if datos_tarea:
                     tarea_id = datos_tarea['tarea_id']
                 else:
@@ -750,12 +742,10 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 return
             
             # Ahora proceder con la lógica de pausar/reanudar
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
-            sheet_historial = spreadsheet.worksheet('Historial')
+            sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
+            sheet_historial = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Historial')
             
-            datos_tarea = obtener_tarea_por_id(sheet_activas, tarea_id)
+            datos_tarea = await run_sheets_call(obtener_tarea_por_id, sheet_activas, tarea_id)
             if not datos_tarea:
                 await interaction.followup.send('❌ No se encontró la tarea especificada.', ephemeral=True)
                 return
@@ -766,10 +756,10 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
             
             if datos_tarea['estado'].lower() == 'en proceso':
                 # Pausar la tarea
-                pausar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
+                await run_sheets_call(pausar_tarea_por_id, sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, tarea_id)
+                datos_tarea_actualizados = await run_sheets_call(obtener_tarea_por_id, sheet_activas, tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -795,10 +785,10 @@ class PausarReanudarButtonPersistent(discord.ui.Button):
                 
             elif datos_tarea['estado'].lower() == 'pausada':
                 # Reanudar la tarea
-                reanudar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
+                await run_sheets_call(reanudar_tarea_por_id, sheet_activas, sheet_historial, tarea_id, str(interaction.user), fecha_actual)
                 
                 # Volver a obtener los datos actualizados
-                datos_tarea_actualizados = obtener_tarea_por_id(sheet_activas, tarea_id)
+                datos_tarea_actualizados = await run_sheets_call(obtener_tarea_por_id, sheet_activas, tarea_id)
                 if not datos_tarea_actualizados:
                     await interaction.followup.send('❌ Error al obtener los datos actualizados de la tarea.', ephemeral=True)
                     return
@@ -843,11 +833,9 @@ class FinalizarButtonPersistent(discord.ui.Button):
             import utils.google_sheets as google_sheets
             import config
             
-            client = get_sheets_client()
-            spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID_TAREAS)
-            sheet_activas = spreadsheet.worksheet('Tareas Activas')
+            sheet_activas = await open_worksheet_by_title(config.GOOGLE_SHEET_ID_TAREAS, 'Tareas Activas')
             
-            datos_tarea = obtener_tarea_activa_por_usuario(sheet_activas, user_id)
+            datos_tarea = await run_sheets_call(obtener_tarea_activa_por_usuario, sheet_activas, user_id)
             if not datos_tarea:
                 await interaction.response.send_message('❌ No se encontró una tarea activa para finalizar.', ephemeral=True)
                 return
@@ -1,12 +1,122 @@
-import requests
+import asyncio
+import random
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+import aiohttp
+import config
 
-def get_andreani_tracking(tracking_number: str, auth_header: str) -> dict:
+ANDREANI_HEADERS = {
+    'Accept': 'application/json, text/plain, */*',
+    'Origin': 'https://www.andreani.com',
+    'Referer': 'https://www.andreani.com/',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept-Language': 'es-419,es;q=0.9',
+    'Connection': 'keep-alive',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-site',
+    'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+}
+
+class AndreaniNoDisponible(Exception):
+    """La API de Andreani está fallando y el circuito está abierto: no se consulta"""
+
+class _CircuitBreaker:
+    """
+    Corta las consultas a Andreani tras varios fallos seguidos (5xx, timeouts, errores de red).
+    Abierto: falla al instante durante un tiempo. Luego deja pasar una consulta de prueba
+    (semiabierto) y se cierra si esa consulta funciona.
     """
-    Consulta la API de Andreani para obtener información de tracking.
+
+    def __init__(self):
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.prueba_en_curso = False
+
+    def permitir(self) -> bool:
+        """
+        Lanza AndreaniNoDisponible si el circuito está abierto.
+        :return: True si esta consulta es la de prueba (hay que liberarla al terminar)
+        """
+        if self.fallos < config.ANDREANI_CB_FAILURES:
+            return False
+        if time.monotonic() < self.abierto_hasta or self.prueba_en_curso:
+            restante = max(0, int(self.abierto_hasta - time.monotonic()))
+            raise AndreaniNoDisponible(
+                f"La API de Andreani no responde; se reintentará en {restante} s."
+            )
+        self.prueba_en_curso = True
+        return True
+
+    def exito(self):
+        if self.fallos >= config.ANDREANI_CB_FAILURES:
+            print("Andreani: circuito cerrado, la API volvió a responder.")
+        self.fallos = 0
+        self.prueba_en_curso = False
+
+    def liberar_prueba(self):
+        """Libera la consulta de prueba (solo debe llamarla la consulta que la tomó)"""
+        self.prueba_en_curso = False
+
+    def fallo(self):
+        # La prueba la libera la consulta que la tomó: un fallo de otra consulta
+        # anterior no debe dejar pasar una segunda prueba
+        self.fallos += 1
+        if self.fallos >= config.ANDREANI_CB_FAILURES:
+            self.abierto_hasta = time.monotonic() + config.ANDREANI_CB_RESET_SEC
+            print(f"Andreani: circuito abierto por {config.ANDREANI_CB_RESET_SEC} s tras {self.fallos} fallos seguidos.")
+
+_breaker = _CircuitBreaker()
+_session = None
+
+def _get_session() -> aiohttp.ClientSession:
+    """Sesión HTTP compartida (conexiones keep-alive reutilizadas entre consultas)"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=config.ANDREANI_MAX_CONNECTIONS, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=config.ANDREANI_CONNECT_TIMEOUT_SEC,
+                sock_read=config.ANDREANI_READ_TIMEOUT_SEC
+            ),
+            headers=ANDREANI_HEADERS
+        )
+    return _session
+
+async def close_andreani_session():
+    """Cierra la sesión HTTP compartida (llamar al apagar el bot)"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+class _ErrorReintentable(Exception):
+    pass
+
+async def _consultar(url: str, auth_header: str) -> dict:
+    async with _get_session().get(url, headers={'Authorization': auth_header}) as response:
+        if response.status >= 500:
+            raise _ErrorReintentable(f"Error HTTP al consultar la API de Andreani: {response.status} {response.reason}")
+        if response.status >= 400:
+            raise Exception(f"Error HTTP al consultar la API de Andreani: {response.status} {response.reason}")
+        return await response.json(content_type=None)
+
+async def get_andreani_tracking(tracking_number: str, auth_header: str) -> dict:
+    """
+    Consulta la API de Andreani para obtener información de tracking (asíncrona).
     NOTA: Esta función utiliza una API no oficial pública identificada en el sitio web de Andreani.
     Para un uso en producción, se recomienda encarecidamente obtener acceso a la API oficial
     de Andreani para desarrolladores y adaptar esta función según su documentación.
 
+    Reintenta con espera aleatoria los errores 5xx, timeouts y errores de red, y deja de
+    consultar por un tiempo (AndreaniNoDisponible) si la API falla varias veces seguidas.
+
     :param tracking_number: Número de seguimiento de Andreani.
     :param auth_header: Encabezado de autorización (ej: 'Bearer TU_TOKEN').
     :return: Diccionario con los datos del tracking.
@@ -20,34 +130,212 @@ def get_andreani_tracking(tracking_number: str, auth_header: str) -> dict:
     )
     print(f"Consultando API JSON: {andreani_api_url}")
 
-    headers = {
-        'Accept': 'application/json, text/plain, */*',
-        'Authorization': auth_header,
-        'Origin': 'https://www.andreani.com',
-        'Referer': 'https://www.andreani.com/',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
-        'Accept-Language': 'es-419,es;q=0.9',
-        'Connection': 'keep-alive',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'same-site',
-        'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"Windows"',
-    }
+    intentos = max(1, config.ANDREANI_MAX_RETRIES + 1)
+    for intento in range(intentos):
+        es_prueba = _breaker.permitir()
+        try:
+            tracking_data = await _consultar(andreani_api_url, auth_header)
+            _breaker.exito()
+            print("Respuesta de la API JSON recibida y parseada.")
+            return tracking_data
+        except (_ErrorReintentable, aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            _breaker.fallo()
+            ultimo_error = error
+            if intento + 1 >= intentos:
+                print('Error en get_andreani_tracking:', error)
+                raise Exception(str(error) or 'Tiempo de espera agotado al consultar la API de Andreani') from error
+        except Exception as error:
+            # Errores 4xx o respuestas inválidas: la API responde, no cuenta como caída
+            _breaker.exito()
+            print('Error en get_andreani_tracking:', error)
+            raise
+        finally:
+            # Solo la consulta de prueba libera el semiabierto (también si se canceló)
+            if es_prueba:
+                _breaker.liberar_prueba()
+        # Backoff exponencial con jitter completo
+        espera = random.uniform(0, config.ANDREANI_RETRY_BASE_SEC * (2 ** intento))
+        print(f"Andreani: intento {intento + 1} fallido ({ultimo_error}); reintentando en {espera:.1f}s")
+        await asyncio.sleep(espera)
+
+class _TrackingCache:
+    """
+    Cache LRU de respuestas de tracking con TTL según el estado del envío
+    (corto mientras está en tránsito, largo si ya fue entregado). Las consultas simultáneas
+    por el mismo número comparten una sola llamada a la API.
+    """
+
+    def __init__(self):
+        # número -> (datos, expiración)
+        self.entradas = OrderedDict()
+        # número -> Future de la consulta en curso
+        self.en_curso = {}
+        self.hits = 0
+        self.misses = 0
+        self.compartidas = 0
 
+    def _ttl(self, tracking_data: dict) -> float:
+        estado = str((tracking_data.get('procesoActual') or {}).get('titulo', '')).lower()
+        if 'entregad' in estado and 'no entregad' not in estado:
+            return config.TRACKING_CACHE_TTL_ENTREGADO_MIN * 60
+        return config.TRACKING_CACHE_TTL_TRANSITO_MIN * 60
+
+    def obtener(self, numero: str):
+        entrada = self.entradas.get(numero)
+        if entrada is None:
+            return None
+        if time.monotonic() >= entrada[1]:
+            del self.entradas[numero]
+            return None
+        self.entradas.move_to_end(numero)
+        return entrada[0]
+
+    def guardar(self, numero: str, tracking_data):
+        # Las respuestas vacías (número inexistente) no se guardan
+        if not tracking_data or not isinstance(tracking_data, dict):
+            return
+        self.entradas[numero] = (tracking_data, time.monotonic() + self._ttl(tracking_data))
+        self.entradas.move_to_end(numero)
+        while len(self.entradas) > max(1, config.TRACKING_CACHE_MAX_ITEMS):
+            self.entradas.popitem(last=False)
+
+_tracking_cache = _TrackingCache()
+
+class _ConsultaCancelada(Exception):
+    """La consulta compartida se canceló (se canceló la tarea que la hacía), no falló"""
+
+async def consultar_tracking(tracking_number: str, auth_header: str) -> dict:
+    """
+    Consulta el tracking usando el cache: si el número se consultó hace poco responde sin
+    llamar a la API, y si ya hay una consulta en curso para el mismo número la espera.
+    Si la tarea que hacía esa consulta se cancela, quien la esperaba vuelve a consultar.
+    Mismos parámetros y errores que get_andreani_tracking.
+    """
+    numero = (tracking_number or '').strip()
+    cache = _tracking_cache
+    while True:
+        tracking_data = cache.obtener(numero)
+        if tracking_data is not None:
+            cache.hits += 1
+            print(f"Andreani: tracking {numero} respondido desde cache.")
+            return tracking_data
+        en_curso = cache.en_curso.get(numero)
+        if en_curso is None:
+            break
+        cache.compartidas += 1
+        try:
+            return await asyncio.shield(en_curso)
+        except _ConsultaCancelada:
+            continue
+    cache.misses += 1
+    future = asyncio.get_running_loop().create_future()
+    cache.en_curso[numero] = future
     try:
-        response = requests.get(andreani_api_url, headers=headers)
-        if not response.ok:
-            raise Exception(f"Error HTTP al consultar la API de Andreani: {response.status_code} {response.reason}")
-        tracking_data = response.json()
-        print("Respuesta de la API JSON recibida y parseada.")
-        
+        tracking_data = await get_andreani_tracking(numero, auth_header)
+        cache.guardar(numero, tracking_data)
+        future.set_result(tracking_data)
         return tracking_data
+    except asyncio.CancelledError:
+        # No propagar la cancelación a los demás: que vuelvan a consultar por su cuenta
+        future.set_exception(_ConsultaCancelada(f"La consulta del tracking {numero} se canceló."))
+        future.exception()
+        raise
     except Exception as error:
-        print('Error en get_andreani_tracking:', error)
+        future.set_exception(error)
+        # Evitar el aviso de excepción no recuperada si nadie más esperaba esta consulta
+        future.exception()
         raise
+    finally:
+        cache.en_curso.pop(numero, None)
+
+def estadisticas_cache_tracking() -> dict:
+    """Contadores del cache de tracking: hits, misses, consultas compartidas y tamaño"""
+    cache = _tracking_cache
+    return {
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'compartidas': cache.compartidas,
+        'entradas': len(cache.entradas),
+    }
+
+def clean_html(raw_html):
+    """Limpia etiquetas y entidades HTML comunes de un texto de la API"""
+    cleanr = re.compile('<.*?>')
+    return re.sub(cleanr, '', raw_html or '').replace('&nbsp;', ' ').replace('&aacute;', 'á').replace('&eacute;', 'é').replace('&iacute;', 'í').replace('&oacute;', 'ó').replace('&uacute;', 'ú').replace('&ntilde;', 'ñ')
+
+def estado_tracking(tracking_data: dict) -> tuple[str, str]:
+    """Retorna (estado actual, fecha estimada de entrega) de una respuesta de tracking"""
+    estado = (tracking_data.get('procesoActual') or {}).get('titulo', 'Sin datos')
+    fecha_entrega = clean_html(tracking_data.get('fechaEstimadaDeEntrega', ''))
+    return estado, fecha_entrega
+
+def eventos_tracking(tracking_data: dict) -> list:
+    """Historial de eventos formateados ('dd/mm/yyyy, HH:MM: descripción (sucursal)'), del más reciente al más antiguo"""
+    eventos = []
+    for tl in sorted(tracking_data.get('timelines', []), key=lambda x: x.get('orden', 0), reverse=True):
+        for traduccion in tl.get('traducciones', []):
+            fecha_iso = traduccion.get('fechaEvento', '')
+            # Formatear fecha a dd/mm/yyyy HH:MM
+            try:
+                dt = datetime.fromisoformat(fecha_iso)
+                fecha_fmt = dt.strftime('%d/%m/%Y, %H:%M')
+            except Exception:
+                fecha_fmt = fecha_iso
+            desc = clean_html(traduccion.get('traduccion', ''))
+            suc = (traduccion.get('sucursal') or {}).get('nombre', '')
+            eventos.append(f"{fecha_fmt}: {desc} ({suc})")
+    return eventos
+
+def formatear_tracking(tracking_number: str, tracking_data: dict) -> str:
+    """Arma el mensaje de /tracking con el estado actual y el historial del envío"""
+    if not tracking_data:
+        return f"😕 No se pudo encontrar la información de tracking para **{tracking_number}**."
+    estado, fecha_entrega = estado_tracking(tracking_data)
+    tracking_info = f"📦 Estado del tracking {tracking_number}:\n{estado} - {fecha_entrega}\n\n"
+    eventos = eventos_tracking(tracking_data)
+    if eventos:
+        tracking_info += "Historial:\n" + '\n'.join(eventos)
+    else:
+        tracking_info += "Historial: No disponible\n"
+    return tracking_info
+
+async def consultar_trackings(numeros: list, auth_header: str):
+    """
+    Consulta varios números en paralelo (hasta config.TRACKING_BULK_CONCURRENCY a la vez y como
+    máximo config.TRACKING_BULK_RATE_PER_SEC consultas nuevas por segundo), usando el cache.
+    Generador asíncrono: entrega (número, datos o excepción) a medida que llegan las respuestas.
+    """
+    semaforo = asyncio.Semaphore(max(1, config.TRACKING_BULK_CONCURRENCY))
+    intervalo = 1 / config.TRACKING_BULK_RATE_PER_SEC if config.TRACKING_BULK_RATE_PER_SEC > 0 else 0
+    turno_lock = asyncio.Lock()
+    proximo_turno = 0.0
+
+    async def esperar_turno():
+        nonlocal proximo_turno
+        async with turno_lock:
+            ahora = time.monotonic()
+            espera = proximo_turno - ahora
+            proximo_turno = max(ahora, proximo_turno) + intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    async def consultar(numero):
+        async with semaforo:
+            try:
+                # Las respuestas en cache no cuentan para el límite de consultas por segundo
+                if _tracking_cache.obtener(numero) is None:
+                    await esperar_turno()
+                return numero, await consultar_tracking(numero, auth_header)
+            except Exception as error:
+                return numero, error
+
+    tareas = [asyncio.create_task(consultar(n)) for n in numeros]
+    try:
+        for tarea in asyncio.as_completed(tareas):
+            yield await tarea
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
 
 def funcion_andreani():
-    pass
\ No newline at end of file
+    pass
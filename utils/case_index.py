@@ -0,0 +1,178 @@
+"""
+Índice invertido de números de pedido para /buscar-caso.
+Mapea cada número de pedido normalizado a las filas donde aparece dentro de las pestañas de
+config.SHEETS_TO_SEARCH (pestaña, número de fila y copia de la fila). Se construye al iniciar
+el bot, se refresca en segundo plano y se guarda en temp/ para tenerlo disponible apenas
+arranca el bot, así una búsqueda no descarga las seis pestañas una tras otra.
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+import config
+from utils.sheets_gateway import run_sheets_call, open_spreadsheet, open_worksheet_by_title
+from utils.google_sheets import get_ranges_batch
+from utils.sheet_schema import SheetSchema
+
+temp_dir = Path.cwd() / 'temp'
+temp_dir.mkdir(parents=True, exist_ok=True)
+INDEX_PATH = temp_dir / 'caseIndex.json'
+
+# pedido normalizado -> lista de {'sheet', 'row_number', 'data'}
+_indice = None
+# pestaña -> mensaje de advertencia de la última construcción
+_advertencias = {}
+# Momento (epoch) de la última construcción exitosa
+_ultima_actualizacion = None
+_lock = asyncio.Lock()
+
+def normaliza_pedido(valor) -> str:
+    return str(valor).strip().lower() if valor else ''
+
+def _indexar_pestania(indice: dict, sheet_name: str, rows) -> str | None:
+    """Agrega las filas de una pestaña al índice. Retorna una advertencia si no se pudo indexar."""
+    if not rows or len(rows) <= 1:
+        return None
+    header_row = rows[0]
+    pedido_column_index = SheetSchema(header_row).col('Número de pedido', default=-1)
+    if pedido_column_index == -1:
+        return f"⚠️ No se encontró la columna \"Número de pedido\" en la pestaña \"{sheet_name}\".\n"
+    for i, row in enumerate(rows[1:], start=2):
+        if len(row) <= pedido_column_index:
+            continue
+        pedido = normaliza_pedido(row[pedido_column_index])
+        if pedido:
+            indice.setdefault(pedido, []).append({
+                'sheet': sheet_name,
+                'row_number': i,
+                'data': row
+            })
+    return None
+
+def _guardar_en_disco(indice: dict, advertencias: dict, timestamp: float):
+    """Guarda el índice en disco (bloqueante: se corre en un hilo)"""
+    try:
+        with open(INDEX_PATH, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': timestamp,
+                'advertencias': advertencias,
+                'indice': indice
+            }, f, ensure_ascii=False)
+    except Exception as error:
+        print("CaseIndex: Error guardando el índice en disco:", error)
+
+def cargar_indice_desde_disco() -> bool:
+    """
+    Carga el último índice guardado (si existe) para responder búsquedas antes de reconstruirlo.
+    Es bloqueante (lee todo el archivo): desde el event loop llamarla con asyncio.to_thread.
+    """
+    global _indice, _advertencias, _ultima_actualizacion
+    try:
+        with open(INDEX_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        _indice = data.get('indice') or {}
+        _advertencias = data.get('advertencias') or {}
+        _ultima_actualizacion = data.get('timestamp')
+        print(f"CaseIndex: índice cargado desde disco ({len(_indice)} pedidos).")
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as error:
+        print("CaseIndex: Error leyendo el índice guardado:", error)
+        return False
+
+async def _leer_pestania(spreadsheet, sheet_name: str):
+    sheet = await open_worksheet_by_title(spreadsheet.id, sheet_name)
+    return await run_sheets_call(sheet.get, 'A:Z')
+
+async def construir_indice_casos():
+    """Lee todas las pestañas configuradas y reemplaza el índice en memoria"""
+    global _indice, _advertencias, _ultima_actualizacion
+    if not config.SPREADSHEET_ID_BUSCAR_CASO or not config.SHEETS_TO_SEARCH:
+        return
+    async with _lock:
+        inicio = time.monotonic()
+        spreadsheet = await open_spreadsheet(config.SPREADSHEET_ID_BUSCAR_CASO)
+        rangos = [f"{nombre}!A:Z" for nombre in config.SHEETS_TO_SEARCH]
+        try:
+            # Todas las pestañas en una sola llamada
+            filas_por_rango = await run_sheets_call(get_ranges_batch, spreadsheet, rangos)
+            resultados = [filas_por_rango.get(r, []) for r in rangos]
+        except Exception as batch_error:
+            # Si una pestaña no existe el lote completo falla: leer cada pestaña por separado
+            print(f"CaseIndex: lectura en lote fallida, se leerán las pestañas por separado: {batch_error}")
+            resultados = await asyncio.gather(
+                *(_leer_pestania(spreadsheet, nombre) for nombre in config.SHEETS_TO_SEARCH),
+                return_exceptions=True
+            )
+        nuevo_indice = {}
+        advertencias = {}
+        for sheet_name, rows in zip(config.SHEETS_TO_SEARCH, resultados):
+            if isinstance(rows, Exception):
+                print(f"CaseIndex: Error al leer la pestaña {sheet_name}: {rows}")
+                advertencias[sheet_name] = f"⚠️ Error al leer la pestaña \"{sheet_name}\".\n"
+                # Conservar las filas anteriores de la pestaña que falló
+                for pedido, filas in (_indice or {}).items():
+                    previas = [f for f in filas if f['sheet'] == sheet_name]
+                    if previas:
+                        nuevo_indice.setdefault(pedido, []).extend(previas)
+                continue
+            advertencia = _indexar_pestania(nuevo_indice, sheet_name, rows)
+            if advertencia:
+                advertencias[sheet_name] = advertencia
+        _indice = nuevo_indice
+        _advertencias = advertencias
+        _ultima_actualizacion = time.time()
+        print(f"CaseIndex: índice construido con {len(_indice)} pedidos en {time.monotonic() - inicio:.1f}s.")
+        await asyncio.to_thread(_guardar_en_disco, _indice, _advertencias, _ultima_actualizacion)
+
+def indice_disponible() -> bool:
+    return _indice is not None
+
+def antiguedad_indice() -> float | None:
+    """Segundos desde la última construcción del índice (None si nunca se construyó)"""
+    if _ultima_actualizacion is None:
+        return None
+    return max(0.0, time.time() - _ultima_actualizacion)
+
+def _describir_antiguedad() -> str:
+    segundos = antiguedad_indice()
+    if segundos is None:
+        return 'sin datos de actualización'
+    if segundos < 60:
+        return f"actualizado hace {int(segundos)} s"
+    if segundos < 3600:
+        return f"actualizado hace {int(segundos // 60)} min"
+    return f"actualizado hace {segundos / 3600:.1f} h"
+
+def buscar_pedido(pedido: str) -> list:
+    """Retorna las filas indexadas para el pedido (lista vacía si no hay coincidencias)"""
+    return list((_indice or {}).get(normaliza_pedido(pedido), []))
+
+async def armar_respuesta_busqueda(pedido: str) -> str:
+    """
+    Arma el mensaje de resultados de /buscar-caso usando el índice.
+    Si el índice todavía no existe, lo construye antes de buscar.
+    """
+    if not indice_disponible():
+        await construir_indice_casos()
+    found_rows = buscar_pedido(pedido)
+    search_summary = f"Resultados de la búsqueda para el pedido **{pedido}**:\n\n"
+    for advertencia in _advertencias.values():
+        search_summary += advertencia
+    if found_rows:
+        search_summary += f"✅ Se encontraron **{len(found_rows)}** coincidencias:\n\n"
+        detailed_results = ''
+        for found in found_rows:
+            detailed_results += f"**Pestaña:** \"{found['sheet']}\", **Fila:** {found['row_number']}\n"
+            display_columns = ' | '.join(found['data'][:6])
+            detailed_results += f"`{display_columns}`\n\n"
+        pie = f"🕒 Índice de búsqueda {_describir_antiguedad()}."
+        full_message = search_summary + detailed_results + pie
+        if len(full_message) > 2000:
+            return search_summary + "Los resultados completos son demasiado largos para mostrar aquí. Por favor, revisa la hoja de Google Sheets directamente.\n" + pie
+        return full_message
+    search_summary += '😕 No se encontraron coincidencias en las pestañas configuradas.\n'
+    search_summary += f"🕒 Índice de búsqueda {_describir_antiguedad()}; los casos cargados después pueden no aparecer todavía."
+    return search_summary
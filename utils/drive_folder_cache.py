@@ -0,0 +1,139 @@
+"""
+Cache persistente de carpetas de Google Drive.
+Guarda (carpeta padre, nombre) -> ID de carpeta y carpeta padre -> ID de la Shared Drive que la
+contiene, en temp/ para conservarlo entre reinicios. La primera vez que se usa una carpeta padre
+se listan todas sus subcarpetas de una vez, así subir archivos para un pedido conocido no hace
+ninguna consulta para resolver la carpeta. Un lock por (padre, nombre) evita que dos subidas
+simultáneas del mismo pedido creen carpetas duplicadas.
+"""
+
+import json
+import threading
+from pathlib import Path
+
+temp_dir = Path.cwd() / 'temp'
+temp_dir.mkdir(parents=True, exist_ok=True)
+CACHE_PATH = temp_dir / 'driveFolders.json'
+
+_FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+# 'padre/nombre' -> ID de carpeta
+_carpetas = {}
+# padre -> ID de Shared Drive ('' si no está en una Shared Drive)
+_shared_drives = {}
+# Padres cuyas subcarpetas ya se listaron
+_precargados = set()
+_cargado = False
+_lock = threading.Lock()
+# (padre, nombre) -> Lock para serializar la búsqueda/creación de una misma carpeta
+_locks_carpeta = {}
+
+def _clave(parent_id: str, folder_name: str) -> str:
+    return f"{parent_id or 'root'}/{folder_name}"
+
+def _cargar_desde_disco():
+    """Carga el cache guardado (con _lock tomado)"""
+    global _cargado
+    if _cargado:
+        return
+    _cargado = True
+    try:
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        _carpetas.update(data.get('carpetas') or {})
+        _shared_drives.update(data.get('shared_drives') or {})
+        _precargados.update(data.get('precargados') or [])
+        print(f"DriveFolderCache: {len(_carpetas)} carpetas cargadas desde disco.")
+    except FileNotFoundError:
+        pass
+    except Exception as error:
+        print("DriveFolderCache: Error leyendo el cache guardado:", error)
+
+def _guardar_en_disco():
+    """Guarda el cache en disco (con _lock tomado)"""
+    try:
+        tmp_path = CACHE_PATH.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'carpetas': _carpetas,
+                'shared_drives': _shared_drives,
+                'precargados': sorted(_precargados)
+            }, f, ensure_ascii=False)
+        tmp_path.replace(CACHE_PATH)
+    except Exception as error:
+        print("DriveFolderCache: Error guardando el cache en disco:", error)
+
+def lock_carpeta(parent_id: str, folder_name: str) -> threading.Lock:
+    """Lock para resolver o crear una carpeta concreta sin duplicarla"""
+    with _lock:
+        return _locks_carpeta.setdefault(_clave(parent_id, folder_name), threading.Lock())
+
+def obtener_carpeta(parent_id: str, folder_name: str) -> str | None:
+    with _lock:
+        _cargar_desde_disco()
+        return _carpetas.get(_clave(parent_id, folder_name))
+
+def registrar_carpeta(parent_id: str, folder_name: str, folder_id: str):
+    with _lock:
+        _cargar_desde_disco()
+        _carpetas[_clave(parent_id, folder_name)] = folder_id
+        _guardar_en_disco()
+
+def invalidar_carpeta(parent_id: str, folder_name: str):
+    """Olvida una carpeta (por ejemplo si fue borrada o movida en Drive)"""
+    with _lock:
+        _cargar_desde_disco()
+        if _carpetas.pop(_clave(parent_id, folder_name), None) is not None:
+            _guardar_en_disco()
+
+def obtener_shared_drive(parent_id: str):
+    """ID de la Shared Drive del padre, '' si no tiene, o None si todavía no se averiguó"""
+    with _lock:
+        _cargar_desde_disco()
+        return _shared_drives.get(parent_id)
+
+def registrar_shared_drive(parent_id: str, drive_id: str | None):
+    with _lock:
+        _cargar_desde_disco()
+        _shared_drives[parent_id] = drive_id or ''
+        _guardar_en_disco()
+
+def precargar_subcarpetas(drive_service, parent_id: str, http=None):
+    """
+    Lista una sola vez todas las subcarpetas de la carpeta padre y las agrega al cache.
+    Si falla, no marca el padre como precargado y se reintenta en el próximo uso.
+    :param http: Cliente HTTP del hilo que llama (el del servicio no se puede compartir entre hilos)
+    """
+    if not parent_id:
+        return
+    with _lock:
+        _cargar_desde_disco()
+        if parent_id in _precargados:
+            return
+    encontradas = {}
+    page_token = None
+    try:
+        while True:
+            response = drive_service.files().list(
+                q=f"'{parent_id}' in parents and mimeType='{_FOLDER_MIME}' and trashed=false",
+                fields='nextPageToken, files(id, name)',
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ).execute(http=http)
+            for file in response.get('files', []):
+                # Si hay nombres repetidos se conserva la primera carpeta encontrada
+                encontradas.setdefault(_clave(parent_id, file['name']), file['id'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+    except Exception as error:
+        print(f"DriveFolderCache: Error listando las subcarpetas de {parent_id}:", error)
+        return
+    with _lock:
+        for clave, folder_id in encontradas.items():
+            _carpetas.setdefault(clave, folder_id)
+        _precargados.add(parent_id)
+        _guardar_en_disco()
+    print(f"DriveFolderCache: {len(encontradas)} subcarpetas precargadas de {parent_id}.")
@@ -0,0 +1,153 @@
+"""
+Despacho de notificaciones de errores de las hojas de casos.
+En lugar de un mensaje y una escritura por fila, junta los avisos de un barrido, los agrupa por
+canal y agente en mensajes de hasta 10 embeds y los envía a través de un limitador (token bucket)
+para no chocar con los límites de Discord. Cuando terminan los envíos escribe todas las marcas de
+notificación de cada spreadsheet en un único values_batch_update; solo las filas cuyo mensaje se
+entregó quedan marcadas.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+import pytz
+from gspread.utils import rowcol_to_a1
+import config
+from utils.sheets_gateway import run_sheets_call
+
+# Límites de Discord por mensaje
+_EMBEDS_POR_MENSAJE = 10
+_CARACTERES_POR_MENSAJE = 6000
+
+class _TokenBucket:
+    """Limitador de envíos: hasta `capacidad` seguidos y luego `por_segundo` envíos por segundo"""
+
+    def __init__(self, capacidad: int, por_segundo: float):
+        self.capacidad = max(1, capacidad)
+        self.por_segundo = por_segundo
+        self.tokens = float(self.capacidad)
+        self.ultima = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def adquirir(self):
+        async with self.lock:
+            while True:
+                ahora = time.monotonic()
+                if self.por_segundo > 0:
+                    self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultima) * self.por_segundo)
+                else:
+                    self.tokens = self.capacidad
+                self.ultima = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.por_segundo)
+
+# Limitador compartido por todos los despachos (se crea en el event loop la primera vez)
+_bucket = None
+
+def _get_bucket() -> _TokenBucket:
+    global _bucket
+    if _bucket is None:
+        _bucket = _TokenBucket(config.ERROR_NOTIFY_BURST, config.ERROR_NOTIFY_RATE_PER_SEC)
+    return _bucket
+
+def _timestamp_notificacion() -> str:
+    tz = pytz.timezone('America/Argentina/Buenos_Aires')
+    return datetime.now(tz).strftime('%d-%m-%Y %H:%M:%S')
+
+def _rango_celda(hoja_titulo: str, fila: int, columna: int) -> str:
+    return "'" + hoja_titulo.replace("'", "''") + "'!" + rowcol_to_a1(fila, columna)
+
+class DespachoErrores:
+    """Avisos de error pendientes de un barrido, para enviarlos agrupados y marcarlos en lote"""
+
+    def __init__(self):
+        # (id de canal, mención) -> [canal, mención, [aviso, ...]]
+        self.grupos = {}
+
+    def agregar(self, sheet_range: str, canal, mencion: str, embed, spreadsheet, hoja_titulo: str, fila: int, columna_notificado: int):
+        """
+        Agrega un aviso. columna_notificado es la columna (1-based) de la hoja donde se marca la
+        notificación (ya sumado el desplazamiento de la primera columna del rango).
+        """
+        clave = (canal.id, mencion)
+        grupo = self.grupos.setdefault(clave, [canal, mencion, []])
+        grupo[2].append({
+            'sheet_range': sheet_range,
+            'embed': embed,
+            'spreadsheet': spreadsheet,
+            'hoja_titulo': hoja_titulo,
+            'fila': fila,
+            'columna': columna_notificado,
+        })
+
+    def cantidad(self) -> int:
+        return sum(len(avisos) for _, _, avisos in self.grupos.values())
+
+    @staticmethod
+    def _mensajes(avisos: list) -> list:
+        """Parte los avisos en mensajes de hasta 10 embeds y 6000 caracteres"""
+        mensajes = []
+        actual = []
+        caracteres = 0
+        for aviso in avisos:
+            largo = len(aviso['embed'])
+            if actual and (len(actual) >= _EMBEDS_POR_MENSAJE or caracteres + largo > _CARACTERES_POR_MENSAJE):
+                mensajes.append(actual)
+                actual = []
+                caracteres = 0
+            actual.append(aviso)
+            caracteres += largo
+        if actual:
+            mensajes.append(actual)
+        return mensajes
+
+    async def enviar(self) -> dict:
+        """
+        Envía los avisos y marca en la hoja los que se entregaron.
+        :return: Dict {rango: {fila: timestamp}} con las filas entregadas y marcadas
+        """
+        if not self.grupos:
+            return {}
+        inicio = time.monotonic()
+        bucket = _get_bucket()
+        entregados = []
+        mensajes_enviados = 0
+        for canal, mencion, avisos in self.grupos.values():
+            for mensaje in self._mensajes(avisos):
+                await bucket.adquirir()
+                try:
+                    await canal.send(content=f"{mencion}", embeds=[a['embed'] for a in mensaje])
+                    mensajes_enviados += 1
+                except Exception as e:
+                    print(f"Error al enviar notificación: {e}")
+                    continue
+                timestamp = _timestamp_notificacion()
+                entregados.extend((aviso, timestamp) for aviso in mensaje)
+        print(f"ErrorNotifier: {len(entregados)}/{self.cantidad()} avisos entregados en {mensajes_enviados} mensajes.")
+        self.grupos = {}
+        return await self._marcar(entregados, inicio)
+
+    @staticmethod
+    async def _marcar(entregados: list, inicio: float) -> dict:
+        """Escribe todas las marcas de notificación de cada spreadsheet en una sola llamada"""
+        por_spreadsheet = {}
+        for aviso, timestamp in entregados:
+            por_spreadsheet.setdefault(id(aviso['spreadsheet']), (aviso['spreadsheet'], []))[1].append((aviso, timestamp))
+        notificadas = {}
+        for spreadsheet, marcas in por_spreadsheet.values():
+            data = [
+                {'range': _rango_celda(a['hoja_titulo'], a['fila'], a['columna']), 'values': [[timestamp]]}
+                for a, timestamp in marcas
+            ]
+            try:
+                await run_sheets_call(spreadsheet.values_batch_update, {'valueInputOption': 'USER_ENTERED', 'data': data})
+            except Exception as update_error:
+                print(f"Error al marcar columna de notificación ({len(data)} celdas): {update_error}")
+                continue
+            for a, timestamp in marcas:
+                notificadas.setdefault(a['sheet_range'], {})[a['fila']] = timestamp
+            print(f"ErrorNotifier: {len(data)} marcas de notificación escritas en una sola llamada.")
+        print(f"ErrorNotifier: despacho completado en {time.monotonic() - inicio:.1f}s.")
+        return notificadas
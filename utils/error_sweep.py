@@ -0,0 +1,234 @@
+"""
+Barrido incremental de errores en las hojas de casos (config.MAPA_RANGOS_ERRORES).
+La lectura es en dos fases: primero solo las columnas ERROR y de notificación de todas las
+filas (una lectura angosta), y después, en lote, solo las filas completas de los errores que
+falta notificar. Por cada rango se guarda un punto de control: el encabezado (para ubicar las
+columnas sin leerlo aparte), la marca de agua (última fila hasta la que todos los errores ya
+están notificados) y un hash de ERROR/notificado hasta esa fila. Si el hash coincide solo se
+buscan errores después de la marca; si no (alguien editó o borró filas viejas), en todo el rango.
+Los puntos de control se guardan en temp/ para no empezar de cero al reiniciar el bot.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from utils.sheets_gateway import run_sheets_call, split_sheet_range, indice_columna
+from utils.sheet_schema import SheetSchema
+from utils.google_sheets import get_ranges_batch, check_sheet_for_errors, directorio_miembros, COLUMNAS_ERROR, COLUMNAS_NOTIFICADO
+from utils.error_notifier import DespachoErrores
+
+temp_dir = Path.cwd() / 'temp'
+temp_dir.mkdir(parents=True, exist_ok=True)
+CHECKPOINTS_PATH = temp_dir / 'errorSweep.json'
+
+# rango -> {'encabezado': [...], 'marca': última fila resuelta, 'hash': hash de ERROR/notificado hasta la marca}
+_puntos_control = None
+_lock = asyncio.Lock()
+
+# Máximo de rangos por llamada al leer filas puntuales (la lista de rangos viaja en la URL)
+_RANGOS_POR_LECTURA = 100
+
+def _cargar_puntos_control() -> dict:
+    global _puntos_control
+    if _puntos_control is None:
+        try:
+            with open(CHECKPOINTS_PATH, 'r', encoding='utf-8') as f:
+                _puntos_control = json.load(f)
+        except FileNotFoundError:
+            _puntos_control = {}
+        except Exception as error:
+            print("ErrorSweep: Error leyendo los puntos de control:", error)
+            _puntos_control = {}
+    return _puntos_control
+
+def _guardar_puntos_control():
+    try:
+        with open(CHECKPOINTS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(_puntos_control or {}, f, ensure_ascii=False)
+    except Exception as error:
+        print("ErrorSweep: Error guardando los puntos de control:", error)
+
+def invalidar_puntos_control():
+    """Olvida los puntos de control: el próximo barrido revisa todos los rangos completos"""
+    global _puntos_control
+    _puntos_control = {}
+    _guardar_puntos_control()
+
+def _letra_columna(indice: int) -> str:
+    """0 -> 'A', 25 -> 'Z', 26 -> 'AA'"""
+    letras = ''
+    n = indice + 1
+    while n:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+def _columnas_del_rango(rango_puro: str):
+    """('A', 'M') para 'A:M' o 'A1:M'; None si el rango no tiene ese formato"""
+    m = re.fullmatch(r'([A-Za-z]+)\d*:([A-Za-z]+)\d*', (rango_puro or '').strip())
+    return (m.group(1).upper(), m.group(2).upper()) if m else None
+
+def _con_hoja(hoja, rango: str) -> str:
+    return f"{hoja}!{rango}" if hoja else rango
+
+def _celda(fila: list, idx: int) -> str:
+    return str(fila[idx]).strip() if len(fila) > idx and fila[idx] else ''
+
+def _columna(filas: list, cantidad: int) -> list:
+    """Valores de una lectura de una sola columna, completados con '' hasta la cantidad de filas"""
+    valores = [_celda(f, 0) for f in filas[:cantidad]]
+    return valores + [''] * (cantidad - len(valores))
+
+def _hash_columnas(errores: list, notificados: list) -> str:
+    # De la marca de notificación solo importa si está o no (la hoja puede reformatear la fecha)
+    h = hashlib.sha1()
+    for error, notificado in zip(errores, notificados):
+        h.update(f"{error}\x1f{'1' if notificado else ''}\x1e".encode('utf-8'))
+    return h.hexdigest()
+
+def _avanzar_marca(sheet_range: str, encabezado: list, errores: list, notificados: list, notificadas: dict):
+    """Mueve la marca de agua hasta la primera fila con un error todavía sin notificar"""
+    puntos = _cargar_puntos_control()
+    notificados = [n or notificadas.get(i, '') for i, n in enumerate(notificados, start=2)]
+    marca = 1
+    for i, (error, notificado) in enumerate(zip(errores, notificados), start=2):
+        if error and not notificado:
+            break
+        marca = i
+    puntos[sheet_range] = {
+        'encabezado': list(encabezado),
+        'marca': marca,
+        'hash': _hash_columnas(errores[:marca - 1], notificados[:marca - 1]),
+    }
+    _guardar_puntos_control()
+
+def _letras_error_notificado(encabezado: list, col_ini: str):
+    """Letras de las columnas ERROR y de notificación según el encabezado (None si falta alguna)"""
+    schema = SheetSchema(encabezado)
+    idx_error = schema.col(*COLUMNAS_ERROR)
+    idx_notificado = schema.col(*COLUMNAS_NOTIFICADO)
+    if idx_error is None or idx_notificado is None:
+        return None
+    base = indice_columna(col_ini)
+    return _letra_columna(base + idx_error), _letra_columna(base + idx_notificado)
+
+async def _leer_columnas_error(spreadsheet, hoja, columnas: tuple, encabezado_previo):
+    """
+    Fase 1: lee el encabezado y las columnas ERROR y de notificación completas.
+    Si hay un encabezado previo se lee todo en una sola llamada (y se repite si las columnas se movieron).
+    :return: (encabezado, errores, notificados) con errores[0] = fila 2, o None si faltan las columnas
+    """
+    col_ini, col_fin = columnas
+    rango_encabezado = _con_hoja(hoja, f"{col_ini}1:{col_fin}1")
+    encabezado = encabezado_previo
+    for _ in range(2):
+        letras = _letras_error_notificado(encabezado, col_ini) if encabezado else None
+        rangos = [rango_encabezado]
+        if letras:
+            rangos += [_con_hoja(hoja, f"{letras[0]}2:{letras[0]}"), _con_hoja(hoja, f"{letras[1]}2:{letras[1]}")]
+        leido = await run_sheets_call(get_ranges_batch, spreadsheet, rangos)
+        encabezado_actual = (leido.get(rango_encabezado) or [[]])[0]
+        if letras and encabezado_actual == encabezado:
+            filas_error = leido.get(rangos[1], [])
+            filas_notificado = leido.get(rangos[2], [])
+            cantidad = max(len(filas_error), len(filas_notificado))
+            return encabezado_actual, _columna(filas_error, cantidad), _columna(filas_notificado, cantidad)
+        if not _letras_error_notificado(encabezado_actual, col_ini):
+            return None
+        # Primer barrido o columnas movidas: volver a leer con el encabezado actual
+        encabezado = encabezado_actual
+    return None
+
+def _tramos(numeros: list) -> list:
+    """Agrupa números de fila ordenados en tramos consecutivos [(desde, hasta), ...]"""
+    tramos = []
+    for n in numeros:
+        if tramos and tramos[-1][1] == n - 1:
+            tramos[-1] = (tramos[-1][0], n)
+        else:
+            tramos.append((n, n))
+    return tramos
+
+async def _leer_filas(spreadsheet, hoja, columnas: tuple, numeros: list) -> list:
+    """Fase 2: lee en lote solo las filas indicadas (todas sus columnas del rango)"""
+    col_ini, col_fin = columnas
+    tramos = _tramos(numeros)
+    filas = []
+    for inicio in range(0, len(tramos), _RANGOS_POR_LECTURA):
+        lote = tramos[inicio:inicio + _RANGOS_POR_LECTURA]
+        rangos = [_con_hoja(hoja, f"{col_ini}{desde}:{col_fin}{hasta}") for desde, hasta in lote]
+        leido = await run_sheets_call(get_ranges_batch, spreadsheet, rangos)
+        for rango, (desde, hasta) in zip(rangos, lote):
+            valores = leido.get(rango, [])
+            filas.extend(valores[k] if k < len(valores) else [] for k in range(hasta - desde + 1))
+    return filas
+
+async def barrer_rango(bot, spreadsheet, sheet_range: str, channel_id: int, guild_id: int, miembros=None, despacho=None):
+    """
+    Revisa un rango desde su punto de control y agrega los errores nuevos al despacho.
+    :return: (encabezado, errores, notificados) para avanzar la marca después del despacho, o None
+    """
+    hoja, rango_puro = split_sheet_range(sheet_range)
+    columnas = _columnas_del_rango(rango_puro)
+    if not columnas:
+        print(f"ErrorSweep: el rango {sheet_range} no tiene el formato 'Hoja!A:M'; se revisa completo.")
+        await check_sheet_for_errors(bot, spreadsheet, sheet_range, channel_id, guild_id, miembros=miembros, despacho=despacho)
+        return None
+    punto = _cargar_puntos_control().get(sheet_range) or {}
+    leido = await _leer_columnas_error(spreadsheet, hoja, columnas, punto.get('encabezado'))
+    if leido is None:
+        return None
+    encabezado, errores, notificados = leido
+
+    # Solo se buscan errores después de la marca si las filas anteriores no cambiaron
+    marca = punto.get('marca', 1) if punto.get('encabezado') == encabezado else 1
+    if marca > 1 and (marca - 1 > len(errores) or _hash_columnas(errores[:marca - 1], notificados[:marca - 1]) != punto.get('hash')):
+        print(f"ErrorSweep: {sheet_range} cambió antes de la fila {marca}; se buscarán errores en todo el rango.")
+        marca = 1
+    pendientes = [i for i in range(marca + 1, len(errores) + 2) if errores[i - 2] and not notificados[i - 2]]
+
+    if pendientes:
+        print(f"ErrorSweep: {len(pendientes)} errores sin notificar en {sheet_range}.")
+        filas = await _leer_filas(spreadsheet, hoja, columnas, pendientes)
+        await check_sheet_for_errors(
+            bot, spreadsheet, sheet_range, channel_id, guild_id,
+            rows=[encabezado] + filas, numeros_fila=pendientes, miembros=miembros, despacho=despacho
+        )
+    return encabezado, errores, notificados
+
+async def barrer_errores(bot, spreadsheet, rangos: dict, guild_id: int) -> dict:
+    """
+    Barre todos los rangos {rango: id de canal} en paralelo (el gateway de Sheets limita la
+    concurrencia real). El directorio de miembros se arma una sola vez por barrido y los avisos
+    de todos los rangos se envían juntos al final (ver utils.error_notifier).
+    Un error en un rango no frena a los demás.
+    :return: Dict {rango: {'notificadas': cantidad, 'error': mensaje o None}}
+    """
+    async with _lock:
+        inicio = time.monotonic()
+        guild = bot.get_guild(guild_id)
+        miembros = await directorio_miembros(guild) if guild else None
+        despacho = DespachoErrores()
+
+        resumen = {r: {'notificadas': 0, 'error': None} for r in rangos}
+
+        async def barrer(sheet_range, channel_id):
+            try:
+                return await barrer_rango(bot, spreadsheet, sheet_range, int(channel_id), guild_id, miembros, despacho)
+            except Exception as error:
+                print(f"Error al verificar errores en el rango {sheet_range}: {error}")
+                resumen[sheet_range]['error'] = str(error)
+                return None
+
+        resultados = await asyncio.gather(*(barrer(r, c) for r, c in rangos.items()))
+        notificadas = await despacho.enviar()
+        for sheet_range, resultado in zip(rangos, resultados):
+            resumen[sheet_range]['notificadas'] = len(notificadas.get(sheet_range, {}))
+            if resultado is not None:
+                encabezado, errores, notificados = resultado
+                _avanzar_marca(sheet_range, encabezado, errores, notificados, notificadas.get(sheet_range, {}))
+        print(f"ErrorSweep: {len(rangos)} rangos revisados en {time.monotonic() - inicio:.1f}s.")
+        return resumen
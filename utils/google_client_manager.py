@@ -1,13 +1,22 @@
 """
 Módulo para gestionar el acceso centralizado a las instancias de Google Sheets y Drive.
 Este módulo evita la inicialización repetida de clientes en cada comando.
+También memoriza los objetos Spreadsheet y Worksheet abiertos, ya que cada open_by_key
+y cada worksheet(nombre) es una consulta de metadata a la API.
 """
 
+import threading
+import time
+
 # Variables globales para las instancias
 _sheets_instance = None
 _drive_instance = None
 _initialized = False
 
+# Cache de handles: spreadsheet_id -> (spreadsheet, {titulo: worksheet}, expiración)
+_handles = {}
+_handles_lock = threading.Lock()
+
 def initialize_google_clients():
     """Inicializar los clientes de Google"""
     global _sheets_instance, _drive_instance, _initialized
@@ -59,4 +68,57 @@ def reset_google_clients():
     _sheets_instance = None
     _drive_instance = None
     _initialized = False
-    initialize_google_clients() 
\ No newline at end of file
+    initialize_google_clients()
+    invalidate_sheet_handles()
+
+def _handles_ttl():
+    import config
+    return config.SHEETS_HANDLE_TTL_MIN * 60
+
+def _cargar_handles(spreadsheet_id):
+    """Abre el spreadsheet y lista todas sus hojas (2 consultas) y guarda el resultado en cache"""
+    spreadsheet = get_sheets_client().open_by_key(spreadsheet_id)
+    hojas = {ws.title: ws for ws in spreadsheet.worksheets()}
+    entrada = (spreadsheet, hojas, time.monotonic() + _handles_ttl())
+    with _handles_lock:
+        _handles[spreadsheet_id] = entrada
+    return entrada
+
+def _obtener_handles(spreadsheet_id):
+    with _handles_lock:
+        entrada = _handles.get(spreadsheet_id)
+    if entrada is None or time.monotonic() >= entrada[2]:
+        entrada = _cargar_handles(spreadsheet_id)
+    return entrada
+
+def get_spreadsheet(spreadsheet_id):
+    """Obtiene el Spreadsheet (memorizado con TTL). Llamada bloqueante: usar desde el gateway."""
+    return _obtener_handles(spreadsheet_id)[0]
+
+def get_worksheets(spreadsheet_id):
+    """Lista las hojas del spreadsheet (memorizada con TTL), en el orden de la planilla"""
+    return list(_obtener_handles(spreadsheet_id)[1].values())
+
+def get_worksheet(spreadsheet_id, titulo=None):
+    """
+    Obtiene una hoja por nombre (o la primera si no se indica) usando el cache.
+    Si la hoja no está en cache se vuelve a listar el spreadsheet una vez antes de fallar.
+    """
+    import gspread
+    for intento in range(2):
+        _, hojas, _ = _obtener_handles(spreadsheet_id)
+        if titulo is None and hojas:
+            return next(iter(hojas.values()))
+        if titulo in hojas:
+            return hojas[titulo]
+        if intento == 0:
+            invalidate_sheet_handles(spreadsheet_id)
+    raise gspread.exceptions.WorksheetNotFound(titulo)
+
+def invalidate_sheet_handles(spreadsheet_id=None):
+    """Descarta los handles memorizados (todos o los de un spreadsheet)"""
+    with _handles_lock:
+        if spreadsheet_id is None:
+            _handles.clear()
+        else:
+            _handles.pop(spreadsheet_id, None)
@@ -1,10 +1,20 @@
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.http import MediaUpload
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 import requests
-import io
+import asyncio
 import json
+import os
+import threading
 import time
+from pathlib import Path
+import config
+from utils.drive_folder_cache import (
+    obtener_carpeta, registrar_carpeta, lock_carpeta, precargar_subcarpetas,
+    obtener_shared_drive, registrar_shared_drive
+)
 
 def initialize_google_drive(credentials_json: str):
     """Inicializar cliente de Google Drive"""
@@ -25,9 +35,29 @@ def initialize_google_drive(credentials_json: str):
         print("Error al inicializar Google Drive:", error)
         raise
 
+def _shared_drive_del_padre(drive_service, parent_id: str) -> str | None:
+    """Obtiene (y memoriza) el ID de la Shared Drive que contiene a la carpeta padre"""
+    drive_id = obtener_shared_drive(parent_id)
+    if drive_id is not None:
+        return drive_id or None
+    try:
+        parent_info = drive_service.files().get(fileId=parent_id, fields='driveId,parents', supportsAllDrives=True).execute(http=_http_para_hilo(drive_service))
+        drive_id = parent_info.get('driveId')
+        # Si no tiene driveId, buscar en los parents recursivamente
+        if not drive_id:
+            print("🔍 DEBUG - Parent no es Shared Drive, buscando Shared Drive en parents...")
+            drive_id = find_shared_drive_recursive(drive_service, parent_id, max_depth=5)
+    except Exception as drive_error:
+        print(f"⚠️ Error obteniendo driveId del parent {parent_id}: {drive_error}")
+        return None
+    registrar_shared_drive(parent_id, drive_id)
+    return drive_id
+
 def find_or_create_drive_folder(drive_service, parent_id: str, folder_name: str) -> str:
     """
     Busca una carpeta por nombre y padre, o la crea si no existe.
+    Usa el cache persistente de carpetas: si la carpeta ya se conoce no hace ninguna consulta.
+    Es seguro llamarla desde varios hilos a la vez para la misma carpeta (no crea duplicados).
     :param drive_service: Instancia de Google Drive API
     :param parent_id: ID de la carpeta padre (o None para raíz)
     :param folder_name: Nombre de la carpeta
@@ -36,178 +66,350 @@ def find_or_create_drive_folder(drive_service, parent_id: str, folder_name: str)
     if not drive_service or not folder_name:
         raise ValueError("find_or_create_drive_folder: Parámetros incompletos.")
     
-    print(f"🔍 DEBUG - Buscando carpeta: '{folder_name}'")
-    print(f"🔍 DEBUG - Parent ID: '{parent_id}'")
+    folder_id = obtener_carpeta(parent_id, folder_name)
+    if folder_id:
+        print(f"✅ Carpeta de Drive '{folder_name}' encontrada en cache con ID: {folder_id}")
+        return folder_id
     
-    try:
-        query = f"name='{folder_name.replace("'", "\\'")}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        if parent_id:
-            query += f" and '{parent_id}' in parents"
-        else:
-            query += " and 'root' in parents"
-        
-        print(f"🔍 DEBUG - Query de búsqueda: '{query}'")
-        
-        response = drive_service.files().list(q=query, fields='files(id, name, parents)', spaces='drive').execute()
-        files = response.get('files', [])
-        
-        print(f"🔍 DEBUG - Archivos encontrados: {len(files)}")
-        for i, file in enumerate(files):
-            print(f"🔍 DEBUG - Archivo {i+1}: ID={file.get('id')}, Name={file.get('name')}, Parents={file.get('parents')}")
-        
-        if files:
-            print(f"✅ Carpeta de Drive '{folder_name}' encontrada con ID: {files[0]['id']}")
-            return files[0]['id']
-        else:
-            print(f"❌ Carpeta de Drive '{folder_name}' no encontrada. Creando...")
-            print(f"🔍 DEBUG - Parent ID para crear: '{parent_id}'")
+    with lock_carpeta(parent_id, folder_name):
+        try:
+            # Otra subida pudo haberla resuelto mientras se esperaba el lock;
+            # si no, listar una vez las subcarpetas del padre para llenar el cache
+            folder_id = obtener_carpeta(parent_id, folder_name)
+            if not folder_id:
+                precargar_subcarpetas(drive_service, parent_id, http=_http_para_hilo(drive_service))
+                folder_id = obtener_carpeta(parent_id, folder_name)
+            if folder_id:
+                print(f"✅ Carpeta de Drive '{folder_name}' encontrada con ID: {folder_id}")
+                return folder_id
             
-            # Delay antes de crear carpeta para evitar rate limiting
-            time.sleep(1)
+            # Consultar por nombre por si la carpeta se creó fuera del bot después de la precarga
+            nombre_escapado = folder_name.replace("'", "\\'")
+            query = f"name='{nombre_escapado}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+            if parent_id:
+                query += f" and '{parent_id}' in parents"
+            else:
+                query += " and 'root' in parents"
+            
+            print(f"🔍 DEBUG - Query de búsqueda: '{query}'")
+            
+            response = drive_service.files().list(
+                q=query, fields='files(id, name, parents)', spaces='drive',
+                supportsAllDrives=True, includeItemsFromAllDrives=True
+            ).execute(http=_http_para_hilo(drive_service))
+            files = response.get('files', [])
+            
+            if files:
+                print(f"✅ Carpeta de Drive '{folder_name}' encontrada con ID: {files[0]['id']}")
+                registrar_carpeta(parent_id, folder_name, files[0]['id'])
+                return files[0]['id']
+            
+            print(f"❌ Carpeta de Drive '{folder_name}' no encontrada. Creando...")
             file_metadata: dict = {
                 'name': folder_name,
                 'mimeType': 'application/vnd.google-apps.folder',
             }
             if parent_id:
                 file_metadata['parents'] = [parent_id]
-                print(f"🔍 DEBUG - Metadata con parent: {file_metadata}")
-                # Forzar creación en Shared Drive especificando el driveId
-                try:
-                    # Obtener el driveId del parent
-                    parent_info = drive_service.files().get(fileId=parent_id, fields='driveId,parents').execute()
-                    parent_drive_id = parent_info.get('driveId')
-                    
-                    # Si no tiene driveId, buscar en los parents recursivamente
-                    if not parent_drive_id:
-                        print("🔍 DEBUG - Parent no es Shared Drive, buscando Shared Drive en parents...")
-                        parent_drive_id = find_shared_drive_recursive(drive_service, parent_id, max_depth=5)
-                        if parent_drive_id:
-                            print(f"🔍 DEBUG - Encontrada Shared Drive recursivamente: {parent_drive_id}")
-                        else:
-                            print("🔍 DEBUG - No se encontró Shared Drive en la jerarquía")
-                    
-                    if parent_drive_id:
-                        print(f"🔍 DEBUG - Forzando creación en Shared Drive ID: {parent_drive_id}")
-                        # Usar supportsAllDrives para forzar creación en Shared Drive
-                        file = drive_service.files().create(
-                            body=file_metadata, 
-                            fields='id, name, parents, driveId',
-                            supportsAllDrives=True
-                        ).execute()
-                    else:
-                        print("⚠️ No se pudo obtener driveId del parent ni de sus parents, creando normalmente")
-                        file = drive_service.files().create(body=file_metadata, fields='id, name, parents, driveId').execute()
-                except Exception as drive_error:
-                    print(f"⚠️ Error obteniendo driveId, creando normalmente: {drive_error}")
-                    file = drive_service.files().create(body=file_metadata, fields='id, name, parents, driveId').execute()
-            else:
-                print(f"🔍 DEBUG - Metadata sin parent: {file_metadata}")
-                file = drive_service.files().create(body=file_metadata, fields='id, name, parents, driveId').execute()
+                parent_drive_id = _shared_drive_del_padre(drive_service, parent_id)
+                if parent_drive_id:
+                    print(f"🔍 DEBUG - Creando en Shared Drive ID: {parent_drive_id}")
+            file = drive_service.files().create(
+                body=file_metadata,
+                fields='id, name, parents, driveId',
+                supportsAllDrives=True
+            ).execute(http=_http_para_hilo(drive_service))
             print(f"✅ Carpeta de Drive '{folder_name}' creada con ID: {file['id']}")
-            print(f"🔍 DEBUG - Carpeta creada - ID: {file.get('id')}, Name: {file.get('name')}, Parents: {file.get('parents')}")
-            
-            # Verificar permisos de la carpeta recién creada
-            try:
-                folder_permissions = drive_service.files().get(fileId=file['id'], fields='permissions,driveId').execute()
-                permissions = folder_permissions.get('permissions', [])
-                drive_id = folder_permissions.get('driveId')
-                print(f"🔍 DEBUG - Permisos de carpeta creada: {len(permissions)} encontrados")
-                print(f"🔍 DEBUG - Drive ID de la carpeta: {drive_id}")
-                for perm in permissions:
-                    email = perm.get('emailAddress', 'Sin email')
-                    role = perm.get('role', 'Sin rol')
-                    print(f"🔍 DEBUG - Permiso: {email} -> {role}")
-            except Exception as perm_error:
-                print(f"❌ Error verificando permisos de carpeta creada: {perm_error}")
-            
-            # Verificar que la carpeta está en la Shared Drive correcta
-            if parent_id and drive_id:
-                print(f"🔍 DEBUG - Verificando ubicación: Parent ID={parent_id}, Drive ID={drive_id}")
-                # Obtener información del parent para comparar
-                try:
-                    parent_info = drive_service.files().get(fileId=parent_id, fields='driveId').execute()
-                    parent_drive_id = parent_info.get('driveId')
-                    print(f"🔍 DEBUG - Parent Drive ID: {parent_drive_id}")
-                    if drive_id == parent_drive_id:
-                        print("✅ Carpeta creada en la misma Shared Drive que el parent")
-                    else:
-                        print("❌ ERROR: Carpeta creada en Drive diferente al parent")
-                except Exception as parent_error:
-                    print(f"❌ Error verificando parent: {parent_error}")
-            
+            if parent_id and file.get('driveId') != (obtener_shared_drive(parent_id) or None):
+                print("❌ ERROR: Carpeta creada en Drive diferente al parent")
+            registrar_carpeta(parent_id, folder_name, file['id'])
             return file['id']
-    except Exception as error:
-        print(f"❌ Error al buscar o crear la carpeta '{folder_name}' en Drive:", error)
-        raise
+        except Exception as error:
+            print(f"❌ Error al buscar o crear la carpeta '{folder_name}' en Drive:", error)
+            raise
 
-import time
+# Tamaño de cada fragmento de la subida reanudable (múltiplo de 256 KB, como exige la API)
+_FRAGMENTO_MINIMO = 256 * 1024
+
+def _tamanio_fragmento() -> int:
+    bytes_config = int(config.DRIVE_UPLOAD_CHUNK_MB * 1024 * 1024)
+    return max(_FRAGMENTO_MINIMO, bytes_config - bytes_config % _FRAGMENTO_MINIMO)
+
+class _DescargaEnFragmentos(MediaUpload):
+    """
+    Media para una subida reanudable que lee el adjunto directamente de la respuesta HTTP de
+    Discord, fragmento por fragmento, sin cargar el archivo completo en memoria.
+    Guarda el último fragmento leído para poder reenviarlo si la API pide reintentarlo.
+    """
+
+    def __init__(self, respuesta, tamanio, mimetype, progreso=None, nombre=''):
+        self._respuesta = respuesta
+        self._tamanio = tamanio
+        self._mimetype = mimetype
+        self._chunksize = _tamanio_fragmento()
+        self._progreso = progreso
+        self._nombre = nombre
+        self._inicio_buffer = 0
+        self._buffer = b''
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
 
-# Delays implementados para evitar rate limiting en Google Drive API
+    def size(self):
+        return self._tamanio
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        fin_buffer = self._inicio_buffer + len(self._buffer)
+        if begin < self._inicio_buffer:
+            raise Exception(f"No se puede retroceder a la posición {begin} en la descarga de {self._nombre}")
+        if begin >= fin_buffer:
+            # Descartar lo ya confirmado y leer el siguiente fragmento de Discord
+            self._buffer = self._leer(begin - fin_buffer + length)[begin - fin_buffer:]
+            self._inicio_buffer = begin
+        elif begin + length > fin_buffer:
+            # Reintento parcial: conservar lo no confirmado y completar con datos nuevos
+            self._buffer = self._buffer[begin - self._inicio_buffer:] + self._leer(begin + length - fin_buffer)
+            self._inicio_buffer = begin
+        inicio = begin - self._inicio_buffer
+        datos = self._buffer[inicio:inicio + length]
+        if self._progreso:
+            self._progreso(self._nombre, begin + len(datos), self._tamanio)
+        return datos
+
+    def _leer(self, cantidad: int) -> bytes:
+        partes = []
+        restante = cantidad
+        while restante > 0:
+            parte = self._respuesta.raw.read(restante, decode_content=True)
+            if not parte:
+                break
+            partes.append(parte)
+            restante -= len(parte)
+        return b''.join(partes)
+
+# Cliente HTTP autorizado por hilo: el de googleapiclient no se puede compartir entre hilos
+_http_local = threading.local()
+
+def _http_para_hilo(drive_service):
+    http = getattr(_http_local, 'http', None)
+    if http is None or getattr(_http_local, 'servicio', None) is not drive_service:
+        credentials = getattr(drive_service._http, 'credentials', None)
+        if credentials is None:
+            return None
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=config.DRIVE_UPLOAD_TIMEOUT_SEC))
+        _http_local.http = http
+        _http_local.servicio = drive_service
+    return http
+
+def obtener_metadata_drive(drive_service, file_id: str, fields: str) -> dict:
+    """
+    Consulta solo los campos indicados de un archivo (ej: 'modifiedTime,version').
+    Es bloqueante y usa el cliente HTTP del hilo, así se puede correr con asyncio.to_thread.
+    """
+    return drive_service.files().get(fileId=file_id, fields=fields, supportsAllDrives=True).execute(
+        http=_http_para_hilo(drive_service)
+    )
+
+def verificar_carpeta_drive(drive_service, folder_id: str) -> str:
+    """
+    Verifica que la carpeta destino existe y es accesible (una vez por lote de subidas).
+    :return: Texto de debug con el nombre y los permisos de la carpeta
+    """
+    try:
+        folder_info = drive_service.files().get(fileId=folder_id, fields='id,name,permissions', supportsAllDrives=True).execute(http=_http_para_hilo(drive_service))
+        folder_name = folder_info.get('name', 'Sin nombre')
+        permissions = folder_info.get('permissions', [])
+        
+        # Crear mensaje de debug para mostrar en Discord
+        debug_info = f"🔍 **DEBUG - Información de carpeta:**\n"
+        debug_info += f"📁 **Carpeta:** {folder_name} (ID: {folder_id})\n"
+        debug_info += f"👥 **Permisos:** {len(permissions)} encontrados\n"
+        
+        for perm in permissions:
+            email = perm.get('emailAddress', 'Sin email')
+            role = perm.get('role', 'Sin rol')
+            debug_info += f"   • {email}: {role}\n"
+        
+        # Guardar debug_info en una variable global simple
+        upload_file_to_drive.debug_info = debug_info
+        return debug_info
+    except Exception as folder_error:
+        upload_file_to_drive.debug_info = f"❌ **Error verificando carpeta:** {folder_error}"
+        raise Exception(f"No se puede acceder a la carpeta {folder_id}: {folder_error}")
 
-def upload_file_to_drive(drive_service, folder_id: str, attachment) -> dict:
+def upload_file_to_drive(drive_service, folder_id: str, attachment, verificar_carpeta: bool = True, progreso=None) -> dict:
     """
-    Descarga un archivo desde una URL y lo sube a Google Drive.
+    Descarga un archivo desde una URL y lo sube a Google Drive con una subida reanudable,
+    pasando los datos por fragmentos (sin cargar el archivo completo en memoria).
     :param drive_service: Instancia de Google Drive API
     :param folder_id: ID de la carpeta destino
-    :param attachment: Objeto con 'url' y 'name' (puede ser un objeto de Discord o un dict)
+    :param attachment: Objeto con 'url' y 'filename' (ej: discord.Attachment); si tiene 'size' se usa como tamaño
+    :param verificar_carpeta: Si es True, verifica la carpeta antes de subir (usar False si ya se verificó el lote)
+    :param progreso: Función opcional progreso(nombre, bytes_enviados, total) llamada por cada fragmento
     :return: Diccionario con los metadatos del archivo subido
     """
     if not drive_service or not folder_id or not attachment or not getattr(attachment, 'url', None) or not getattr(attachment, 'filename', None):
         raise ValueError("upload_file_to_drive: Parámetros incompletos.")
     try:
-        # Delay de 1 segundo para evitar rate limiting 
-        time.sleep(1)
-        # Verificar que la carpeta existe y tenemos permisos
-        try:
-            folder_info = drive_service.files().get(fileId=folder_id, fields='id,name,permissions').execute()
-            folder_name = folder_info.get('name', 'Sin nombre')
-            permissions = folder_info.get('permissions', [])
-            
-            # Crear mensaje de debug para mostrar en Discord
-            debug_info = f"🔍 **DEBUG - Información de carpeta:**\n"
-            debug_info += f"📁 **Carpeta:** {folder_name} (ID: {folder_id})\n"
-            debug_info += f"👥 **Permisos:** {len(permissions)} encontrados\n"
-            
-            for perm in permissions:
-                email = perm.get('emailAddress', 'Sin email')
-                role = perm.get('role', 'Sin rol')
-                debug_info += f"   • {email}: {role}\n"
-            
-            # Guardar debug_info en una variable global simple
-            upload_file_to_drive.debug_info = debug_info
-                
-        except Exception as folder_error:
-            error_msg = f"❌ **Error verificando carpeta:** {folder_error}"
-            upload_file_to_drive.debug_info = error_msg
-            raise Exception(f"No se puede acceder a la carpeta {folder_id}: {folder_error}")
+        if verificar_carpeta:
+            verificar_carpeta_drive(drive_service, folder_id)
         
         print(f"Intentando descargar archivo: {attachment.filename} desde {attachment.url}")
-        file_response = requests.get(attachment.url, stream=True)
-        if not file_response.ok:
-            raise Exception(f"Error al descargar el archivo {attachment.filename}: HTTP status {file_response.status_code}, {file_response.reason}")
-        
-        file_size = len(file_response.content)
-        print(f"Tamaño del archivo: {file_size} bytes")
-        
-        file_metadata = {
-            'name': attachment.filename,
-            'parents': [folder_id],
-        }
-        print(f"🔍 DEBUG - Metadata para subir archivo: {file_metadata}")
-        print(f"🔍 DEBUG - Folder ID donde se subirá: '{folder_id}'")
-        
-        media = MediaIoBaseUpload(io.BytesIO(file_response.content), mimetype=file_response.headers.get('content-type', 'application/octet-stream'))
-        print(f"🔍 DEBUG - Subiendo archivo {attachment.filename} a Drive en la carpeta {folder_id}...")
-        uploaded_file = drive_service.files().create(body=file_metadata, media_body=media, fields='id, name').execute()
+        with requests.get(attachment.url, stream=True, timeout=config.DRIVE_UPLOAD_TIMEOUT_SEC) as file_response:
+            if not file_response.ok:
+                raise Exception(f"Error al descargar el archivo {attachment.filename}: HTTP status {file_response.status_code}, {file_response.reason}")
+            
+            file_size = getattr(attachment, 'size', None) or int(file_response.headers.get('content-length') or 0) or None
+            print(f"Tamaño del archivo: {file_size if file_size is not None else 'desconocido'} bytes")
+            
+            file_metadata = {
+                'name': attachment.filename,
+                'parents': [folder_id],
+            }
+            media = _DescargaEnFragmentos(
+                file_response,
+                file_size,
+                file_response.headers.get('content-type', 'application/octet-stream'),
+                progreso=progreso,
+                nombre=attachment.filename
+            )
+            print(f"🔍 DEBUG - Subiendo archivo {attachment.filename} a Drive en la carpeta {folder_id}...")
+            request = drive_service.files().create(body=file_metadata, media_body=media, fields='id, name', supportsAllDrives=True)
+            http = _http_para_hilo(drive_service)
+            uploaded_file = None
+            while uploaded_file is None:
+                _, uploaded_file = request.next_chunk(http=http, num_retries=3)
         print(f"Archivo '{uploaded_file['name']}' subido con éxito. ID de Drive: {uploaded_file['id']}")
         return uploaded_file
     except Exception as error:
         print(f"Error al descargar o subir el archivo {getattr(attachment, 'filename', 'desconocido')}:", error)
         raise
 
+class _LogProgreso:
+    """Muestra el avance de una subida solo al cruzar cada 25% (no por cada fragmento)"""
+
+    def __init__(self):
+        self.ultimo_hito = 0
+
+    def __call__(self, nombre: str, enviados: int, total):
+        if not total:
+            return
+        hito = min(100, enviados * 100 // total) // 25 * 25
+        if hito > self.ultimo_hito:
+            self.ultimo_hito = hito
+            print(f"📤 {nombre}: {enviados}/{total} bytes ({hito}%)")
+
+async def upload_files_to_drive(drive_service, folder_id: str, attachments, progreso=None) -> list:
+    """
+    Sube varios adjuntos a una carpeta de Drive en paralelo (hasta config.DRIVE_UPLOAD_CONCURRENCY
+    a la vez), verificando la carpeta una sola vez para todo el lote.
+    :param progreso: Corrutina opcional progreso(completados, total) llamada al terminar cada archivo
+    :return: Lista en el mismo orden que attachments con los metadatos subidos o la excepción de cada archivo
+    """
+    await asyncio.to_thread(verificar_carpeta_drive, drive_service, folder_id)
+    semaforo = asyncio.Semaphore(max(1, config.DRIVE_UPLOAD_CONCURRENCY))
+    total = len(attachments)
+    completados = 0
+
+    async def subir(attachment):
+        nonlocal completados
+        async with semaforo:
+            try:
+                resultado = await asyncio.to_thread(upload_file_to_drive, drive_service, folder_id, attachment, False, _LogProgreso())
+            except Exception as error:
+                resultado = error
+        # Informar el avance fuera del semáforo para no demorar las demás subidas
+        completados += 1
+        if progreso:
+            try:
+                await progreso(completados, total)
+            except Exception as progreso_error:
+                print(f"⚠️ No se pudo informar el progreso de la subida: {progreso_error}")
+        return resultado
+
+    inicio = time.monotonic()
+    resultados = await asyncio.gather(*(subir(a) for a in attachments))
+    print(f"Subida a Drive: {total} archivos procesados en {time.monotonic() - inicio:.1f}s.")
+    return resultados
+
+class _ColectorFragmentos:
+    """Destino para MediaIoBaseDownload que solo retiene el último fragmento recibido"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+
+    def tomar(self) -> bytes:
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+def iterar_descarga_drive(drive_service, file_id: str, progreso=None):
+    """
+    Descarga un archivo de Google Drive fragmento por fragmento (generador de bytes).
+    La memoria usada queda en el orden de un fragmento, sin importar el tamaño del archivo.
+    Es bloqueante: desde el bot correrla en un hilo (asyncio.to_thread).
+    :param drive_service: Instancia de Google Drive API
+    :param file_id: ID del archivo
+    :param progreso: Función opcional progreso(descargados, total) llamada por cada fragmento
+    """
+    if not drive_service or not file_id:
+        raise ValueError("iterar_descarga_drive: Parámetros incompletos.")
+    from googleapiclient.http import MediaIoBaseDownload
+    request = drive_service.files().get_media(fileId=file_id)
+    # Cliente HTTP propio del hilo: el del servicio no se puede compartir entre hilos
+    request.http = _http_para_hilo(drive_service) or request.http
+    colector = _ColectorFragmentos()
+    downloader = MediaIoBaseDownload(colector, request, chunksize=_tamanio_fragmento())
+    done = False
+    while not done:
+        status, done = downloader.next_chunk(num_retries=3)
+        datos = colector.tomar()
+        if datos:
+            yield datos
+        if progreso and status:
+            progreso(status.resumable_progress, status.total_size)
+
+def download_file_to_path(drive_service, file_id: str, destino, progreso=None) -> int:
+    """
+    Descarga un archivo de Google Drive directo a disco, sin cargarlo en memoria.
+    Escribe en un archivo temporal y lo renombra al terminar, así el destino nunca queda a medias.
+    :param destino: Ruta del archivo a escribir
+    :param progreso: Función opcional progreso(descargados, total)
+    :return: Cantidad de bytes descargados
+    """
+    destino = Path(destino)
+    temporal = destino.with_suffix(destino.suffix + '.part')
+    total = 0
+    inicio = time.monotonic()
+    try:
+        with open(temporal, 'wb') as f:
+            for datos in iterar_descarga_drive(drive_service, file_id, progreso):
+                f.write(datos)
+                total += len(datos)
+        os.replace(temporal, destino)
+    except Exception as error:
+        print(f"Error al descargar el archivo {file_id} de Drive:", error)
+        try:
+            temporal.unlink()
+        except OSError:
+            pass
+        raise
+    print(f"Archivo {file_id} descargado de Drive: {total} bytes en {time.monotonic() - inicio:.1f}s.")
+    return total
+
 def download_file_from_drive(drive_service, file_id: str) -> bytes:
     """
     Descarga el contenido de un archivo desde Google Drive.
+    Para archivos grandes usar iterar_descarga_drive o download_file_to_path (no cargan todo en memoria).
     :param drive_service: Instancia de Google Drive API
     :param file_id: ID del archivo
     :return: Contenido del archivo como bytes
@@ -216,20 +418,7 @@ def download_file_from_drive(drive_service, file_id: str) -> bytes:
         raise ValueError("download_file_from_drive: Parámetros incompletos.")
     try:
         print(f"Intentando descargar archivo con ID: {file_id}")
-        request = drive_service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        
-        # Usamos MediaIoBaseDownload para descargar el archivo completo
-        from googleapiclient.http import MediaIoBaseDownload
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                print(f"Descargado {int(status.progress() * 100)}%")
-        
-        fh.seek(0)
-        return fh.read()
+        return b''.join(iterar_descarga_drive(drive_service, file_id))
     except Exception as error:
         print(f"Error al descargar el archivo {file_id} de Drive:", error)
         raise
@@ -249,7 +438,7 @@ def find_shared_drive_recursive(drive_service, folder_id: str, max_depth: int =
     
     try:
         print(f"🔍 DEBUG - Verificando nivel {current_depth + 1}: {folder_id}")
-        folder_info = drive_service.files().get(fileId=folder_id, fields='driveId,name,parents').execute()
+        folder_info = drive_service.files().get(fileId=folder_id, fields='driveId,name,parents').execute(http=_http_para_hilo(drive_service))
         
         drive_id = folder_info.get('driveId')
         folder_name = folder_info.get('name', 'Sin nombre')
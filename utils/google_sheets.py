@@ -1,9 +1,13 @@
 import gspread
 from google.oauth2.service_account import Credentials
-from datetime import datetime
-import pytz
 import discord
 import json
+import asyncio
+from utils.sheets_gateway import run_sheets_call, split_sheet_range, columna_inicial, open_worksheet_by_title
+from utils.sheets_write_queue import encolar_actualizacion, encolar_fila, esperar_escrituras
+from utils.sheet_schema import SheetSchema, get_sheet_schema, invalidar_sheet_schema
+from utils.task_table import get_task_table, invalidar_task_table, fila_desde_respuesta, registrar_evento, evento_conocido
+from utils.error_notifier import DespachoErrores
 
 def initialize_google_sheets(credentials_json: str):
     """Inicializar cliente de Google Sheets"""
@@ -41,8 +45,7 @@ def check_if_pedido_exists(sheet, sheet_range: str, pedido_number: str) -> bool:
             print(f"check_if_pedido_exists: No hay datos en {sheet_range}. Pedido {pedido_number} no encontrado.")
             return False
         header_row = rows[0]
-        pedido_column_index = next((i for i, header in enumerate(header_row)
-                                    if header and str(header).strip().lower() == 'número de pedido'), -1)
+        pedido_column_index = SheetSchema(header_row).col('Número de pedido', default=-1)
         if pedido_column_index == -1:
             print(f'check_if_pedido_exists: No se encontró la columna "Número de pedido" en el rango {sheet_range}.' )
             return False
@@ -59,69 +62,125 @@ def check_if_pedido_exists(sheet, sheet_range: str, pedido_number: str) -> bool:
         print(f"check_if_pedido_exists: Error al leer Google Sheet, rango {sheet_range}:", error)
         raise
 
+def _rango_a1(sheet_range: str) -> str:
+    """Convierte 'Hoja!A:K' al formato A1 de la API, con el nombre de hoja entre comillas"""
+    hoja_nombre, rango_puro = split_sheet_range(sheet_range)
+    if not hoja_nombre:
+        return rango_puro
+    return "'" + hoja_nombre.replace("'", "''") + "'!" + rango_puro
+
+def get_ranges_batch(spreadsheet, sheet_ranges: list) -> dict:
+    """
+    Lee varios rangos de un mismo spreadsheet en una sola llamada (values_batch_get).
+    :param spreadsheet: Instancia de gspread.Spreadsheet
+    :param sheet_ranges: Lista de rangos del tipo 'Hoja!A:K'
+    :return: Dict {rango original: lista de filas}
+    """
+    if not sheet_ranges:
+        return {}
+    response = spreadsheet.values_batch_get([_rango_a1(r) for r in sheet_ranges])
+    value_ranges = response.get('valueRanges', [])
+    resultado = {}
+    for i, sheet_range in enumerate(sheet_ranges):
+        value_range = value_ranges[i] if i < len(value_ranges) else {}
+        resultado[sheet_range] = value_range.get('values', [])
+    return resultado
+
+# Encabezados (con alias) de la columna de error y de la marca de notificación en las hojas de casos
+COLUMNAS_ERROR = ("ERROR",)
+COLUMNAS_NOTIFICADO = ("ErrorEnvioCheck", "notificado")
+
+async def directorio_miembros(guild) -> dict:
+    """
+    Arma un dict {apodo o nombre de usuario: miembro} para ubicar agentes por nombre.
+    Usa el cache del gateway si ya tiene a todos los miembros; si no, los pide una sola vez.
+    """
+    if guild.chunked:
+        members = guild.members
+    else:
+        try:
+            members = [member async for member in guild.fetch_members()]
+        except Exception:
+            members = guild.members
+    directorio = {}
+    for member in members:
+        directorio.setdefault(member.display_name, member)
+        directorio.setdefault(member.name, member)
+    return directorio
+
 # Verificar errores y notificar en Discord
-async def check_sheet_for_errors(bot, sheet, sheet_range: str, target_channel_id: int, guild_id: int):
+async def check_sheet_for_errors(bot, sheet, sheet_range: str, target_channel_id: int, guild_id: int, rows=None, numeros_fila=None, miembros=None, despacho=None) -> dict:
     """
     Verifica errores en la hoja de Google Sheets y notifica en Discord.
+    :param sheet: Instancia de gspread.Worksheet o gspread.Spreadsheet
+    :param rows: Filas ya leídas del rango (ej: con get_ranges_batch). Si no se indican, se leen de la hoja.
+                 La primera es siempre el encabezado.
+    :param numeros_fila: Número de fila en la hoja de cada fila de rows[1:] (si se leyeron solo algunas
+                         filas). Si no se indica, las filas se numeran desde la 2.
+    :param miembros: Directorio de miembros (ver directorio_miembros), para compartirlo entre rangos
+    :param despacho: DespachoErrores donde agregar los avisos (para enviarlos junto con los de otros
+                     rangos). Si no se indica, los avisos de este rango se envían al terminar.
+    :return: Dict {número de fila: timestamp} con las filas notificadas y marcadas (vacío si los
+             avisos quedaron en un despacho externo)
     """
     print('Iniciando verificación de errores en Google Sheets...')
+    notificadas = {}
     try:
-        hoja_nombre = None
-        sheet_range_puro = sheet_range
-        if '!' in sheet_range:
-            parts = sheet_range.split('!')
-            if len(parts) == 2:
-                hoja_nombre = parts[0].strip("'")
-                sheet_range_puro = parts[1]
-                try:
-                    spreadsheet = sheet.spreadsheet
-                    sheet = spreadsheet.worksheet(hoja_nombre)
-                except Exception as e:
-                    return
+        hoja_nombre, sheet_range_puro = split_sheet_range(sheet_range)
         if not sheet_range_puro or ':' not in sheet_range_puro:
-            return
-        rows = sheet.get(sheet_range_puro)
-        if not rows:
+            return notificadas
+        # La hoja solo se abre si hace falta leerla o marcar una notificación
+        spreadsheet = sheet if hasattr(sheet, 'worksheet') else sheet.spreadsheet
+        hoja = None
+        async def obtener_hoja():
+            nonlocal hoja
+            if hoja is None:
+                if hoja_nombre:
+                    hoja = await open_worksheet_by_title(spreadsheet.id, hoja_nombre)
+                elif sheet is spreadsheet:
+                    hoja = await run_sheets_call(lambda: spreadsheet.sheet1, spreadsheet_id=spreadsheet.id)
+                else:
+                    hoja = sheet
+            return hoja
+        if rows is None:
             try:
-                test_rows = sheet.get('A1:Z10')
+                await obtener_hoja()
             except Exception as e:
-                pass
-            return
+                return notificadas
+            rows = await run_sheets_call(hoja.get, sheet_range_puro)
+        if not rows:
+            return notificadas
         if len(rows) <= 1:
-            return
+            return notificadas
         cases_channel = bot.get_channel(target_channel_id)
         if not cases_channel:
-            return
+            return notificadas
         guild = bot.get_guild(guild_id)
         if not guild:
-            return
-        try:
-            members = [member async for member in guild.fetch_members()]
-        except Exception:
-            members = guild.members
-        header_row = rows[0]
-        def normaliza_columna(nombre):
-            return str(nombre).strip().replace(' ', '').replace('\u200b', '').replace('\ufeff', '').lower()
-        def buscar_columna(header, posibles_nombres):
-            for nombre in posibles_nombres:
-                for i, h in enumerate(header):
-                    if normaliza_columna(h) == normaliza_columna(nombre):
-                        return i
-            return None
+            return notificadas
+        if miembros is None:
+            miembros = await directorio_miembros(guild)
+        schema = SheetSchema(rows[0])
         # Mapeo flexible de nombres de columna para cada campo
-        idx_pedido = buscar_columna(header_row, ["Número de pedido"])
-        idx_caso = buscar_columna(header_row, ["CASO ID WISE", "ID WISE"])
-        idx_tipo = buscar_columna(header_row, ["Solicitud", "Motivo de reembolso", "SOLICITUD", "Pieza faltante"])
-        idx_datos = buscar_columna(header_row, ["Dirección/Teléfono/Datos (Gestión Front)", "Dirección/Datos", "Correo del cliente"])
-        idx_agente = buscar_columna(header_row, ["Agente carga", "Agente (Front)", "Agente que carga", "Agente", "Agente (Back/TL)"])
-        idx_error = buscar_columna(header_row, ["ERROR"])
-        idx_notificado = buscar_columna(header_row, ["ErrorEnvioCheck", "ErrorEnvioCheck", "notificado"])
-        idx_observaciones = buscar_columna(header_row, ["Observaciones", "Observación adicional"])
+        idx_pedido = schema.col("Número de pedido")
+        idx_caso = schema.col("CASO ID WISE", "ID WISE")
+        idx_tipo = schema.col("Solicitud", "Motivo de reembolso", "SOLICITUD", "Pieza faltante")
+        idx_datos = schema.col("Dirección/Teléfono/Datos (Gestión Front)", "Dirección/Datos", "Correo del cliente")
+        idx_agente = schema.col("Agente carga", "Agente (Front)", "Agente que carga", "Agente", "Agente (Back/TL)")
+        idx_error = schema.col(*COLUMNAS_ERROR)
+        idx_notificado = schema.col(*COLUMNAS_NOTIFICADO)
+        idx_observaciones = schema.col("Observaciones", "Observación adicional")
         error_column_index = idx_error
         notified_column_index = idx_notificado
         if error_column_index is None or notified_column_index is None:
-            return
-        for i, row in enumerate(rows[1:], start=2):
+            return notificadas
+        # Los índices son relativos al rango: la marca va en la columna real de la hoja
+        columna_notificado = columna_inicial(sheet_range_puro) + notified_column_index + 1
+        despacho_propio = despacho is None
+        if despacho_propio:
+            despacho = DespachoErrores()
+        filas_numeradas = zip(numeros_fila, rows[1:]) if numeros_fila is not None else enumerate(rows[1:], start=2)
+        for i, row in filas_numeradas:
             if error_column_index is None or notified_column_index is None:
                 continue
             error_idx = error_column_index  # type: int
@@ -149,7 +208,7 @@ async def check_sheet_for_errors(bot, sheet, sheet_range: str, target_channel_id
                     observaciones = None
                 agente_name = row[idx_agente] if (idx_agente is not None and idx_agente < len(row)) else 'N/A'
                 mention = agente_name
-                found_member = next((m for m in members if m.display_name == agente_name or m.name == agente_name), None)
+                found_member = miembros.get(agente_name)
                 if found_member:
                     mention = f'<@{found_member.id}>'
                 # Crear embed profesional para el error
@@ -165,31 +224,22 @@ async def check_sheet_for_errors(bot, sheet, sheet_range: str, target_channel_id
                 if observaciones is not None and observaciones:
                     embed.add_field(name="Observaciones", value=observaciones, inline=False)
                 embed.set_footer(text="Por favor, revisa la hoja para más detalles.")
+                # El aviso se envía agrupado con los demás y la fila se marca al confirmarse la entrega
                 try:
-                    await cases_channel.send(content=f"{mention}", embed=embed)
-                    tz = pytz.timezone('America/Argentina/Buenos_Aires')
-                    now = datetime.now(tz)
-                    notification_timestamp = now.strftime('%d-%m-%Y %H:%M:%S')
-                    # Marcar la columna de notificación para evitar duplicados
-                    try:
-                        col_letter = chr(ord('A') + notified_idx)
-                        cell_address = f"{col_letter}{i}"
-                        sheet.update_acell(cell_address, notification_timestamp)
-                        print(f"Columna de notificación marcada en {cell_address} con timestamp {notification_timestamp}")
-                    except Exception as update_error:
-                        print(f"Error al marcar columna de notificación: {update_error}")
+                    hoja_titulo = hoja_nombre or (await obtener_hoja()).title
+                    despacho.agregar(sheet_range, cases_channel, mention, embed, spreadsheet, hoja_titulo, i, columna_notificado)
                 except Exception as e:
-                    print(f"Error al enviar notificación: {e}")
+                    print(f"Error al preparar notificación: {e}")
+        if despacho_propio:
+            notificadas = (await despacho.enviar()).get(sheet_range, {})
     except Exception as error:
         pass
     print('Verificación de errores en Google Sheets completada.')
+    return notificadas
 
 def funcion_google_sheets():
     pass 
 
-def normaliza_columna(nombre):
-    return str(nombre).strip().replace(' ', '').lower()
-
 # Columnas para Tareas Activas
 COLUMNAS_TAREAS_ACTIVAS = [
     'Usuario ID', 'Tarea ID', 'Usuario', 'Tarea', 'Observaciones', 'Estado (En proceso, Pausada)',
@@ -201,12 +251,18 @@ COLUMNAS_HISTORIAL = [
     'Fecha/hora de inicio', 'Tipo de evento (Inicio, Pausa, Reanudación, Finalización)', 'Tiempo pausada acumulado', 'Cantidad de casos'
 ]
 
-def get_col_index(header, col_name):
-    col_norm = normaliza_columna(col_name)
-    for i, h in enumerate(header):
-        if normaliza_columna(h) == col_norm:
-            return i
-    return None
+def _actualizar_celda(sheet, fila, col_idx, valor):
+    """
+    Actualiza una celda por índice de columna (0-based).
+    Si la escritura falla se descartan el encabezado y la tabla de tareas memorizados,
+    por si las columnas o filas se movieron.
+    """
+    try:
+        sheet.update_cell(fila, col_idx + 1, valor)
+    except Exception:
+        invalidar_sheet_schema(sheet)
+        invalidar_task_table(sheet)
+        raise
 
 def generar_tarea_id(user_id):
     """
@@ -223,31 +279,31 @@ def registrar_tarea_activa(sheet, user_id, usuario, tarea, observaciones, inicio
     Retorna el ID de tarea generado.
     """
     try:
-        rows = sheet.get_all_values()
-        if not rows:
+        tabla = get_task_table(sheet)
+        if tabla.vacia:
             sheet.append_row(COLUMNAS_TAREAS_ACTIVAS)
-            rows = [COLUMNAS_TAREAS_ACTIVAS]
-        header = rows[0]
-        user_col = get_col_index(header, 'Usuario ID')
-        if user_col is None:
+            tabla.cargar([COLUMNAS_TAREAS_ACTIVAS])
+        if tabla.schema.col('Usuario ID') is None:
             raise Exception('No se encontró la columna Usuario ID en la hoja de Tareas Activas.')
         
         # Verificar si ya tiene una tarea activa
-        for idx, row in enumerate(rows[1:], start=2):
-            if len(row) > user_col and row[user_col] == user_id:
-                # Verificar el estado de la tarea existente
-                estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-                if estado_col is not None and len(row) > estado_col:
-                    estado_existente = row[estado_col].strip().lower()
-                    if estado_existente in ['en proceso', 'pausada']:
-                        raise Exception(f'El usuario ya tiene una tarea activa con estado "{estado_existente}". Debe finalizar la tarea actual antes de iniciar una nueva.')
+        tarea_existente = tabla.activa_de_usuario(user_id)
+        if tarea_existente:
+            estado_existente = tarea_existente['estado'].strip().lower()
+            raise Exception(f'El usuario ya tiene una tarea activa con estado "{estado_existente}". Debe finalizar la tarea actual antes de iniciar una nueva.')
         
         # Generar ID único para la tarea
         tarea_id = generar_tarea_id(user_id)
         
         # Si no tiene tarea activa, agregar la nueva
         nueva_fila = [user_id, tarea_id, usuario, tarea, observaciones, estado, inicio, '', '00:00:00', '0']
-        sheet.append_row(nueva_fila)
+        respuesta = sheet.append_row(nueva_fila)
+        fila_idx = fila_desde_respuesta(respuesta)
+        if fila_idx is not None:
+            tabla.registrar_nueva(nueva_fila, fila_idx)
+        else:
+            # Sin número de fila no se puede indexar: recargar en el próximo uso
+            invalidar_task_table(sheet)
         return tarea_id
     except Exception as e:
         print(f'[ERROR] registrar_tarea_activa: {e}')
@@ -255,33 +311,20 @@ def registrar_tarea_activa(sheet, user_id, usuario, tarea, observaciones, inicio
 
 def usuario_tiene_tarea_activa(sheet, user_id):
     try:
-        rows = sheet.get_all_values()
-        if not rows or len(rows) < 2:
-            return False
-        header = rows[0]
-        user_col = get_col_index(header, 'Usuario ID')
-        if user_col is None:
-            return False
-        for row in rows[1:]:
-            if len(row) > user_col and row[user_col] == user_id:
-                # Solo si el estado es 'En proceso' o 'Pausada' (no 'Finalizada')
-                estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-                if estado_col is not None and len(row) > estado_col:
-                    estado = row[estado_col].strip().lower()
-                    if estado in ['en proceso', 'pausada']:
-                        return True
-        return False
+        # Solo si el estado es 'En proceso' o 'Pausada' (no 'Finalizada')
+        return get_task_table(sheet).activa_de_usuario(user_id) is not None
     except Exception as e:
         print(f'[ERROR] usuario_tiene_tarea_activa: {e}')
         raise
 
 def agregar_evento_historial(sheet, user_id, tarea_id, usuario, tarea, observaciones, fecha_evento, estado, tipo_evento, tiempo_pausada=''):
     try:
-        rows = sheet.get_all_values()
-        if not rows:
+        if not get_sheet_schema(sheet).header:
             sheet.append_row(COLUMNAS_HISTORIAL)
+            invalidar_sheet_schema(sheet)
         nueva_fila = [user_id, tarea_id, usuario, tarea, observaciones, estado, fecha_evento, tipo_evento, tiempo_pausada, '0']
-        sheet.append_row(nueva_fila)
+        respuesta = sheet.append_row(nueva_fila)
+        registrar_evento(tarea_id, tipo_evento, fecha_evento, fila_desde_respuesta(respuesta))
     except Exception as e:
         print(f'[ERROR] agregar_evento_historial: {e}')
         raise
@@ -295,8 +338,8 @@ def obtener_datos_tarea_activa(sheet, user_id):
         if not rows or len(rows) < 2:
             return None
         
-        header = rows[0]
-        user_col = get_col_index(header, 'Usuario ID')
+        schema = SheetSchema(rows[0])
+        user_col = schema.col('Usuario ID')
         
         if user_col is None:
             return None
@@ -304,12 +347,12 @@ def obtener_datos_tarea_activa(sheet, user_id):
         for row in rows[1:]:
             if len(row) > user_col and row[user_col] == user_id:
                 return {
-                    'usuario': row[get_col_index(header, 'Usuario')] if get_col_index(header, 'Usuario') is not None and len(row) > get_col_index(header, 'Usuario') else '',
-                    'tarea': row[get_col_index(header, 'Tarea')] if get_col_index(header, 'Tarea') is not None and len(row) > get_col_index(header, 'Tarea') else '',
-                    'observaciones': row[get_col_index(header, 'Observaciones')] if get_col_index(header, 'Observaciones') is not None and len(row) > get_col_index(header, 'Observaciones') else '',
-                    'estado': row[get_col_index(header, 'Estado (En proceso, Pausada)')] if get_col_index(header, 'Estado (En proceso, Pausada)') is not None and len(row) > get_col_index(header, 'Estado (En proceso, Pausada)') else '',
-                    'inicio': row[get_col_index(header, 'Fecha/hora de inicio')] if get_col_index(header, 'Fecha/hora de inicio') is not None and len(row) > get_col_index(header, 'Fecha/hora de inicio') else '',
-                    'tiempo_pausado': row[get_col_index(header, 'Tiempo pausada acumulado')] if get_col_index(header, 'Tiempo pausada acumulado') is not None and len(row) > get_col_index(header, 'Tiempo pausada acumulado') else '00:00:00'
+                    'usuario': schema.valor(row, 'Usuario'),
+                    'tarea': schema.valor(row, 'Tarea'),
+                    'observaciones': schema.valor(row, 'Observaciones'),
+                    'estado': schema.valor(row, 'Estado (En proceso, Pausada)'),
+                    'inicio': schema.valor(row, 'Fecha/hora de inicio'),
+                    'tiempo_pausado': schema.valor(row, 'Tiempo pausada acumulado', default='00:00:00')
                 }
         
         return None
@@ -383,10 +426,10 @@ def actualizar_tiempo_pausado_por_id(sheet_activas, tarea_id, tiempo_agregar):
         tiempo_nuevo = sumar_tiempo_pausado(tiempo_actual, tiempo_agregar)
         
         # Actualizar en la hoja
-        header = sheet_activas.get_all_values()[0]
-        tiempo_col = get_col_index(header, 'Tiempo pausada acumulado')
+        tiempo_col = get_sheet_schema(sheet_activas).col('Tiempo pausada acumulado')
         if tiempo_col is not None:
-            sheet_activas.update_cell(datos_tarea['fila_idx'], tiempo_col + 1, tiempo_nuevo)
+            _actualizar_celda(sheet_activas, datos_tarea['fila_idx'], tiempo_col, tiempo_nuevo)
+            get_task_table(sheet_activas).actualizar(tarea_id, tiempo_pausado=tiempo_nuevo)
             return tiempo_nuevo
         
         return tiempo_actual
@@ -406,9 +449,9 @@ def pausar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fecha
         
         if datos_tarea['estado'].lower() == 'en proceso':
             # Actualizar estado a pausada
-            header = sheet_activas.get_all_values()[0]
-            estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-            sheet_activas.update_cell(datos_tarea['fila_idx'], estado_col + 1, 'Pausada')
+            estado_col = get_sheet_schema(sheet_activas).col('Estado (En proceso, Pausada)')
+            _actualizar_celda(sheet_activas, datos_tarea['fila_idx'], estado_col, 'Pausada')
+            get_task_table(sheet_activas).actualizar(tarea_id, estado='Pausada')
             
             # Registrar evento en historial
             agregar_evento_historial(
@@ -445,19 +488,20 @@ def reanudar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fec
         
         if datos_tarea['estado'].lower() == 'pausada':
             # Calcular tiempo pausado desde la última pausa
-            # Buscar la última fecha de pausa en el historial
-            rows_historial = sheet_historial.get_all_values()
-            header_historial = rows_historial[0]
-            tarea_id_col = get_col_index(header_historial, 'Tarea ID')
-            tipo_evento_col = get_col_index(header_historial, 'Tipo de evento (Inicio, Pausa, Reanudación, Finalización)')
-            fecha_col = get_col_index(header_historial, 'Fecha/hora de inicio')
-            
-            ultima_pausa = None
-            for row in reversed(rows_historial[1:]):
-                if (len(row) > tarea_id_col and row[tarea_id_col] == tarea_id and 
-                    len(row) > tipo_evento_col and row[tipo_evento_col] == 'Pausa'):
-                    ultima_pausa = row[fecha_col] if len(row) > fecha_col else None
-                    break
+            # (si la pausa la registró el bot se usa la fecha en memoria; si no, se busca en el historial)
+            ultima_pausa = evento_conocido(tarea_id, 'ultima_pausa')
+            if ultima_pausa is None:
+                rows_historial = sheet_historial.get_all_values()
+                schema_historial = SheetSchema(rows_historial[0])
+                tarea_id_col = schema_historial.col('Tarea ID')
+                tipo_evento_col = schema_historial.col('Tipo de evento (Inicio, Pausa, Reanudación, Finalización)')
+                fecha_col = schema_historial.col('Fecha/hora de inicio')
+                
+                for row in reversed(rows_historial[1:]):
+                    if (len(row) > tarea_id_col and row[tarea_id_col] == tarea_id and 
+                        len(row) > tipo_evento_col and row[tipo_evento_col] == 'Pausa'):
+                        ultima_pausa = row[fecha_col] if len(row) > fecha_col else None
+                        break
             
             # Calcular tiempo pausado
             tiempo_pausado_agregar = '00:00:00'
@@ -468,9 +512,9 @@ def reanudar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fec
             tiempo_pausado_nuevo = actualizar_tiempo_pausado_por_id(sheet_activas, tarea_id, tiempo_pausado_agregar)
             
             # Actualizar estado a en proceso
-            header = sheet_activas.get_all_values()[0]
-            estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-            sheet_activas.update_cell(datos_tarea['fila_idx'], estado_col + 1, 'En proceso')
+            estado_col = get_sheet_schema(sheet_activas).col('Estado (En proceso, Pausada)')
+            _actualizar_celda(sheet_activas, datos_tarea['fila_idx'], estado_col, 'En proceso')
+            get_task_table(sheet_activas).actualizar(tarea_id, estado='En proceso')
             
             # Registrar evento en historial
             agregar_evento_historial(
@@ -507,12 +551,13 @@ def finalizar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fe
         
         if datos_tarea['estado'].lower() in ['en proceso', 'pausada']:
             # Actualizar estado a finalizada y agregar fecha de finalización
-            header = sheet_activas.get_all_values()[0]
-            estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-            finalizacion_col = get_col_index(header, 'Fecha/hora de finalización')
+            schema = get_sheet_schema(sheet_activas)
+            estado_col = schema.col('Estado (En proceso, Pausada)')
+            finalizacion_col = schema.col('Fecha/hora de finalización')
             
-            sheet_activas.update_cell(datos_tarea['fila_idx'], estado_col + 1, 'Finalizada')
-            sheet_activas.update_cell(datos_tarea['fila_idx'], finalizacion_col + 1, fecha_finalizacion)
+            _actualizar_celda(sheet_activas, datos_tarea['fila_idx'], estado_col, 'Finalizada')
+            _actualizar_celda(sheet_activas, datos_tarea['fila_idx'], finalizacion_col, fecha_finalizacion)
+            get_task_table(sheet_activas).actualizar(tarea_id, estado='Finalizada', finalizacion=fecha_finalizacion)
             
             # Registrar evento en historial
             agregar_evento_historial(
@@ -535,10 +580,10 @@ def finalizar_tarea_por_id(sheet_activas, sheet_historial, tarea_id, usuario, fe
         print(f'[ERROR] finalizar_tarea_por_id: {e}')
         raise
 
-def finalizar_tarea_por_id_con_cantidad(sheet_activas, sheet_historial, tarea_id, usuario, fecha_finalizacion, cantidad_casos):
+def _encolar_finalizacion(sheet_activas, sheet_historial, tarea_id, usuario, fecha_finalizacion, cantidad_casos):
     """
-    Finaliza una tarea específica por su ID, actualiza la cantidad de casos en ambas hojas
-    y registra el evento en el historial.
+    Encola las escrituras de la finalización de una tarea (corre en el gateway de Sheets).
+    :return: (futures de las escrituras, tabla de tareas)
     """
     try:
         # Obtener datos de la tarea por ID
@@ -548,49 +593,47 @@ def finalizar_tarea_por_id_con_cantidad(sheet_activas, sheet_historial, tarea_id
         
         if datos_tarea['estado'].lower() in ['en proceso', 'pausada']:
             # Actualizar estado a finalizada y agregar fecha de finalización
-            header_activas = sheet_activas.get_all_values()[0]
-            estado_col = get_col_index(header_activas, 'Estado (En proceso, Pausada)')
-            finalizacion_col = get_col_index(header_activas, 'Fecha/hora de finalización')
-            cantidad_col = get_col_index(header_activas, 'Cantidad de casos')
+            schema_activas = get_sheet_schema(sheet_activas)
+            estado_col = schema_activas.col('Estado (En proceso, Pausada)')
+            finalizacion_col = schema_activas.col('Fecha/hora de finalización')
+            cantidad_col = schema_activas.col('Cantidad de casos')
             
+            # Las escrituras se encolan y se envían en lote junto con las de otras finalizaciones
+            escrituras = []
+            spreadsheet_activas = sheet_activas.spreadsheet
+            fila_idx = datos_tarea['fila_idx']
             if estado_col is not None:
-                sheet_activas.update_cell(datos_tarea['fila_idx'], estado_col + 1, 'Finalizada')
+                escrituras.append(encolar_actualizacion(spreadsheet_activas, sheet_activas.title, fila_idx, estado_col + 1, 'Finalizada'))
             if finalizacion_col is not None:
-                sheet_activas.update_cell(datos_tarea['fila_idx'], finalizacion_col + 1, fecha_finalizacion)
+                escrituras.append(encolar_actualizacion(spreadsheet_activas, sheet_activas.title, fila_idx, finalizacion_col + 1, fecha_finalizacion))
             
             # Actualizar cantidad de casos en Tareas Activas
             if cantidad_col is not None:
-                sheet_activas.update_cell(datos_tarea['fila_idx'], cantidad_col + 1, cantidad_casos)
+                escrituras.append(encolar_actualizacion(spreadsheet_activas, sheet_activas.title, fila_idx, cantidad_col + 1, cantidad_casos))
             
             # Buscar y actualizar la cantidad de casos en el historial
-            # Buscar la fila correspondiente a esta tarea en el historial
-            rows_historial = sheet_historial.get_all_values()
-            header_historial = rows_historial[0]
-            tarea_id_col_hist = get_col_index(header_historial, 'Tarea ID')
-            cantidad_col_hist = get_col_index(header_historial, 'Cantidad de casos')
-            
-            if tarea_id_col_hist is not None:
-                for i, row in enumerate(rows_historial[1:], start=2):
-                    if len(row) > tarea_id_col_hist and row[tarea_id_col_hist] == tarea_id:
-                        # Actualizar cantidad de casos en esta fila del historial
-                        if cantidad_col_hist is not None:
-                            sheet_historial.update_cell(i, cantidad_col_hist + 1, cantidad_casos)
-                        break
+            # (la fila del evento Inicio se conoce si la tarea la inició el bot; si no, se busca)
+            schema_historial = get_sheet_schema(sheet_historial)
+            cantidad_col_hist = schema_historial.col('Cantidad de casos')
+            if not schema_historial.header:
+                escrituras.append(encolar_fila(sheet_historial, COLUMNAS_HISTORIAL))
+            fila_inicio = evento_conocido(tarea_id, 'fila_inicio')
+            if fila_inicio is None:
+                rows_historial = sheet_historial.get_all_values()
+                tarea_id_col_hist = SheetSchema(rows_historial[0]).col('Tarea ID') if rows_historial else None
+                if tarea_id_col_hist is not None:
+                    fila_inicio = next((i for i, row in enumerate(rows_historial[1:], start=2)
+                                        if len(row) > tarea_id_col_hist and row[tarea_id_col_hist] == tarea_id), None)
+            if fila_inicio is not None and cantidad_col_hist is not None:
+                escrituras.append(encolar_actualizacion(sheet_historial.spreadsheet, sheet_historial.title, fila_inicio, cantidad_col_hist + 1, cantidad_casos))
             
             # Registrar evento en historial
-            agregar_evento_historial(
-                sheet_historial,
-                datos_tarea.get('user_id', ''),  # Necesitamos el user_id
-                tarea_id,
-                usuario,
-                datos_tarea['tarea'],
-                datos_tarea['observaciones'],
-                fecha_finalizacion,  # Fecha del evento
-                'Finalizada',
-                'Finalización',
-                datos_tarea['tiempo_pausado']
-            )
-            return True
+            escrituras.append(encolar_fila(sheet_historial, [
+                datos_tarea.get('user_id', ''), tarea_id, usuario, datos_tarea['tarea'], datos_tarea['observaciones'],
+                'Finalizada', fecha_finalizacion, 'Finalización', datos_tarea['tiempo_pausado'], '0'
+            ]))
+            
+            return escrituras, get_task_table(sheet_activas)
         else:
             raise Exception('La tarea no está activa.')
         
@@ -598,43 +641,34 @@ def finalizar_tarea_por_id_con_cantidad(sheet_activas, sheet_historial, tarea_id
         print(f'[ERROR] finalizar_tarea_por_id_con_cantidad: {e}')
         raise
 
+async def finalizar_tarea_por_id_con_cantidad(sheet_activas, sheet_historial, tarea_id, usuario, fecha_finalizacion, cantidad_casos):
+    """
+    Finaliza una tarea específica por su ID, actualiza la cantidad de casos en ambas hojas
+    y registra el evento en el historial.
+    Las escrituras se encolan desde el gateway y se envían en lote junto con las de otras
+    finalizaciones; la confirmación se espera en el event loop para no retener un hilo del gateway.
+    """
+    escrituras, tabla = await run_sheets_call(
+        _encolar_finalizacion, sheet_activas, sheet_historial, tarea_id, usuario, fecha_finalizacion, cantidad_casos
+    )
+    try:
+        await esperar_escrituras(escrituras)
+    except Exception as e:
+        print(f'[ERROR] finalizar_tarea_por_id_con_cantidad: {e}')
+        invalidar_sheet_schema(sheet_activas)
+        invalidar_task_table(sheet_activas)
+        raise
+    tabla.actualizar(tarea_id, estado='Finalizada', finalizacion=fecha_finalizacion, cantidad_casos=cantidad_casos)
+    registrar_evento(tarea_id, 'Finalización', fecha_finalizacion, None)
+    return True
+
+
 def obtener_tarea_por_id(sheet, tarea_id):
     """
-    Obtiene los datos de una tarea específica por su ID.
+    Obtiene los datos de una tarea específica por su ID (desde la tabla de tareas en memoria).
     """
     try:
-        rows = sheet.get_all_values()
-        if not rows or len(rows) < 2:
-            return None
-        
-        header = rows[0]
-        tarea_id_col = get_col_index(header, 'Tarea ID')
-        
-        if tarea_id_col is None:
-            return None
-        
-        for row in rows[1:]:
-            if len(row) > tarea_id_col and row[tarea_id_col] == tarea_id:
-                user_id_col = get_col_index(header, 'Usuario ID')
-                usuario_col = get_col_index(header, 'Usuario')
-                tarea_col = get_col_index(header, 'Tarea')
-                observaciones_col = get_col_index(header, 'Observaciones')
-                estado_col = get_col_index(header, 'Estado (En proceso, Pausada)')
-                inicio_col = get_col_index(header, 'Fecha/hora de inicio')
-                tiempo_pausado_col = get_col_index(header, 'Tiempo pausada acumulado')
-                
-                return {
-                    'user_id': row[user_id_col] if user_id_col is not None and len(row) > user_id_col else '',
-                    'usuario': row[usuario_col] if usuario_col is not None and len(row) > usuario_col else '',
-                    'tarea': row[tarea_col] if tarea_col is not None and len(row) > tarea_col else '',
-                    'observaciones': row[observaciones_col] if observaciones_col is not None and len(row) > observaciones_col else '',
-                    'estado': row[estado_col] if estado_col is not None and len(row) > estado_col else '',
-                    'inicio': row[inicio_col] if inicio_col is not None and len(row) > inicio_col else '',
-                    'tiempo_pausado': row[tiempo_pausado_col] if tiempo_pausado_col is not None and len(row) > tiempo_pausado_col else '00:00:00',
-                    'fila_idx': rows.index(row) + 1  # Índice de la fila para actualizaciones
-                }
-        
-        return None
+        return get_task_table(sheet).obtener(tarea_id)
     except Exception as e:
         print(f'[ERROR] obtener_tarea_por_id: {e}')
         return None
@@ -644,34 +678,7 @@ def obtener_tarea_activa_por_usuario(sheet, user_id):
     Obtiene la tarea activa (En proceso o Pausada) de un usuario.
     """
     try:
-        rows = sheet.get_all_values()
-        if not rows or len(rows) < 2:
-            return None
-        
-        header = rows[0]
-        user_col = get_col_index(header, 'Usuario ID')
-        
-        if user_col is None:
-            return None
-        
-        for row in rows[1:]:
-            if len(row) > user_col and row[user_col] == user_id:
-                estado_col_idx = get_col_index(header, 'Estado (En proceso, Pausada)')
-                estado = row[estado_col_idx] if estado_col_idx is not None and len(row) > estado_col_idx else ''
-                if estado.lower() in ['en proceso', 'pausada']:
-                    return {
-                        'user_id': user_id,
-                        'tarea_id': row[get_col_index(header, 'Tarea ID')] if get_col_index(header, 'Tarea ID') is not None and len(row) > get_col_index(header, 'Tarea ID') else '',
-                        'usuario': row[get_col_index(header, 'Usuario')] if get_col_index(header, 'Usuario') is not None and len(row) > get_col_index(header, 'Usuario') else '',
-                        'tarea': row[get_col_index(header, 'Tarea')] if get_col_index(header, 'Tarea') is not None and len(row) > get_col_index(header, 'Tarea') else '',
-                        'observaciones': row[get_col_index(header, 'Observaciones')] if get_col_index(header, 'Observaciones') is not None and len(row) > get_col_index(header, 'Observaciones') else '',
-                        'estado': estado,
-                        'inicio': row[get_col_index(header, 'Fecha/hora de inicio')] if get_col_index(header, 'Fecha/hora de inicio') is not None and len(row) > get_col_index(header, 'Fecha/hora de inicio') else '',
-                        'tiempo_pausado': row[get_col_index(header, 'Tiempo pausada acumulado')] if get_col_index(header, 'Tiempo pausada acumulado') is not None and len(row) > get_col_index(header, 'Tiempo pausada acumulado') else '00:00:00',
-                        'fila_idx': rows.index(row) + 1
-                    }
-        
-        return None
+        return get_task_table(sheet).activa_de_usuario(user_id)
     except Exception as e:
         print(f'[ERROR] obtener_tarea_activa_por_usuario: {e}')
         return None 
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+Índice de búsqueda del manual para las preguntas a Gemini.
+Divide el manual en fragmentos (por párrafos, hasta config.MANUAL_CHUNK_CHARS caracteres) y arma
+un índice léxico BM25 en memoria, así cada pregunta envía al modelo solo los fragmentos más
+relevantes en lugar del manual completo. El índice se guarda en temp/ junto con la versión
+(modifiedTime de Drive) del manual, para no reconstruirlo al reiniciar si el manual no cambió.
+"""
+
+import json
+import math
+import re
+import unicodedata
+from pathlib import Path
+import config
+
+temp_dir = Path.cwd() / 'temp'
+temp_dir.mkdir(parents=True, exist_ok=True)
+INDEX_PATH = temp_dir / 'manualIndex.json'
+
+# Parámetros estándar de BM25
+_K1 = 1.5
+_B = 0.75
+
+_STOPWORDS = {
+    'a', 'al', 'como', 'con', 'cual', 'cuando', 'de', 'del', 'donde', 'el', 'en', 'es', 'esta',
+    'este', 'esto', 'hay', 'la', 'las', 'lo', 'los', 'mas', 'me', 'mi', 'no', 'o', 'para', 'pero',
+    'por', 'que', 'se', 'si', 'sin', 'sobre', 'son', 'su', 'sus', 'un', 'una', 'uno', 'y', 'ya',
+}
+
+# Índice actual: None si todavía no se construyó
+_indice = None
+
+def tokenizar(texto: str) -> list:
+    """Minúsculas, sin tildes, solo palabras y sin palabras vacías"""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r'\w+', texto) if len(t) > 1 and t not in _STOPWORDS]
+
+def dividir_en_fragmentos(texto: str, max_chars: int | None = None) -> list:
+    """
+    Divide el texto en fragmentos de párrafos completos de hasta max_chars caracteres.
+    Los párrafos más largos se cortan por oraciones (o en seco si una oración no entra).
+    """
+    if max_chars is None:
+        max_chars = config.MANUAL_CHUNK_CHARS
+    partes = []
+    for parrafo in re.split(r'\n\s*\n', texto or ''):
+        parrafo = parrafo.strip()
+        if not parrafo:
+            continue
+        if len(parrafo) <= max_chars:
+            partes.append(parrafo)
+            continue
+        for oracion in re.split(r'(?<=[.!?])\s+', parrafo):
+            while len(oracion) > max_chars:
+                partes.append(oracion[:max_chars])
+                oracion = oracion[max_chars:]
+            if oracion:
+                partes.append(oracion)
+
+    fragmentos = []
+    actual = ''
+    for parte in partes:
+        if actual and len(actual) + 2 + len(parte) > max_chars:
+            fragmentos.append(actual)
+            actual = parte
+        else:
+            actual = f"{actual}\n\n{parte}" if actual else parte
+    if actual:
+        fragmentos.append(actual)
+    return fragmentos
+
+class ManualIndex:
+    """Fragmentos del manual e índice invertido BM25 sobre ellos"""
+
+    def __init__(self, version, fragmentos: list, postings: dict, longitudes: list):
+        self.version = version
+        self.fragmentos = fragmentos
+        # término -> lista de [id de fragmento, frecuencia]
+        self.postings = postings
+        self.longitudes = longitudes
+        self.promedio = (sum(longitudes) / len(longitudes)) if longitudes else 0.0
+
+    @classmethod
+    def construir(cls, texto: str, version=None):
+        fragmentos = dividir_en_fragmentos(texto)
+        postings = {}
+        longitudes = []
+        for i, fragmento in enumerate(fragmentos):
+            tokens = tokenizar(fragmento)
+            longitudes.append(len(tokens))
+            frecuencias = {}
+            for token in tokens:
+                frecuencias[token] = frecuencias.get(token, 0) + 1
+            for token, tf in frecuencias.items():
+                postings.setdefault(token, []).append([i, tf])
+        return cls(version, fragmentos, postings, longitudes)
+
+    def buscar(self, pregunta: str, k: int | None = None) -> list:
+        """Los k fragmentos con mayor puntaje BM25, en el orden en que aparecen en el manual"""
+        if k is None:
+            k = config.MANUAL_TOP_K
+        total = len(self.fragmentos)
+        if not total:
+            return []
+        puntajes = {}
+        for termino in set(tokenizar(pregunta)):
+            lista = self.postings.get(termino)
+            if not lista:
+                continue
+            idf = math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+            for i, tf in lista:
+                norma = _K1 * (1 - _B + _B * self.longitudes[i] / (self.promedio or 1))
+                puntajes[i] = puntajes.get(i, 0.0) + idf * tf * (_K1 + 1) / (tf + norma)
+        mejores = sorted(puntajes, key=puntajes.get, reverse=True)[:k]
+        return [self.fragmentos[i] for i in sorted(mejores)]
+
+    def guardar(self):
+        try:
+            with open(INDEX_PATH, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': self.version,
+                    'fragmentos': self.fragmentos,
+                    'postings': self.postings,
+                    'longitudes': self.longitudes,
+                }, f, ensure_ascii=False)
+        except Exception as error:
+            print("ManualIndex: Error guardando el índice en disco:", error)
+
+    @classmethod
+    def cargar(cls, version):
+        """Carga el índice guardado si corresponde a la versión indicada (None si no)"""
+        try:
+            with open(INDEX_PATH, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            print("ManualIndex: Error leyendo el índice guardado:", error)
+            return None
+        if version is None or data.get('version') != version:
+            return None
+        return cls(version, data.get('fragmentos') or [], data.get('postings') or {}, data.get('longitudes') or [])
+
+def preparar_indice_manual(texto: str, version=None) -> ManualIndex:
+    """
+    Deja listo el índice del manual: lo carga de disco si es de la misma versión o lo construye
+    (y lo guarda) si no. La versión guardada incluye el tamaño de fragmento, así un cambio de
+    config.MANUAL_CHUNK_CHARS reconstruye el índice.
+    Es bloqueante (lee o construye el índice): desde el event loop llamarla con asyncio.to_thread.
+    """
+    global _indice
+    if version is not None:
+        version = f"{version}|{config.MANUAL_CHUNK_CHARS}"
+    indice = ManualIndex.cargar(version)
+    if indice is not None:
+        print(f"ManualIndex: índice cargado desde disco ({len(indice.fragmentos)} fragmentos).")
+    else:
+        indice = ManualIndex.construir(texto, version)
+        indice.guardar()
+        print(f"ManualIndex: índice construido con {len(indice.fragmentos)} fragmentos.")
+    _indice = indice
+    return indice
+
+def buscar_fragmentos(pregunta: str, k: int | None = None) -> list:
+    """
+    Fragmentos del manual relevantes para la pregunta (lista vacía si no hay índice).
+    Si la pregunta no comparte ningún término con el manual se devuelven los primeros k fragmentos,
+    así nunca hace falta enviar el manual completo.
+    """
+    if _indice is None:
+        return []
+    if k is None:
+        k = config.MANUAL_TOP_K
+    return _indice.buscar(pregunta, k) or _indice.fragmentos[:k]
+
+def indice_disponible() -> bool:
+    return _indice is not None
+
+def version_indice():
+    return _indice.version if _indice is not None else None
+
+def limpiar_indice_manual():
+    global _indice
+    _indice = None
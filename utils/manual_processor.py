@@ -1,58 +1,169 @@
 import asyncio
+import codecs
+import json
+import os
+from pathlib import Path
 from typing import Optional, Dict, Any
-from utils.google_drive import download_file_from_drive
+from utils.google_drive import download_file_to_path, obtener_metadata_drive
+from utils.manual_index import preparar_indice_manual, limpiar_indice_manual
 
 # Cache global para el manual
 _manual_cache: Optional[str] = None
 _manual_metadata: Optional[Dict[str, Any]] = None
 
-async def load_and_cache_manual(drive_instance, file_id: str) -> None:
+# Copia local del último manual descargado (para servirlo al arrancar sin esperar a Drive)
+temp_dir = Path.cwd() / 'temp'
+temp_dir.mkdir(parents=True, exist_ok=True)
+MANUAL_LOCAL_PATH = temp_dir / 'manual.txt'
+MANUAL_META_PATH = temp_dir / 'manualMeta.json'
+MANUAL_DOWNLOAD_PATH = temp_dir / 'manual.download'
+
+# Evita dos sincronizaciones simultáneas (arranque, tarea periódica y /reset)
+_sync_lock: Optional[asyncio.Lock] = None
+
+# Bytes leídos por vez al decodificar la descarga
+_BLOQUE_DECODIFICACION = 1024 * 1024
+
+def _decodificar_a_archivo(origen: Path, destino: Path) -> str:
+    """
+    Decodifica el archivo descargado bloque por bloque (probando varias codificaciones) y
+    escribe el texto en UTF-8 en destino, sin tener el archivo completo en memoria.
+    Devuelve la codificación usada.
+    """
+    encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+    temporal = destino.with_suffix(destino.suffix + '.tmp')
+    for encoding in encodings + [None]:
+        # None: última opción, utf-8 ignorando los caracteres problemáticos
+        decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='ignore' if encoding is None else 'strict')
+        try:
+            with open(origen, 'rb') as entrada, open(temporal, 'w', encoding='utf-8') as salida:
+                while True:
+                    bloque = entrada.read(_BLOQUE_DECODIFICACION)
+                    salida.write(decoder.decode(bloque, final=not bloque))
+                    if not bloque:
+                        break
+        except UnicodeDecodeError:
+            continue
+        os.replace(temporal, destino)
+        if encoding is None:
+            print("Manual decodificado con 'ignore' (algunos caracteres pueden haberse perdido)")
+            return 'utf-8 (ignore)'
+        print(f"Manual decodificado exitosamente con {encoding}")
+        return encoding
+    return 'utf-8 (ignore)'
+
+def _escribir_atomico(path: Path, contenido: str) -> None:
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+    os.replace(tmp_path, path)
+
+def _guardar_metadata_local() -> None:
+    """Guarda en temp/ la metadata del manual en memoria (el texto ya se escribió al descargarlo)"""
+    if _manual_metadata is None:
+        return
+    try:
+        _escribir_atomico(MANUAL_META_PATH, json.dumps(_manual_metadata, ensure_ascii=False))
+    except Exception as e:
+        print(f"Error al guardar la metadata local del manual: {e}")
+
+def _descargar_manual(drive_instance, file_id: str) -> str:
     """
-    Carga y cachea el manual desde Google Drive
+    Descarga el manual a disco, lo decodifica a temp/manual.txt y devuelve el texto.
+    Es bloqueante: se corre en un hilo.
+    """
+    try:
+        download_file_to_path(drive_instance, file_id, MANUAL_DOWNLOAD_PATH)
+        _decodificar_a_archivo(MANUAL_DOWNLOAD_PATH, MANUAL_LOCAL_PATH)
+    finally:
+        try:
+            MANUAL_DOWNLOAD_PATH.unlink()
+        except OSError:
+            pass
+    with open(MANUAL_LOCAL_PATH, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def cargar_manual_local(file_id: str) -> bool:
+    """
+    Carga en memoria la última copia local del manual, si corresponde al archivo configurado.
+    Es bloqueante (lee el archivo y prepara el índice): desde el event loop usar asyncio.to_thread.
     
     Args:
-        drive_instance: Instancia de Google Drive
         file_id: ID del archivo en Google Drive
+        
+    Returns:
+        True si se cargó la copia local, False si no hay una válida
     """
     global _manual_cache, _manual_metadata
-    
     try:
-        # Obtener el archivo desde Google Drive usando la API moderna
-        file_content = download_file_from_drive(drive_instance, file_id)
-        
-        # Intentar diferentes codificaciones
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-        _manual_cache = None
-        
-        for encoding in encodings:
-            try:
-                _manual_cache = file_content.decode(encoding)
-                print(f"Manual decodificado exitosamente con {encoding}")
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if _manual_cache is None:
-            # Si ninguna codificación funciona, usar 'ignore' para saltar caracteres problemáticos
-            _manual_cache = file_content.decode('utf-8', errors='ignore')
-            print("Manual decodificado con 'ignore' (algunos caracteres pueden haberse perdido)")
-        
-        # Obtener metadata del archivo
-        file_metadata = drive_instance.files().get(fileId=file_id, fields='name,modifiedTime,size').execute()
+        with open(MANUAL_META_PATH, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        if metadata.get('file_id') != file_id:
+            print("La copia local del manual es de otro archivo; se ignorará.")
+            return False
+        with open(MANUAL_LOCAL_PATH, 'r', encoding='utf-8') as f:
+            texto = f.read()
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"Error al leer la copia local del manual: {e}")
+        return False
+
+    _manual_cache = texto
+    _manual_metadata = metadata
+    preparar_indice_manual(_manual_cache, version=_manual_metadata.get('last_modified'))
+    print(f"Manual cargado desde la copia local: {metadata.get('title', 'Manual')} (versión {metadata.get('last_modified')})")
+    return True
+
+def _manual_sin_cambios(file_id: str, file_metadata: Dict[str, Any]) -> bool:
+    """Compara la metadata de Drive con la del manual en memoria (md5 si hay, si no modifiedTime)"""
+    if _manual_cache is None or not _manual_metadata or _manual_metadata.get('file_id') != file_id:
+        return False
+    md5 = file_metadata.get('md5Checksum')
+    if md5 and _manual_metadata.get('md5'):
+        return md5 == _manual_metadata['md5']
+    return bool(file_metadata.get('modifiedTime')) and file_metadata.get('modifiedTime') == _manual_metadata.get('last_modified')
+
+async def sincronizar_manual(drive_instance, file_id: str, forzar: bool = False) -> bool:
+    """
+    Consulta la metadata del manual en Drive y lo descarga solo si cambió
+    (o si no hay manual en memoria, o si se pide forzar la descarga).
+    
+    Args:
+        drive_instance: Instancia de Google Drive
+        file_id: ID del archivo en Google Drive
+        forzar: Descargar aunque la versión no haya cambiado
         
-        # Guardar metadata
+    Returns:
+        True si se descargó una versión nueva, False si el manual no cambió
+    """
+    global _manual_cache, _manual_metadata, _sync_lock
+    if _sync_lock is None:
+        _sync_lock = asyncio.Lock()
+
+    async with _sync_lock:
+        # Las llamadas a Drive son bloqueantes: se corren en un hilo
+        file_metadata = await asyncio.to_thread(obtener_metadata_drive, drive_instance, file_id, 'name,modifiedTime,md5Checksum')
+        if not forzar and _manual_sin_cambios(file_id, file_metadata):
+            print(f"Manual sin cambios en Drive (versión {file_metadata.get('modifiedTime')}); no se descarga.")
+            return False
+
+        texto = await asyncio.to_thread(_descargar_manual, drive_instance, file_id)
+
+        _manual_cache = texto
         _manual_metadata = {
             'file_id': file_id,
             'title': file_metadata.get('name', 'Manual'),
             'last_modified': file_metadata.get('modifiedTime'),
-            'size': len(_manual_cache)
+            'md5': file_metadata.get('md5Checksum'),
+            'size': len(texto)
         }
-        
         print(f"Manual cargado exitosamente: {_manual_metadata['title']} ({_manual_metadata['size']} caracteres)")
-        
-    except Exception as e:
-        print(f"Error al cargar el manual: {e}")
-        raise
+
+        _guardar_metadata_local()
+        # Índice de búsqueda para enviar a Gemini solo las secciones relevantes
+        await asyncio.to_thread(preparar_indice_manual, texto, _manual_metadata['last_modified'])
+        return True
 
 def get_manual_text() -> Optional[str]:
     """
@@ -88,6 +199,7 @@ def clear_manual_cache() -> None:
     global _manual_cache, _manual_metadata
     _manual_cache = None
     _manual_metadata = None
+    limpiar_indice_manual()
 
 def funcion_manual_processor():
     pass  # Implementar lógica de manualProcessor.js aquí 
\ No newline at end of file
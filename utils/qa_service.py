@@ -1,18 +1,106 @@
 # pyright: reportAttributeAccessIssue=false
 
+import asyncio
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
 import google.generativeai as genai
+import config
+from utils.manual_index import buscar_fragmentos, indice_disponible, version_indice
 
+# Modelo de Gemini configurado una sola vez (se recrea si cambia la API key)
 _genai_instance = None
+_genai_api_key = None
+_genai_lock = threading.Lock()
+
+# Cache de respuestas: (pregunta normalizada, versión del manual) -> respuesta
+temp_dir = Path.cwd() / 'temp'
+temp_dir.mkdir(parents=True, exist_ok=True)
+ANSWER_CACHE_PATH = temp_dir / 'qaCache.json'
+_respuestas = OrderedDict()
+_respuestas_cargadas = False
+# Serializa las escrituras del archivo (se hacen fuera del event loop)
+_archivo_lock = threading.Lock()
 
 def initialize_gemini(gemini_api_key: str):
+    """Configura Gemini y crea el modelo (solo la primera vez o si cambió la API key)"""
+    global _genai_instance, _genai_api_key
     if not gemini_api_key:
         raise ValueError("API Key de Gemini no proporcionada.")
+    with _genai_lock:
+        if _genai_instance is None or _genai_api_key != gemini_api_key:
+            genai.configure(api_key=gemini_api_key)
+            _genai_instance = genai.GenerativeModel("gemini-1.5-flash-latest")
+            _genai_api_key = gemini_api_key
+        return _genai_instance
+
+def normaliza_pregunta(pregunta: str) -> str:
+    """Minúsculas, sin tildes, sin signos y con espacios simples (para comparar preguntas)"""
+    texto = unicodedata.normalize('NFKD', (pregunta or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', texto))
+
+def _cargar_respuestas():
+    global _respuestas_cargadas
+    if _respuestas_cargadas:
+        return
+    _respuestas_cargadas = True
+    if not config.GEMINI_ANSWER_CACHE_DISK:
+        return
+    try:
+        with open(ANSWER_CACHE_PATH, 'r', encoding='utf-8') as f:
+            for pregunta, version, respuesta in json.load(f):
+                _respuestas[(pregunta, version)] = respuesta
+        print(f"QAService: {len(_respuestas)} respuestas cargadas desde disco.")
+    except FileNotFoundError:
+        pass
+    except Exception as error:
+        print("QAService: Error leyendo el cache de respuestas:", error)
+
+def _escribir_respuestas(datos: list):
+    """Escribe el cache en disco (bloqueante; reemplaza el archivo de forma atómica)"""
+    with _archivo_lock:
+        tmp_path = ANSWER_CACHE_PATH.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False)
+            os.replace(tmp_path, ANSWER_CACHE_PATH)
+        except Exception as error:
+            print("QAService: Error guardando el cache de respuestas:", error)
+
+def _datos_respuestas() -> list:
+    return [[p, v, r] for (p, v), r in _respuestas.items()]
+
+async def _recordar_respuesta(clave, respuesta: str):
+    _respuestas[clave] = respuesta
+    _respuestas.move_to_end(clave)
+    while len(_respuestas) > max(1, config.GEMINI_ANSWER_CACHE_MAX):
+        _respuestas.popitem(last=False)
+    if config.GEMINI_ANSWER_CACHE_DISK:
+        # La copia se toma en el loop; la escritura corre en un hilo
+        await asyncio.to_thread(_escribir_respuestas, _datos_respuestas())
 
 async def get_answer_from_manual(manual_text: str, question: str, gemini_api_key: str) -> str:
+    if not _respuestas_cargadas:
+        await asyncio.to_thread(_cargar_respuestas)
+    # Sin índice no hay una versión del manual con la que asociar la respuesta: no se cachea
+    version = version_indice()
+    clave = (normaliza_pregunta(question), version) if version is not None else None
+    respuesta = _respuestas.get(clave) if clave is not None else None
+    if respuesta is not None:
+        _respuestas.move_to_end(clave)
+        print("QAService: respuesta obtenida del cache.")
+        return respuesta
     try:
-        initialize_gemini(gemini_api_key)
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
+        model = initialize_gemini(gemini_api_key)
+        # Enviar solo las secciones del manual relevantes para la pregunta; el manual completo
+        # se usa solo si todavía no hay índice
+        if indice_disponible():
+            manual_text = '\n\n[...]\n\n'.join(buscar_fragmentos(question))
         prompt = f'''
             Eres un argentino experto en literatura y te vana cuestionar sobre la obra "El Martin Fierro".
 
@@ -27,12 +115,21 @@ async def get_answer_from_manual(manual_text: str, question: str, gemini_api_key
 
             Pregunta del usuario: "{question}"
         '''
-        result = model.generate_content(prompt)
+        # La generación es bloqueante: correrla en un hilo para no frenar el bot
+        result = await asyncio.wait_for(
+            asyncio.to_thread(model.generate_content, prompt),
+            timeout=config.GEMINI_TIMEOUT_SEC
+        )
         response = result.text
+        if clave is not None:
+            await _recordar_respuesta(clave, response)
         return response
+    except asyncio.TimeoutError:
+        print(f"Gemini no respondió en {config.GEMINI_TIMEOUT_SEC} s.")
+        raise RuntimeError("El servicio de IA tardó demasiado en responder. Intenta de nuevo.")
     except Exception as error:
         print("Error al generar respuesta con Gemini:", error)
         raise RuntimeError("Hubo un problema al contactar al servicio de IA.")
 
 def funcion_qa_service():
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,151 @@
+"""
+Cache en memoria de filas de Google Sheets para la verificación de pedidos duplicados.
+Cada entrada se identifica por (spreadsheet, hoja, rango) y guarda las filas leídas junto
+con un índice hash sobre la columna "Número de pedido". Tras la primera carga completa solo
+se piden las filas agregadas desde el último conteo conocido, y las escrituras hechas por el
+bot se registran de inmediato, así un chequeo de duplicado no descarga toda la hoja.
+"""
+
+import asyncio
+import re
+import time
+import config
+from utils.sheets_gateway import run_sheets_call
+from utils.sheet_schema import SheetSchema
+
+# Caches activos: (spreadsheet_id, hoja, rango) -> SheetRowCache
+_caches = {}
+
+# Rango de columnas completas, ej: 'A:K' o 'A1:K'
+_RANGO_COLUMNAS = re.compile(r'^([A-Za-z]+)1?:([A-Za-z]+)$')
+
+def normaliza_pedido(valor) -> str:
+    """Normaliza un número de pedido para compararlo (igual que check_if_pedido_exists)"""
+    return str(valor).strip().lower() if valor else ''
+
+class SheetRowCache:
+    """Filas de un rango de una hoja y su índice por número de pedido"""
+
+    def __init__(self, spreadsheet_id: str, hoja: str, sheet_range: str):
+        self.spreadsheet_id = spreadsheet_id
+        self.hoja = hoja
+        self.sheet_range = sheet_range
+        self.rows = []
+        self.header = []
+        self.pedido_col = -1
+        # pedido normalizado -> lista de números de fila (1-based)
+        self.indice_pedidos = {}
+        # Pedidos escritos por el bot que todavía no aparecieron en una lectura
+        self.pendientes = set()
+        self.ultima_carga_completa = 0.0
+        self.ultima_actualizacion = 0.0
+        self.lock = asyncio.Lock()
+        match = _RANGO_COLUMNAS.match(sheet_range or '')
+        self._columnas = (match.group(1), match.group(2)) if match else None
+
+    def _indexar(self, rows, fila_inicial: int):
+        """Agrega filas al índice de pedidos a partir del número de fila indicado"""
+        if self.pedido_col == -1:
+            return
+        for i, row in enumerate(rows, start=fila_inicial):
+            if len(row) <= self.pedido_col:
+                continue
+            pedido = normaliza_pedido(row[self.pedido_col])
+            if pedido:
+                self.indice_pedidos.setdefault(pedido, []).append(i)
+                self.pendientes.discard(pedido)
+
+    def _cargar(self, rows):
+        """Reemplaza el contenido del cache con una lectura completa"""
+        self.rows = list(rows or [])
+        self.header = self.rows[0] if self.rows else []
+        self.pedido_col = SheetSchema(self.header).col('Número de pedido', default=-1)
+        self.indice_pedidos = {}
+        self.pendientes = set()
+        self._indexar(self.rows[1:], 2)
+        self.ultima_carga_completa = time.monotonic()
+
+    def _agregar(self, nuevas):
+        """Agrega al cache las filas leídas después de la última conocida"""
+        fila_inicial = len(self.rows) + 1
+        self.rows.extend(nuevas)
+        self._indexar(nuevas, fila_inicial)
+
+    def necesita_carga_completa(self) -> bool:
+        if not self.rows or self._columnas is None:
+            return True
+        ttl = config.SHEET_CACHE_FULL_RESYNC_MIN * 60
+        return time.monotonic() - self.ultima_carga_completa >= ttl
+
+    async def actualizar(self, sheet, forzar: bool = False):
+        """
+        Sincroniza el cache con la hoja: lectura completa la primera vez (o cuando vence el TTL)
+        y lectura incremental de las filas nuevas en el resto de los casos.
+        """
+        async with self.lock:
+            ahora = time.monotonic()
+            if not forzar and self.rows and ahora - self.ultima_actualizacion < config.SHEET_CACHE_DELTA_MIN_SEC:
+                return
+            if forzar or self.necesita_carga_completa():
+                rows = await run_sheets_call(sheet.get, self.sheet_range)
+                self._cargar(rows)
+                print(f"SheetCache: carga completa de {self.hoja}!{self.sheet_range} ({len(self.rows)} filas)")
+            else:
+                col_inicio, col_fin = self._columnas
+                rango_delta = f"{col_inicio}{len(self.rows) + 1}:{col_fin}"
+                nuevas = await run_sheets_call(sheet.get, rango_delta)
+                if nuevas:
+                    self._agregar(list(nuevas))
+                    print(f"SheetCache: {len(nuevas)} filas nuevas en {self.hoja}!{self.sheet_range}")
+            self.ultima_actualizacion = time.monotonic()
+
+    def pedido_existe(self, pedido_number: str) -> bool:
+        """Verifica en O(1) si el pedido ya está en la hoja o fue escrito por el bot"""
+        pedido = normaliza_pedido(pedido_number)
+        if not pedido:
+            return False
+        if pedido in self.pendientes:
+            print(f"SheetCache: Pedido {pedido_number} registrado recientemente por el bot en {self.hoja}.")
+            return True
+        filas = self.indice_pedidos.get(pedido)
+        if filas:
+            print(f"SheetCache: Pedido {pedido_number} encontrado como duplicado en la fila {filas[0]} de {self.hoja}.")
+            return True
+        return False
+
+    def registrar_fila(self, row_data: list):
+        """Registra una fila que el bot acaba de escribir en la hoja"""
+        if self.pedido_col == -1 or len(row_data) <= self.pedido_col:
+            return
+        pedido = normaliza_pedido(row_data[self.pedido_col])
+        if pedido:
+            self.pendientes.add(pedido)
+
+def _clave(sheet, sheet_range: str):
+    spreadsheet_id = getattr(sheet, 'spreadsheet_id', None)
+    if not spreadsheet_id and getattr(sheet, 'spreadsheet', None) is not None:
+        spreadsheet_id = sheet.spreadsheet.id
+    return (spreadsheet_id, sheet.title, sheet_range)
+
+async def get_sheet_cache(sheet, sheet_range: str, forzar: bool = False) -> SheetRowCache:
+    """
+    Obtiene el cache de un rango de hoja, sincronizado con los últimos cambios.
+    :param sheet: Instancia de gspread.Worksheet
+    :param sheet_range: Rango sin nombre de hoja (ej: 'A:K')
+    :param forzar: Si es True, hace una lectura completa aunque el cache esté vigente
+    """
+    clave = _clave(sheet, sheet_range)
+    cache = _caches.get(clave)
+    if cache is None:
+        cache = SheetRowCache(*clave)
+        _caches[clave] = cache
+    await cache.actualizar(sheet, forzar=forzar)
+    return cache
+
+def invalidar_sheet_cache(spreadsheet_id: str | None = None):
+    """Descarta los caches (todos o solo los de un spreadsheet)"""
+    if spreadsheet_id is None:
+        _caches.clear()
+        return
+    for clave in [c for c in _caches if c[0] == spreadsheet_id]:
+        del _caches[clave]
@@ -0,0 +1,52 @@
+"""
+Detector de cambios del spreadsheet de casos.
+Consulta en Drive solo la versión y el modifiedTime del archivo (una llamada muy barata) y
+marca un barrido de errores pendiente cuando cambian. El barrido se lanza recién cuando la hoja
+deja de cambiar por config.ERROR_SWEEP_DEBOUNCE_SEC segundos (así una carga de varias filas
+dispara un solo barrido), o a más tardar config.ERROR_SWEEP_MAX_DELAY_SEC después del primer cambio.
+"""
+
+import asyncio
+import time
+from utils.google_drive import obtener_metadata_drive
+
+# Última versión vista del archivo (None hasta la primera consulta)
+_ultima_version = None
+# Momentos (monotonic) del primer y del último cambio sin barrer; None si no hay barrido pendiente
+_pendiente_desde = None
+_ultimo_cambio = None
+
+async def detectar_cambio(drive_service, file_id: str) -> bool:
+    """
+    Consulta la versión del archivo y registra un cambio si es distinta a la última vista.
+    La primera consulta solo guarda la versión (al iniciar el bot ya barre la tarea check_errors).
+    :return: True si el archivo cambió
+    """
+    global _ultima_version, _pendiente_desde, _ultimo_cambio
+    metadata = await asyncio.to_thread(obtener_metadata_drive, drive_service, file_id, 'version,modifiedTime')
+    version = (metadata.get('version'), metadata.get('modifiedTime'))
+    if version == _ultima_version:
+        return False
+    if _ultima_version is None:
+        _ultima_version = version
+        return False
+    print(f"SheetChangeDetector: el spreadsheet cambió (versión {version[0]}, {version[1]}).")
+    _ultima_version = version
+    ahora = time.monotonic()
+    _ultimo_cambio = ahora
+    if _pendiente_desde is None:
+        _pendiente_desde = ahora
+    return True
+
+def barrido_pendiente(debounce_sec: float, demora_max_sec: float) -> bool:
+    """True si hay cambios sin barrer y la hoja está quieta (o ya se esperó demasiado)"""
+    if _pendiente_desde is None:
+        return False
+    ahora = time.monotonic()
+    return ahora - _ultimo_cambio >= debounce_sec or ahora - _pendiente_desde >= demora_max_sec
+
+def marcar_barrido():
+    """Registra que se lanzó el barrido (los cambios posteriores vuelven a quedar pendientes)"""
+    global _pendiente_desde, _ultimo_cambio
+    _pendiente_desde = None
+    _ultimo_cambio = None
@@ -0,0 +1,86 @@
+"""
+Resolución de columnas por nombre de encabezado.
+Lee solo la fila 1 de cada hoja, arma un mapa nombre normalizado -> índice y lo guarda por
+worksheet con TTL. Permite buscar una columna por varios nombres alternativos (alias) y se
+invalida cuando una escritura falla, por si alguien movió o renombró columnas.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+import config
+
+# (spreadsheet_id, título de hoja) -> (SheetSchema, expiración)
+_schemas = {}
+_lock = threading.Lock()
+
+def normaliza_columna(nombre) -> str:
+    """
+    Normaliza un encabezado: sin espacios ni separadores (/ - _), sin caracteres invisibles,
+    sin tildes y en minúsculas ('Fecha/Hora' y 'fecha_hora', 'Número' y 'numero' coinciden)
+    """
+    if not nombre:
+        return ''
+    texto = str(nombre).strip().replace('\u200b', '').replace('\ufeff', '').lower()
+    texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return re.sub(r'[\s/_-]', '', texto)
+
+class SheetSchema:
+    """Encabezado de una hoja con búsqueda de columnas por nombre"""
+
+    def __init__(self, header: list):
+        self.header = list(header or [])
+        self.indices = {}
+        for i, h in enumerate(self.header):
+            # Si hay encabezados repetidos se conserva el primero
+            self.indices.setdefault(normaliza_columna(h), i)
+
+    def col(self, *nombres, default=None):
+        """Índice (0-based) de la primera columna que coincida con alguno de los nombres, o default"""
+        for nombre in nombres:
+            idx = self.indices.get(normaliza_columna(nombre))
+            if idx is not None:
+                return idx
+        return default
+
+    def col_contiene(self, texto, default=None):
+        """Índice (0-based) de la primera columna cuyo encabezado contiene el texto, o default"""
+        buscado = normaliza_columna(texto)
+        return next((i for i, h in enumerate(self.header) if buscado in normaliza_columna(h)), default)
+
+    def valor(self, row: list, *nombres, default=''):
+        """Valor de la columna indicada en una fila (default si no existe la columna o la celda)"""
+        idx = self.col(*nombres)
+        if idx is None or idx >= len(row):
+            return default
+        return row[idx]
+
+def _clave(sheet):
+    spreadsheet_id = getattr(sheet, 'spreadsheet_id', None)
+    if not spreadsheet_id and getattr(sheet, 'spreadsheet', None) is not None:
+        spreadsheet_id = sheet.spreadsheet.id
+    return (spreadsheet_id, sheet.title)
+
+def get_sheet_schema(sheet) -> SheetSchema:
+    """
+    Obtiene el encabezado de una hoja leyendo solo la fila 1 (memorizado con TTL).
+    Llamada bloqueante: usar desde el gateway de Sheets.
+    """
+    clave = _clave(sheet)
+    with _lock:
+        entrada = _schemas.get(clave)
+    if entrada is not None and time.monotonic() < entrada[1]:
+        return entrada[0]
+    schema = SheetSchema(sheet.row_values(1))
+    with _lock:
+        _schemas[clave] = (schema, time.monotonic() + config.SHEET_SCHEMA_TTL_MIN * 60)
+    return schema
+
+def invalidar_sheet_schema(sheet=None):
+    """Descarta el encabezado memorizado de una hoja (o de todas)"""
+    with _lock:
+        if sheet is None:
+            _schemas.clear()
+        else:
+            _schemas.pop(_clave(sheet), None)
@@ -0,0 +1,153 @@
+"""
+Gateway asíncrono para Google Sheets.
+gspread es una librería síncrona: cada llamada (open_by_key, worksheet, get, append_row,
+update_cell...) bloquea el hilo que la ejecuta. Este módulo ejecuta esas llamadas en un
+pool de hilos acotado, limita la concurrencia por spreadsheet y aplica un timeout, para
+que una consulta lenta a Sheets no congele el event loop de discord.py.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import config
+
+# Pool de hilos compartido por todas las llamadas a Sheets
+_executor = None
+# Semáforos por spreadsheet (se crean en el event loop la primera vez que se usan)
+_semaforos = {}
+# Event loop del gateway (para programar llamadas desde otros hilos, ej: timers de la cola de escritura)
+_loop = None
+
+def _get_executor():
+    """Obtener (o crear) el pool de hilos para llamadas a Sheets"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=config.SHEETS_MAX_WORKERS,
+            thread_name_prefix='sheets-gateway'
+        )
+    return _executor
+
+def _get_semaforo(spreadsheet_id):
+    """Obtener el semáforo que limita la concurrencia de un spreadsheet"""
+    clave = spreadsheet_id or '__default__'
+    semaforo = _semaforos.get(clave)
+    if semaforo is None:
+        semaforo = asyncio.Semaphore(config.SHEETS_MAX_CONCURRENCY_PER_SPREADSHEET)
+        _semaforos[clave] = semaforo
+    return semaforo
+
+def _spreadsheet_id_de(obj):
+    """Intenta deducir el ID del spreadsheet a partir de un Worksheet o Spreadsheet de gspread"""
+    if obj is None:
+        return None
+    spreadsheet_id = getattr(obj, 'spreadsheet_id', None)
+    if spreadsheet_id:
+        return spreadsheet_id
+    spreadsheet = getattr(obj, 'spreadsheet', None)
+    if spreadsheet is not None and getattr(spreadsheet, 'id', None):
+        return spreadsheet.id
+    # Un Spreadsheet de gspread expone directamente el atributo id
+    if hasattr(obj, 'worksheet') and getattr(obj, 'id', None):
+        return obj.id
+    return None
+
+def split_sheet_range(sheet_range: str):
+    """
+    Separa un rango del tipo 'Hoja!A:K' en (nombre_hoja, rango_puro).
+    Si el rango no incluye hoja, retorna (None, rango).
+    """
+    if sheet_range and '!' in sheet_range:
+        partes = sheet_range.split('!')
+        if len(partes) == 2:
+            return partes[0].strip("'"), partes[1]
+    return None, sheet_range
+
+def indice_columna(letras: str) -> int:
+    """'A' -> 0, 'Z' -> 25, 'AA' -> 26"""
+    indice = 0
+    for letra in letras.upper():
+        indice = indice * 26 + (ord(letra) - ord('A') + 1)
+    return indice - 1
+
+def columna_inicial(rango_puro: str) -> int:
+    """Índice (0-based) de la primera columna de un rango como 'C:M' o 'C2:M' (0 si no tiene letras)"""
+    letras = ''
+    for caracter in (rango_puro or '').strip():
+        if not caracter.isalpha():
+            break
+        letras += caracter
+    return indice_columna(letras) if letras else 0
+
+async def run_sheets_call(func, *args, spreadsheet_id: str | None = None, timeout: float | None = None, **kwargs):
+    """
+    Ejecuta una llamada síncrona de gspread en el pool de hilos.
+    :param func: Función o método a ejecutar (ej: sheet.get, sheet.append_row)
+    :param spreadsheet_id: ID del spreadsheet para el límite de concurrencia. Si no se indica,
+                           se deduce del método o del primer argumento.
+    :param timeout: Tiempo máximo en segundos (por defecto config.SHEETS_CALL_TIMEOUT_SEC)
+    :return: El resultado de la llamada
+    :raises TimeoutError: Si la llamada supera el timeout
+    """
+    if spreadsheet_id is None:
+        spreadsheet_id = _spreadsheet_id_de(getattr(func, '__self__', None))
+    if spreadsheet_id is None and args:
+        spreadsheet_id = _spreadsheet_id_de(args[0])
+    if timeout is None:
+        timeout = config.SHEETS_CALL_TIMEOUT_SEC
+
+    global _loop
+    loop = _loop = asyncio.get_running_loop()
+    async with _get_semaforo(spreadsheet_id):
+        future = loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            # El hilo sigue corriendo hasta que gspread responda, pero el handler no queda bloqueado
+            nombre = getattr(func, '__name__', repr(func))
+            print(f"⚠️ SheetsGateway: la llamada {nombre} superó el timeout de {timeout}s")
+            raise TimeoutError(f"La llamada a Google Sheets ({nombre}) superó el tiempo máximo de {timeout} segundos.")
+
+def run_sheets_call_threadsafe(func, *args, spreadsheet_id: str | None = None, timeout: float | None = None, **kwargs):
+    """
+    Programa run_sheets_call desde cualquier hilo (sin esperarla), en el event loop del gateway.
+    :return: concurrent.futures.Future con el resultado de la llamada
+    :raises RuntimeError: Si el gateway todavía no tiene un event loop o ya se cerró
+    """
+    if _loop is None or _loop.is_closed():
+        raise RuntimeError("SheetsGateway: no hay un event loop disponible.")
+    return asyncio.run_coroutine_threadsafe(
+        run_sheets_call(func, *args, spreadsheet_id=spreadsheet_id, timeout=timeout, **kwargs), _loop
+    )
+
+async def open_spreadsheet(spreadsheet_id: str):
+    """Abre un spreadsheet por ID sin bloquear el event loop (usa los handles memorizados)"""
+    from utils.google_client_manager import get_spreadsheet
+    return await run_sheets_call(get_spreadsheet, spreadsheet_id, spreadsheet_id=spreadsheet_id)
+
+async def open_worksheet_by_title(spreadsheet_id: str, titulo: str):
+    """Obtiene una hoja por nombre (usa los handles memorizados)"""
+    from utils.google_client_manager import get_worksheet
+    return await run_sheets_call(get_worksheet, spreadsheet_id, titulo, spreadsheet_id=spreadsheet_id)
+
+async def list_worksheets(spreadsheet_id: str):
+    """Lista las hojas de un spreadsheet (usa los handles memorizados)"""
+    from utils.google_client_manager import get_worksheets
+    return await run_sheets_call(get_worksheets, spreadsheet_id, spreadsheet_id=spreadsheet_id)
+
+async def open_worksheet(spreadsheet_id: str, sheet_range: str):
+    """
+    Abre la hoja indicada en un rango 'Hoja!A:K' (o la primera hoja si no se indica).
+    :return: Tupla (worksheet, rango_puro)
+    """
+    hoja_nombre, sheet_range_puro = split_sheet_range(sheet_range)
+    sheet = await open_worksheet_by_title(spreadsheet_id, hoja_nombre)
+    return sheet, sheet_range_puro
+
+def shutdown_sheets_gateway():
+    """Liberar el pool de hilos (al apagar el bot)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+    _semaforos.clear()
@@ -0,0 +1,184 @@
+"""
+Cola de escritura diferida para Google Sheets.
+Junta las actualizaciones de celdas y las filas nuevas pendientes de cada spreadsheet y las
+envía juntas: las celdas en un único values_batch_update (aunque sean de distintas hojas) y
+las filas en un append_rows por hoja. El envío ocurre tras una breve espera o al alcanzar un
+tamaño máximo de lote. Cada escritura devuelve un Future para que quien la encoló pueda
+confirmar si se guardó. Los envíos pasan por el gateway (utils.sheets_gateway), así respetan el
+límite de concurrencia y el timeout de cada spreadsheet.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError
+from gspread.utils import rowcol_to_a1
+import config
+from utils.sheets_gateway import run_sheets_call, run_sheets_call_threadsafe
+
+class _Pendientes:
+    """Escrituras pendientes de un spreadsheet"""
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        # rango A1 -> [valor, [futures]] (el último valor encolado para una celda es el que se escribe)
+        self.celdas = {}
+        # id de worksheet -> (worksheet, [(fila, future)])
+        self.filas = {}
+        self.timer = None
+
+    def cantidad(self) -> int:
+        return len(self.celdas) + sum(len(filas) for _, filas in self.filas.values())
+
+# Escrituras pendientes por spreadsheet
+_pendientes = {}
+_lock = threading.Lock()
+
+def _rango_celda(hoja_titulo: str, fila: int, columna: int) -> str:
+    return "'" + hoja_titulo.replace("'", "''") + "'!" + rowcol_to_a1(fila, columna)
+
+def _futures(entrada: _Pendientes) -> list:
+    return [f for _, fs in entrada.celdas.values() for f in fs] + [f for _, filas in entrada.filas.values() for _, f in filas]
+
+def _resolver(futures: list, error: Exception | None = None):
+    """Resuelve los futures que sigan pendientes (un envío vencido por timeout puede terminar después)"""
+    for f in futures:
+        if f.done():
+            continue
+        try:
+            if error is None:
+                f.set_result(True)
+            else:
+                f.set_exception(error)
+        except InvalidStateError:
+            # Lo resolvió otro hilo entre la consulta y la asignación
+            pass
+
+def _enviar(entrada: _Pendientes):
+    """Envía a la API las escrituras de un spreadsheet y resuelve sus futures (corre en el gateway)"""
+    if entrada.celdas:
+        data = [{'range': rango, 'values': [[valor]]} for rango, (valor, _) in entrada.celdas.items()]
+        futures = [f for _, fs in entrada.celdas.values() for f in fs]
+        try:
+            entrada.spreadsheet.values_batch_update({'valueInputOption': 'USER_ENTERED', 'data': data})
+            _resolver(futures)
+            print(f"SheetsWriteQueue: {len(data)} celdas actualizadas en una sola llamada.")
+        except Exception as error:
+            print(f"[ERROR] SheetsWriteQueue: fallo al actualizar {len(data)} celdas: {error}")
+            _resolver(futures, error)
+    for worksheet, filas in entrada.filas.values():
+        futures = [f for _, f in filas]
+        try:
+            worksheet.append_rows([fila for fila, _ in filas])
+            _resolver(futures)
+            print(f"SheetsWriteQueue: {len(filas)} filas agregadas a {worksheet.title}.")
+        except Exception as error:
+            print(f"[ERROR] SheetsWriteQueue: fallo al agregar {len(filas)} filas a {worksheet.title}: {error}")
+            _resolver(futures, error)
+
+def _programar_envio(entrada: _Pendientes):
+    """Programa el envío en el gateway sin esperarlo (se llama desde timers e hilos del gateway)"""
+    try:
+        envio = run_sheets_call_threadsafe(_enviar, entrada, spreadsheet_id=entrada.spreadsheet.id)
+    except RuntimeError as error:
+        print(f"[ERROR] SheetsWriteQueue: no se pudo programar el envío: {error}")
+        _resolver(_futures(entrada), error)
+        return
+    def al_terminar(resultado):
+        # Si el envío no llegó a correr (o venció el timeout) las escrituras se dan por fallidas
+        error = resultado.exception() if not resultado.cancelled() else RuntimeError("Envío cancelado.")
+        if error is not None:
+            _resolver(_futures(entrada), error)
+    envio.add_done_callback(al_terminar)
+
+def _sacar(spreadsheet_id: str):
+    """Quita (con el lock tomado) las escrituras pendientes de un spreadsheet"""
+    entrada = _pendientes.pop(spreadsheet_id, None)
+    if entrada is not None and entrada.timer is not None:
+        entrada.timer.cancel()
+    return entrada
+
+def _flush_por_timer(spreadsheet_id: str):
+    with _lock:
+        entrada = _sacar(spreadsheet_id)
+    if entrada is not None:
+        _programar_envio(entrada)
+
+def _encolar(spreadsheet, agregar):
+    """Registra una escritura y decide si enviar el lote ahora o programar el envío"""
+    enviar_ahora = None
+    with _lock:
+        entrada = _pendientes.get(spreadsheet.id)
+        if entrada is None:
+            entrada = _Pendientes(spreadsheet)
+            _pendientes[spreadsheet.id] = entrada
+        future = agregar(entrada)
+        if entrada.cantidad() >= config.SHEETS_WRITE_BATCH_SIZE:
+            enviar_ahora = _sacar(spreadsheet.id)
+        elif entrada.timer is None:
+            entrada.timer = threading.Timer(config.SHEETS_WRITE_FLUSH_SEC, _flush_por_timer, args=(spreadsheet.id,))
+            entrada.timer.daemon = True
+            entrada.timer.start()
+    if enviar_ahora is not None:
+        _programar_envio(enviar_ahora)
+    return future
+
+def encolar_actualizacion(spreadsheet, hoja_titulo: str, fila: int, columna: int, valor) -> Future:
+    """
+    Encola la actualización de una celda (equivalente a worksheet.update_cell).
+    :param spreadsheet: Instancia de gspread.Spreadsheet
+    :param hoja_titulo: Nombre de la hoja
+    :param fila: Número de fila (1-based)
+    :param columna: Número de columna (1-based)
+    :return: Future que se resuelve cuando la celda se escribió (o con la excepción del envío)
+    """
+    rango = _rango_celda(hoja_titulo, fila, columna)
+    def agregar(entrada):
+        future = Future()
+        if rango in entrada.celdas:
+            entrada.celdas[rango][0] = valor
+            entrada.celdas[rango][1].append(future)
+        else:
+            entrada.celdas[rango] = [valor, [future]]
+        return future
+    return _encolar(spreadsheet, agregar)
+
+def encolar_fila(worksheet, fila: list) -> Future:
+    """
+    Encola una fila nueva al final de la hoja (equivalente a worksheet.append_row).
+    Las filas de una misma hoja se agregan en el orden en que se encolaron.
+    """
+    def agregar(entrada):
+        future = Future()
+        entrada.filas.setdefault(worksheet.id, (worksheet, []))[1].append((fila, future))
+        return future
+    return _encolar(worksheet.spreadsheet, agregar)
+
+async def esperar_escrituras(futures: list, timeout: float | None = None):
+    """
+    Espera en el event loop (sin ocupar un hilo del gateway) a que se confirmen las escrituras;
+    lanza la primera excepción.
+    """
+    if not futures:
+        return
+    if timeout is None:
+        timeout = config.SHEETS_CALL_TIMEOUT_SEC
+    # asyncio.wait no cancela los futures al vencer el plazo (la cola los resuelve igual al enviar)
+    esperas = [asyncio.wrap_future(f) for f in futures]
+    _, sin_confirmar = await asyncio.wait(esperas, timeout=timeout)
+    if sin_confirmar:
+        raise TimeoutError(f'{len(sin_confirmar)} escrituras sin confirmar después de {timeout}s')
+    for espera in esperas:
+        espera.result()
+
+async def flush_pending_writes(spreadsheet_id: str | None = None):
+    """Envía ya (a través del gateway) las escrituras pendientes de todos los spreadsheets o de uno"""
+    with _lock:
+        claves = [spreadsheet_id] if spreadsheet_id else list(_pendientes)
+        entradas = [e for e in (_sacar(c) for c in claves) if e is not None]
+    resultados = await asyncio.gather(
+        *(run_sheets_call(_enviar, e, spreadsheet_id=e.spreadsheet.id) for e in entradas),
+        return_exceptions=True
+    )
+    for entrada, resultado in zip(entradas, resultados):
+        if isinstance(resultado, BaseException):
+            _resolver(_futures(entrada), resultado)
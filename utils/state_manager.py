@@ -1,14 +1,60 @@
+import heapq
 import json
+import sqlite3
+import threading
 from pathlib import Path
 import time
 import uuid
+import config
 
-# Define una ruta segura al archivo JSON
+# Define rutas seguras para la base de estados (y el JSON anterior, para migrarlo)
 temp_dir = Path.cwd() / 'temp'
 temp_dir.mkdir(parents=True, exist_ok=True)
 DATA_PATH = temp_dir / 'pendingData.json'
+DB_PATH = temp_dir / 'pendingData.db'
 
-# Lee y parsea el archivo JSON de datos pendientes
+# Los estados se guardan en SQLite (modo WAL), una fila por (usuario, tipo). Además se mantiene
+# una copia en memoria (write-through): las lecturas no tocan el disco y cada escritura actualiza
+# la memoria y la base en la misma operación. Los vencimientos se llevan en un heap en memoria.
+_conn = None
+# (user_id, tipo) -> datos serializados en JSON
+_cache = {}
+# tipo -> ids de usuarios con un estado de ese tipo (para filtrar eventos sin tocar los datos)
+_usuarios_por_tipo = {}
+_lock = threading.RLock()
+
+# Vencimiento de cada estado: (user_id, tipo) -> epoch, y un min-heap de (vencimiento, user_id, tipo).
+# Al actualizar o borrar un estado su entrada vieja queda en el heap y se descarta al sacarla.
+_vencimientos = {}
+_heap = []
+# Cantidad máxima de estados borrados por transacción en la limpieza
+_LOTE_BORRADO = 500
+
+# Minutos de vida de un estado según su tipo (flujo), contados desde su última actualización
+def _ttl_minutos(tipo: str) -> float:
+    ttls = {
+        'facturaA': config.STATE_TTL_FACTURA_A_MIN,
+        'cambios_devoluciones': config.STATE_TTL_CAMBIOS_DEVOLUCIONES_MIN,
+        'tarea': config.STATE_TTL_TAREA_MIN,
+    }
+    return ttls.get(tipo, config.STATE_TTL_DEFAULT_MIN)
+
+# Programa (o reprograma) el vencimiento de un estado. Con TTL 0 el estado no vence
+# (el de una tarea activa dura lo que dure la tarea y se borra al finalizarla)
+def _programar_vencimiento(user_id: str, tipo: str, base: float):
+    ttl = _ttl_minutos(tipo)
+    if ttl <= 0:
+        _vencimientos.pop((user_id, tipo), None)
+        return
+    vencimiento = base + ttl * 60
+    _vencimientos[(user_id, tipo)] = vencimiento
+    heapq.heappush(_heap, (vencimiento, user_id, tipo))
+    # Compactar el heap si acumuló demasiadas entradas descartadas
+    if len(_heap) > 2 * len(_vencimientos) + 64:
+        _heap[:] = [(v, u, t) for (u, t), v in _vencimientos.items()]
+        heapq.heapify(_heap)
+
+# Lee y parsea el archivo JSON de datos pendientes (solo para migrarlo a la base)
 # Si el archivo no existe, retorna un dict vacío
 def _read_pending_data():
     try:
@@ -20,39 +66,113 @@ def _read_pending_data():
         print("Error leyendo el archivo de estado:", error)
         raise
 
-# Escribe el objeto de datos pendientes en el archivo JSON
-def _write_pending_data(data):
+# Pasa los estados de pendingData.json a la base y renombra el archivo para no migrarlo otra vez
+def _migrar_json(conn):
+    if not DATA_PATH.exists():
+        return
     try:
-        with open(DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        all_data = _read_pending_data()
+        filas = []
+        for user_id, tipos in all_data.items():
+            if not isinstance(tipos, dict):
+                continue
+            for tipo, user_data in tipos.items():
+                filas.append((str(user_id), tipo, json.dumps(user_data, ensure_ascii=False), time.time()))
+        with conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO user_state (user_id, tipo, data, updated_at) VALUES (?, ?, ?, ?)',
+                filas
+            )
+        DATA_PATH.rename(DATA_PATH.with_suffix('.json.migrated'))
+        print(f"StateManager: {len(filas)} estados migrados de pendingData.json a SQLite.")
     except Exception as error:
-        print("Error escribiendo en el archivo de estado:", error)
-        raise
+        print("Error migrando pendingData.json a SQLite:", error)
+
+# Abre la base (una sola vez), crea la tabla si no existe y carga los estados en memoria
+def _get_conn():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return _conn
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_state (
+                user_id TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, tipo)
+            )
+        ''')
+        _migrar_json(conn)
+        _cache.clear()
+        _usuarios_por_tipo.clear()
+        _vencimientos.clear()
+        _heap.clear()
+        for user_id, tipo, data, updated_at in conn.execute('SELECT user_id, tipo, data, updated_at FROM user_state'):
+            _cache[(user_id, tipo)] = data
+            _usuarios_por_tipo.setdefault(tipo, set()).add(user_id)
+            _programar_vencimiento(user_id, tipo, updated_at)
+        _conn = conn
+        return _conn
 
 # Guarda los datos de un usuario específico y tipo
 # set_user_state(user_id, user_data, tipo)
 def set_user_state(user_id: str, user_data: dict, tipo: str):
-    all_data = _read_pending_data()
-    if user_id not in all_data:
-        all_data[user_id] = {}
-    all_data[user_id][tipo] = user_data
-    _write_pending_data(all_data)
+    data = json.dumps(user_data, ensure_ascii=False)
+    ahora = time.time()
+    with _lock:
+        conn = _get_conn()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO user_state (user_id, tipo, data, updated_at) VALUES (?, ?, ?, ?)',
+                (user_id, tipo, data, ahora)
+            )
+        except Exception as error:
+            print("Error escribiendo en la base de estado:", error)
+            raise
+        _cache[(user_id, tipo)] = data
+        _usuarios_por_tipo.setdefault(tipo, set()).add(user_id)
+        _programar_vencimiento(user_id, tipo, ahora)
+
+# Quita un estado de la copia en memoria (llamar con el lock tomado)
+def _quitar_de_memoria(user_id: str, tipo: str):
+    _cache.pop((user_id, tipo), None)
+    _vencimientos.pop((user_id, tipo), None)
+    usuarios = _usuarios_por_tipo.get(tipo)
+    if usuarios is not None:
+        usuarios.discard(user_id)
+
+# Indica si un usuario tiene un estado del tipo dado (consulta O(1) en memoria, sin parsear datos)
+# Pensado como filtro previo en eventos frecuentes como on_message
+def usuario_tiene_estado(user_id: str, tipo: str) -> bool:
+    with _lock:
+        _get_conn()
+        return user_id in _usuarios_por_tipo.get(tipo, ())
 
-# Obtiene los datos de un usuario específico y tipo
+# Obtiene los datos de un usuario específico y tipo (desde memoria, sin acceder al disco)
 # get_user_state(user_id, tipo)
 def get_user_state(user_id: str, tipo: str):
-    all_data = _read_pending_data()
-    return all_data.get(user_id, {}).get(tipo, None)
+    with _lock:
+        _get_conn()
+        data = _cache.get((user_id, tipo))
+    return json.loads(data) if data is not None else None
 
 # Elimina los datos de un usuario específico y tipo
 # delete_user_state(user_id, tipo)
 def delete_user_state(user_id: str, tipo: str):
-    all_data = _read_pending_data()
-    if user_id in all_data and tipo in all_data[user_id]:
-        del all_data[user_id][tipo]
-        if not all_data[user_id]:
-            del all_data[user_id]
-        _write_pending_data(all_data)
+    with _lock:
+        conn = _get_conn()
+        if (user_id, tipo) not in _cache:
+            return
+        try:
+            conn.execute('DELETE FROM user_state WHERE user_id = ? AND tipo = ?', (user_id, tipo))
+        except Exception as error:
+            print("Error escribiendo en la base de estado:", error)
+            raise
+        _quitar_de_memoria(user_id, tipo)
 
 def funcion_state_manager():
     pass
@@ -62,28 +182,54 @@ def generar_solicitud_id(user_id=None):
     base = str(user_id) if user_id else ''
     return f"{base}_{uuid.uuid4().hex[:8]}_{int(time.time())}"
 
-# Limpia estados con timestamp mayor a timeout segundos (por defecto 10 minutos)
-def cleanup_expired_states(timeout=600):
-    all_data = _read_pending_data()
-    now = time.time()
-    expired = []
-    for user_id, data in all_data.items():
-        ts = data.get('timestamp')
-        if ts:
-            try:
-                # Soporta timestamp como float o string ISO
-                if isinstance(ts, (int, float)):
-                    ts_val = float(ts)
-                else:
-                    try:
-                        ts_val = float(ts)
-                    except Exception:
-                        from datetime import datetime
-                        ts_val = datetime.fromisoformat(ts).timestamp()
-                if now - ts_val > timeout:
-                    expired.append(user_id)
-            except Exception:
-                continue
-    for user_id in expired:
-        del all_data[user_id]
-    _write_pending_data(all_data)
\ No newline at end of file
+# Borra los estados indicados en lotes, una transacción por lote (llamar con el lock tomado).
+# Retorna los que se borraron; si un lote falla, los restantes quedan para el próximo barrido.
+def _borrar_estados(conn, estados: list) -> list:
+    for i in range(0, len(estados), _LOTE_BORRADO):
+        lote = estados[i:i + _LOTE_BORRADO]
+        try:
+            conn.execute('BEGIN')
+            conn.executemany('DELETE FROM user_state WHERE user_id = ? AND tipo = ?', lote)
+            conn.execute('COMMIT')
+        except Exception as error:
+            conn.execute('ROLLBACK')
+            print("Error borrando estados vencidos:", error)
+            # Volver a programar los que no se pudieron borrar para el próximo barrido
+            for user_id, tipo in estados[i:]:
+                if (user_id, tipo) in _vencimientos:
+                    heapq.heappush(_heap, (_vencimientos[(user_id, tipo)], user_id, tipo))
+            return estados[:i]
+        for user_id, tipo in lote:
+            _quitar_de_memoria(user_id, tipo)
+    return estados
+
+# Borra los estados vencidos según el TTL de su tipo y retorna cuántos se eliminaron.
+# Solo recorre el principio del heap (los vencimientos más próximos) y borra en lotes,
+# una transacción por lote. La ejecuta periódicamente una tarea de fondo (ver main.py).
+def sweep_expired_states(now: float | None = None) -> int:
+    if now is None:
+        now = time.time()
+    with _lock:
+        conn = _get_conn()
+        vencidos = []
+        while _heap and _heap[0][0] <= now:
+            vencimiento, user_id, tipo = heapq.heappop(_heap)
+            # Ignorar entradas de estados borrados o actualizados después
+            if _vencimientos.get((user_id, tipo)) == vencimiento:
+                vencidos.append((user_id, tipo))
+        return len(_borrar_estados(conn, vencidos))
+
+# Limpia ya los estados vencidos (equivale a un barrido inmediato).
+# timeout (segundos) se mantiene por compatibilidad: si se indica, además se borran los estados
+# sin actualizar hace más de timeout segundos, sin importar el TTL de su tipo.
+def cleanup_expired_states(timeout: float | None = None) -> int:
+    eliminados = sweep_expired_states()
+    if timeout is None:
+        return eliminados
+    limite = time.time() - timeout
+    with _lock:
+        conn = _get_conn()
+        viejos = [(user_id, tipo) for user_id, tipo, updated_at
+                  in conn.execute('SELECT user_id, tipo, updated_at FROM user_state')
+                  if updated_at <= limite]
+        return eliminados + len(_borrar_estados(conn, viejos))
@@ -0,0 +1,156 @@
+"""
+Tabla en memoria de la hoja 'Tareas Activas'.
+Indexa las filas por 'Tarea ID' y las tareas activas (En proceso / Pausada) por 'Usuario ID',
+guardando el número de fila de cada una. Se carga una vez con get_all_values() y luego se
+mantiene al día con las escrituras del propio bot, así iniciar, pausar, reanudar o finalizar
+una tarea no necesita volver a leer la hoja. Cada cierto tiempo se recarga completa para
+tomar las ediciones hechas a mano.
+"""
+
+import re
+import threading
+import time
+import config
+from utils.sheet_schema import SheetSchema
+
+ESTADOS_ACTIVOS = ['en proceso', 'pausada']
+
+# Columnas de 'Tareas Activas' -> clave en el dict de la tarea
+CAMPOS_TAREA = {
+    'user_id': 'Usuario ID',
+    'tarea_id': 'Tarea ID',
+    'usuario': 'Usuario',
+    'tarea': 'Tarea',
+    'observaciones': 'Observaciones',
+    'estado': 'Estado (En proceso, Pausada)',
+    'inicio': 'Fecha/hora de inicio',
+    'finalizacion': 'Fecha/hora de finalización',
+    'tiempo_pausado': 'Tiempo pausada acumulado',
+    'cantidad_casos': 'Cantidad de casos',
+}
+
+# Número de fila en el 'updatedRange' de la respuesta de append_row, ej: 'Hoja'!A12:J12
+_FILA_EN_RANGO = re.compile(r'![A-Za-z]+(\d+)')
+
+def fila_desde_respuesta(respuesta) -> int | None:
+    """Obtiene el número de fila escrita a partir de la respuesta de append_row"""
+    try:
+        rango = respuesta['updates']['updatedRange']
+        match = _FILA_EN_RANGO.search(rango)
+        return int(match.group(1)) if match else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+class TaskTable:
+    """Tareas de una hoja 'Tareas Activas' indexadas por ID de tarea y por usuario activo"""
+
+    def __init__(self):
+        self.schema = SheetSchema([])
+        self.por_tarea = {}
+        self.activa_por_usuario = {}
+        self.vacia = True
+        self.expira = 0.0
+        self.lock = threading.RLock()
+
+    def cargar(self, rows: list):
+        """Reconstruye los índices a partir de todas las filas de la hoja"""
+        with self.lock:
+            self.vacia = not rows
+            self.schema = SheetSchema(rows[0] if rows else [])
+            self.por_tarea = {}
+            self.activa_por_usuario = {}
+            for fila_idx, row in enumerate(rows[1:], start=2):
+                self._indexar(row, fila_idx)
+            self.expira = time.monotonic() + config.TASK_TABLE_RESYNC_MIN * 60
+
+    def _indexar(self, row: list, fila_idx: int):
+        tarea = {campo: self.schema.valor(row, columna) for campo, columna in CAMPOS_TAREA.items()}
+        tarea['tiempo_pausado'] = self.schema.valor(row, CAMPOS_TAREA['tiempo_pausado'], default='00:00:00')
+        tarea['fila_idx'] = fila_idx
+        if tarea['tarea_id']:
+            # Si un ID está repetido se conserva la primera fila, como la búsqueda lineal original
+            self.por_tarea.setdefault(tarea['tarea_id'], tarea)
+        if tarea['user_id'] and tarea['estado'].strip().lower() in ESTADOS_ACTIVOS:
+            self.activa_por_usuario.setdefault(tarea['user_id'], tarea['tarea_id'])
+
+    def vencida(self) -> bool:
+        return time.monotonic() >= self.expira
+
+    def obtener(self, tarea_id: str) -> dict | None:
+        with self.lock:
+            tarea = self.por_tarea.get(tarea_id)
+            return dict(tarea) if tarea else None
+
+    def activa_de_usuario(self, user_id: str) -> dict | None:
+        with self.lock:
+            tarea_id = self.activa_por_usuario.get(user_id)
+            return self.obtener(tarea_id) if tarea_id is not None else None
+
+    def registrar_nueva(self, row: list, fila_idx: int):
+        """Agrega una fila recién escrita por el bot"""
+        with self.lock:
+            self._indexar(row, fila_idx)
+
+    def actualizar(self, tarea_id: str, **campos):
+        """Aplica a la tarea en memoria los cambios que el bot acaba de escribir en la hoja"""
+        with self.lock:
+            tarea = self.por_tarea.get(tarea_id)
+            if tarea is None:
+                return
+            tarea.update(campos)
+            user_id = tarea['user_id']
+            if tarea['estado'].strip().lower() in ESTADOS_ACTIVOS:
+                self.activa_por_usuario.setdefault(user_id, tarea_id)
+            elif self.activa_por_usuario.get(user_id) == tarea_id:
+                del self.activa_por_usuario[user_id]
+
+# (spreadsheet_id, título de hoja) -> TaskTable
+_tablas = {}
+_tablas_lock = threading.Lock()
+
+# tarea_id -> {'fila_inicio': fila del evento Inicio en Historial, 'ultima_pausa': fecha}
+_eventos = {}
+
+def _clave(sheet):
+    spreadsheet_id = getattr(sheet, 'spreadsheet_id', None)
+    if not spreadsheet_id and getattr(sheet, 'spreadsheet', None) is not None:
+        spreadsheet_id = sheet.spreadsheet.id
+    return (spreadsheet_id, sheet.title)
+
+def get_task_table(sheet) -> TaskTable:
+    """
+    Obtiene la tabla de tareas de la hoja, cargándola si no existe o si venció.
+    Llamada bloqueante: usar desde el gateway de Sheets.
+    """
+    clave = _clave(sheet)
+    with _tablas_lock:
+        tabla = _tablas.get(clave)
+        if tabla is None:
+            tabla = TaskTable()
+            _tablas[clave] = tabla
+    with tabla.lock:
+        if tabla.vencida():
+            tabla.cargar(sheet.get_all_values())
+    return tabla
+
+def invalidar_task_table(sheet=None):
+    """Fuerza la recarga de la tabla de tareas (de una hoja o de todas)"""
+    with _tablas_lock:
+        if sheet is None:
+            _tablas.clear()
+        else:
+            _tablas.pop(_clave(sheet), None)
+
+def registrar_evento(tarea_id: str, tipo_evento: str, fecha_evento: str, fila_historial: int | None):
+    """Recuerda los datos del historial que se necesitan al reanudar o finalizar una tarea"""
+    eventos = _eventos.setdefault(tarea_id, {})
+    if tipo_evento == 'Inicio' and fila_historial is not None:
+        eventos['fila_inicio'] = fila_historial
+    elif tipo_evento == 'Pausa':
+        eventos['ultima_pausa'] = fecha_evento
+    elif tipo_evento == 'Finalización':
+        _eventos.pop(tarea_id, None)
+
+def evento_conocido(tarea_id: str, clave: str):
+    """Retorna 'fila_inicio' o 'ultima_pausa' de una tarea si el bot lo registró (None si no)"""
+    return _eventos.get(tarea_id, {}).get(clave)